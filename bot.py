@@ -113,7 +113,7 @@ async def load_all_cogs():
     loaded_cogs = 0
     for root, _, files in os.walk("cmds"):
         for file in files:
-            if file.endswith(".py") and not file.startswith("__"):
+            if file.endswith(".py") and not file.startswith("_"):
                 module_name = os.path.join(root, file).replace(os.sep, ".")[:-3]
                 try:
                     await bot.load_extension(module_name)
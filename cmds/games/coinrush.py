@@ -1,10 +1,9 @@
 import discord
-from discord.ext import commands
+from discord.ext import commands, tasks
 import config
 from config import BOT_PREFIX
 import random
 import aiohttp
-from PIL import Image, ImageDraw, ImageFont
 import io
 import os
 import json
@@ -12,9 +11,20 @@ import datetime
 from discord.ui import Button, View, Select
 import asyncio
 import base64
-from sqlalchemy import create_engine, Column, Integer, String, Float, Text, ForeignKey, Boolean
+import logging
+import bisect
+import math
+import time
+from collections import OrderedDict, Counter
+from concurrent.futures import ThreadPoolExecutor
+from sqlalchemy import create_engine, event, func, or_, Column, Index, Integer, String, Float, Text, ForeignKey, Boolean
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, relationship
+from cmds.games._imaging import ImageRenderer
+
+logger = logging.getLogger(__name__)
 
 # Ensure the data/games directory exists
 os.makedirs("data/games", exist_ok=True)
@@ -24,6 +34,21 @@ Base = declarative_base()
 engine = create_engine('sqlite:///data/games/coinrush.db', echo=False)
 Session = sessionmaker(bind=engine)
 
+@event.listens_for(engine, "connect")
+def _configure_sqlite(dbapi_connection, connection_record):
+    # WAL lets readers proceed during a flush, and NORMAL sync skips an fsync per commit
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.close()
+    # Let SQLAlchemy, not the sqlite3 module, decide when transactions begin
+    dbapi_connection.isolation_level = None
+
+@event.listens_for(engine, "begin")
+def _begin_transaction(conn):
+    # Write transactions take the write lock up front so their reads can't go stale
+    conn.exec_driver_sql("BEGIN IMMEDIATE" if conn.get_execution_options().get("immediate") else "BEGIN")
+
 # Database Models
 class Guild(Base):
     __tablename__ = 'guilds'
@@ -33,16 +58,16 @@ class Guild(Base):
 class User(Base):
     __tablename__ = 'users'
     id = Column(String, primary_key=True)
-    guild_id = Column(String, ForeignKey('guilds.id'), nullable=False)
+    guild_id = Column(String, ForeignKey('guilds.id'), primary_key=True)
     coins = Column(Integer, default=0)
-    items = Column(Text, default="[]")  # JSON string for items list
+    items = Column(Text, default="[]")  # legacy JSON list, migrated into inventory
     last_work = Column(Float, default=0)
     last_steal = Column(Float, default=0)
     last_daily = Column(Float, default=0)
     job = Column(String, nullable=True)
     has_owned_vip = Column(Boolean, default=False)
     last_invest = Column(Float, default=0)
-    achievements = Column(Text, default="[]")  # JSON string for achievements list
+    achievements = Column(Text, default="[]")  # legacy JSON list, migrated into user_achievements
     total_earnings = Column(Integer, default=0)
     steals = Column(Integer, default=0)
     items_bought = Column(Integer, default=0)
@@ -50,14 +75,791 @@ class User(Base):
     investment_profits = Column(Integer, default=0)
     trades = Column(Integer, default=0)
     jackpots_won = Column(Integer, default=0)
+    version = Column(Integer, default=0, server_default="0", nullable=False)  # bumped on every write, for optimistic checks
     guild = relationship("Guild", back_populates="users")
+    __table_args__ = (
+        Index("idx_users_guild_coins", "guild_id", coins.desc(), "id"),
+    )
+
+class InventoryItem(Base):
+    __tablename__ = 'inventory'
+    guild_id = Column(String, primary_key=True)
+    user_id = Column(String, primary_key=True)
+    item = Column(String, primary_key=True)
+    qty = Column(Integer, nullable=False, default=1)
+    __table_args__ = (
+        Index("idx_inventory_guild_item", "guild_id", "item"),
+    )
+
+class UserAchievement(Base):
+    __tablename__ = 'user_achievements'
+    guild_id = Column(String, primary_key=True)
+    user_id = Column(String, primary_key=True)
+    achievement = Column(String, primary_key=True)
+    unlocked_at = Column(Float, default=0)
+    __table_args__ = (
+        Index("idx_user_achievements_guild_achievement", "guild_id", "achievement"),
+    )
+
+class LedgerEntry(Base):
+    __tablename__ = 'ledger'
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    guild_id = Column(String, nullable=False)
+    user_id = Column(String, nullable=False)
+    delta = Column(Integer, nullable=False)
+    balance = Column(Integer, nullable=False)  # balance after the change
+    reason = Column(String, nullable=False)
+    created_at = Column(Float, nullable=False)
+    __table_args__ = (
+        Index("idx_ledger_player_time", "guild_id", "user_id", "created_at"),
+        Index("idx_ledger_time", "created_at"),
+    )
+
+def migrate_users_primary_key():
+    """Rebuild a legacy users table keyed by user id alone, so a player can exist in several guilds."""
+    with engine.begin() as conn:
+        columns = conn.exec_driver_sql("PRAGMA table_info(users)").fetchall()
+        if not columns or sum(1 for column in columns if column[5]) > 1:
+            return
+        conn.exec_driver_sql("ALTER TABLE users RENAME TO users_legacy")
+        User.__table__.create(conn)
+        names = ", ".join(column[1] for column in columns)
+        conn.exec_driver_sql(f"INSERT INTO users ({names}) SELECT {names} FROM users_legacy")
+        conn.exec_driver_sql("DROP TABLE users_legacy")
+
+def migrate_json_columns():
+    """Move players' legacy JSON items/achievements into the inventory and user_achievements tables."""
+    with engine.begin() as conn:
+        rows = conn.exec_driver_sql(
+            "SELECT guild_id, id, items, achievements FROM users WHERE items NOT IN ('[]', '') OR achievements NOT IN ('[]', '')"
+        ).fetchall()
+        if not rows:
+            return
+        now = time.time()
+        for guild_id, user_id, items, achievements in rows:
+            for item, qty in Counter(json.loads(items or "[]")).items():
+                conn.execute(
+                    sqlite_insert(InventoryItem.__table__)
+                    .values(guild_id=guild_id, user_id=user_id, item=item, qty=qty)
+                    .on_conflict_do_update(index_elements=["guild_id", "user_id", "item"], set_={"qty": qty})
+                )
+            for achievement in set(json.loads(achievements or "[]")):
+                conn.execute(
+                    sqlite_insert(UserAchievement.__table__)
+                    .values(guild_id=guild_id, user_id=user_id, achievement=achievement, unlocked_at=now)
+                    .on_conflict_do_nothing()
+                )
+        conn.exec_driver_sql("UPDATE users SET items = '[]', achievements = '[]'")
+        logger.info(f"Migrated CoinRush items/achievements for {len(rows)} players")
+
+def migrate_users_version():
+    with engine.begin() as conn:
+        columns = {column[1] for column in conn.exec_driver_sql("PRAGMA table_info(users)")}
+        if columns and "version" not in columns:
+            conn.exec_driver_sql("ALTER TABLE users ADD COLUMN version INTEGER NOT NULL DEFAULT 0")
 
 # Create tables
+migrate_users_primary_key()
+migrate_users_version()
 Base.metadata.create_all(engine)
+for index in User.__table__.indexes:
+    index.create(engine, checkfirst=True)  # create_all skips indexes on tables that already exist
+migrate_json_columns()
+
+# Scalar player fields stored on the users row; items and achievements live in their own tables
+PLAYER_FIELDS = [
+    "coins", "last_work", "last_steal", "last_daily", "job", "has_owned_vip", "last_invest",
+    "total_earnings", "steals", "items_bought", "elicit_works", "investment_profits",
+    "trades", "jackpots_won"
+]
+
+SHOP_ITEMS = {
+    "Cool Hat": {"cost": 100, "effect": "work_boost", "value": 0.1, "sell_price": 75},
+    "Laser Gun": {"cost": 300, "effect": "steal_boost", "value": 0.15, "sell_price": 225},
+    "Medkit": {"cost": 150, "effect": "work_stability", "value": 10, "sell_price": 100},
+    "Stealth Cloak": {"cost": 250, "effect": "steal_protect", "value": 0.25, "sell_price": 175},
+    "Toolbox": {"cost": 120, "effect": "work_boost", "value": 0.05, "sell_price": 90},
+    "Shield": {"cost": 180, "effect": "steal_protect", "value": 0.15, "sell_price": 135},
+    "Jetpack": {"cost": 350, "effect": "work_boost", "value": 0.2, "sell_price": 260},
+    "Spy Drone": {"cost": 280, "effect": "steal_boost", "value": 0.1, "sell_price": 210},
+    "Lucky Coin": {"cost": 90, "effect": "work_stability", "value": 5, "sell_price": 65},
+    "Golden Key": {"cost": 400, "effect": "work_boost", "value": 0.25, "sell_price": 300},
+    "Smoke Bomb": {"cost": 220, "effect": "steal_protect", "value": 0.3, "sell_price": 165},
+    "Night Vision": {"cost": 260, "effect": "steal_boost", "value": 0.12, "sell_price": 195},
+    "VIP Badge": {"cost": 1000, "effect": "steal_protect", "value": 0.95, "sell_price": 750},
+    "Coffee Mug": {"cost": 80, "effect": "work_boost", "value": 0.08, "sell_price": 60},
+    "Lockpick Set": {"cost": 200, "effect": "steal_boost", "value": 0.2, "sell_price": 150},
+    "Steel Armor": {"cost": 320, "effect": "steal_protect", "value": 0.35, "sell_price": 240},
+    "Energy Drink": {"cost": 110, "effect": "work_stability", "value": 8, "sell_price": 80},
+    "Flashlight": {"cost": 140, "effect": "steal_boost", "value": 0.08, "sell_price": 105},
+    "Safe Box": {"cost": 270, "effect": "steal_protect", "value": 0.28, "sell_price": 200},
+    "Rocket Boots": {"cost": 380, "effect": "work_boost", "value": 0.22, "sell_price": 285}
+}
+
+STEAL_MIN_COINS = 10  # below this (and with no items) a player isn't worth robbing
+
+MODIFIER_EFFECTS = ("work_boost", "work_stability", "steal_boost", "steal_protect")
+
+def item_modifiers(items):
+    """Aggregate the item effects a player holds into one modifier vector.
+
+    ``work_boost`` is a payout multiplier (boosts compound); the rest are sums.
+    """
+    modifiers = {"work_boost": 1.0, "work_stability": 0, "steal_boost": 0, "steal_protect": 0}
+    for item in items:
+        apply_item(modifiers, item, 1)
+    return modifiers
+
+def apply_item(modifiers, item, direction):
+    """Add (direction=1) or remove (direction=-1) one item's effect from a modifier vector."""
+    shop_item = SHOP_ITEMS.get(item)
+    if shop_item is None:
+        return
+    effect, value = shop_item["effect"], shop_item["value"]
+    if effect == "work_boost":
+        modifiers[effect] = round(modifiers[effect] * (1 + value) ** direction, 9)  # keep add/remove drift-free
+    else:
+        modifiers[effect] += value * direction
+
+def add_item(data, item):
+    """Give a player an item, keeping their cached modifiers in step."""
+    data["items"].append(item)
+    apply_item(data["modifiers"], item, 1)
+
+def remove_item(data, item):
+    """Take one of an item from a player, keeping their cached modifiers in step."""
+    data["items"].remove(item)
+    apply_item(data["modifiers"], item, -1)
+
+# Each achievement lists the player fields its condition reads, so a check only
+# re-evaluates achievements whose inputs changed since the player was last checked.
+ACHIEVEMENTS = {
+    "First Payday": {"description": "Earn your first coins from work", "fields": ("total_earnings",), "condition": lambda data: data["total_earnings"] >= 1},
+    "Thief": {"description": "Successfully steal from someone", "fields": ("steals",), "condition": lambda data: data["steals"] >= 1},
+    "Millionaire": {"description": "Reach 1,000 coins", "fields": ("coins",), "condition": lambda data: data["coins"] >= 1000},
+    "Shopaholic": {"description": "Buy 5 items", "fields": ("items_bought",), "condition": lambda data: data["items_bought"] >= 5},
+    "Risk Taker": {"description": "Work an elicit job 10 times", "fields": ("elicit_works",), "condition": lambda data: data["elicit_works"] >= 10},
+    "Investor": {"description": "Make a profit from investing", "fields": ("investment_profits",), "condition": lambda data: data["investment_profits"] >= 1},
+    "Trader": {"description": "Complete a trade", "fields": ("trades",), "condition": lambda data: data["trades"] >= 1},
+    "VIP": {"description": "Own a VIP Badge", "fields": ("items",), "condition": lambda data: "VIP Badge" in data["items"]},
+    "Gambler": {"description": "Win a jackpot in the casino", "fields": ("jackpots_won",), "condition": lambda data: data.get("jackpots_won", 0) >= 1}
+}
+
+ACHIEVEMENT_WATCHERS = {}  # field -> names of achievements that depend on it
+for _name, _achievement in ACHIEVEMENTS.items():
+    for _field in _achievement["fields"]:
+        ACHIEVEMENT_WATCHERS.setdefault(_field, []).append(_name)
+
+def evaluate_achievements(data, names=None):
+    """Unlock and return the achievements ``data`` newly qualifies for.
+
+    Without ``names`` only achievements whose watched fields changed since the last
+    call are evaluated; a player's first check evaluates everything. Pass ``names``
+    to force specific achievements, e.g. when backfilling a new one.
+    """
+    if names is None:
+        marks = data["achievement_marks"]
+        names = set()
+        for field, watchers in ACHIEVEMENT_WATCHERS.items():
+            value = data.get(field)
+            if isinstance(value, list):
+                value = tuple(value)
+            if field not in marks or marks[field] != value:
+                marks[field] = value
+                names.update(watchers)
+    unlocked = data["achievements"]
+    new_unlocks = [
+        name for name, achievement in ACHIEVEMENTS.items()
+        if name in names and name not in unlocked and achievement["condition"](data)
+    ]
+    unlocked.extend(new_unlocks)
+    return new_unlocks
+
+def default_player_data():
+    return {
+        "coins": 0,
+        "items": [],
+        "last_work": 0,
+        "last_steal": 0,
+        "last_daily": 0,
+        "job": None,
+        "has_owned_vip": False,
+        "last_invest": 0,
+        "achievements": [],
+        "total_earnings": 0,
+        "steals": 0,
+        "items_bought": 0,
+        "elicit_works": 0,
+        "investment_profits": 0,
+        "trades": 0,
+        "jackpots_won": 0,
+        "modifiers": item_modifiers([]),
+        "recorded_coins": 0,
+        "achievement_marks": {}
+    }
+
+def user_to_data(user, inventory=(), achievements=()):
+    """Convert a User row plus its (item, qty) and achievement rows into the player dict used by the game."""
+    data = {field: getattr(user, field) for field in PLAYER_FIELDS}
+    data["items"] = [item for item, qty in inventory for _ in range(qty)]
+    data["achievements"] = list(achievements)
+    data["modifiers"] = item_modifiers(data["items"])
+    data["recorded_coins"] = data["coins"]  # balance the ledger last saw, not persisted
+    data["achievement_marks"] = {}  # watched field values at the last achievement check, not persisted
+    return data
+
+class TransactionError(Exception):
+    """A multi-player transaction could not be committed; none of it was applied."""
+
+class StalePlayerError(TransactionError):
+    """A player row changed since it was read, so a transaction must be retried."""
+
+class PlayerCache:
+    """Write-behind cache of player dicts keyed by (guild_id, user_id).
+
+    Reads are served from memory after the first load; writes only mark the player
+    dirty, and dirty players are written together by ``flush()``. Clean players are
+    evicted least-recently-used once the cache grows past ``max_entries``.
+
+    All database work runs on ``executor`` (a single dedicated thread) so SQLite
+    never blocks the event loop; cache bookkeeping stays on the loop.
+
+    Items and achievements are written as diffs against what was last stored, so
+    buying one item is a single inventory row upsert rather than a rewrite.
+    """
+
+    def __init__(self, executor, max_entries=5000):
+        self.executor = executor
+        self.max_entries = max_entries
+        self.entries = OrderedDict()  # (guild_id, user_id) -> player dict, oldest first
+        self.dirty = set()
+        self.stored = {}  # (guild_id, user_id) -> (Counter of items, set of achievements) last written
+        self.versions = {}  # (guild_id, user_id) -> users.version last read or written (absent = no row)
+        self.flush_lock = asyncio.Lock()
+
+    async def run(self, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.executor, func, *args)
+
+    async def get(self, guild_id, user_id):
+        key = (str(guild_id), str(user_id))
+        data = self.entries.get(key)
+        if data is not None:
+            self.entries.move_to_end(key)
+            return data
+        data, version = await self.run(self.load, *key)
+        if key in self.entries:
+            # Another caller loaded the same player while we waited
+            return self.entries[key]
+        if data is None:
+            # New players only exist in memory until the next flush writes them
+            data = default_player_data()
+            self.dirty.add(key)
+        else:
+            self.versions[key] = version
+        self.stored[key] = (Counter(data["items"]), set(data["achievements"]))
+        self.put(key, data)
+        return data
+
+    def peek(self, guild_id, user_id):
+        """Return the cached dict without loading or touching LRU order."""
+        return self.entries.get((str(guild_id), str(user_id)))
+
+    def load(self, guild_id, user_id):
+        """Read one player and their row version from the database (executor thread); (None, None) if they have no row yet."""
+        session = Session()
+        try:
+            user = session.query(User).filter_by(id=user_id, guild_id=guild_id).first()
+            if user is None:
+                return None, None
+            inventory = session.query(InventoryItem.item, InventoryItem.qty).filter_by(guild_id=guild_id, user_id=user_id).all()
+            achievements = [
+                row.achievement for row in
+                session.query(UserAchievement.achievement).filter_by(guild_id=guild_id, user_id=user_id)
+            ]
+            return user_to_data(user, inventory, achievements), user.version
+        finally:
+            session.close()
+
+    def put(self, key, data):
+        self.entries[key] = data
+        self.entries.move_to_end(key)
+        self.evict()
+
+    def mark_dirty(self, guild_id, user_id, data=None):
+        key = (str(guild_id), str(user_id))
+        if data is not None and self.entries.get(key) is not data:
+            self.put(key, data)
+        self.dirty.add(key)
+
+    def evict(self):
+        overflow = len(self.entries) - self.max_entries
+        if overflow <= 0:
+            return
+        # Dirty players stay until flushed so no write is lost
+        for key in [key for key in self.entries if key not in self.dirty][:overflow]:
+            self.discard(key)
+
+    def discard(self, key):
+        """Forget a player entirely, so the next get reloads them from the database."""
+        self.entries.pop(key, None)
+        self.stored.pop(key, None)
+        self.versions.pop(key, None)
+        self.dirty.discard(key)
+
+    def snapshot(self, keys=None):
+        """Take dirty players (all, or just ``keys``) and serialise them so later edits can't race the write.
+
+        Returns the taken keys, the rows to write, and the item/achievement state
+        those rows leave in the database.
+        """
+        if keys is None:
+            dirty, self.dirty = self.dirty, set()
+        else:
+            dirty = self.dirty & set(keys)
+            self.dirty -= dirty
+        rows = []
+        written = {}
+        for key in dirty:
+            data = self.entries.get(key)
+            if data is None:
+                continue
+            items = Counter(data["items"])
+            achievements = set(data["achievements"])
+            stored = self.stored.get(key)
+            # An evicted player saved again has no known stored state, so their inventory is rewritten whole
+            stored_items, stored_achievements = stored or (Counter(), set())
+            rows.append({
+                "guild_id": key[0],
+                "user_id": key[1],
+                "fields": {field: data[field] for field in PLAYER_FIELDS},
+                "replace_items": stored is None,
+                "item_changes": {item: items[item] for item in items.keys() | stored_items.keys() if items[item] != stored_items[item]},
+                "new_achievements": achievements - stored_achievements,
+                "version": self.versions.get(key)
+            })
+            written[key] = (items, achievements)
+        return dirty, rows, written
+
+    def write(self, rows, check_versions=False):
+        """Upsert player rows and apply their inventory/achievement diffs in a single transaction.
+
+        Runs under BEGIN IMMEDIATE. With ``check_versions`` every row must still be at
+        the version it was read at, or StalePlayerError is raised and nothing is written.
+        Returns the new version of each written player.
+        """
+        if not rows:
+            return {}
+        by_guild = {}
+        for row in rows:
+            by_guild.setdefault(row["guild_id"], {})[row["user_id"]] = row
+        now = time.time()
+        versions = {}
+        session = Session(bind=engine.connect().execution_options(immediate=True))
+        try:
+            for guild_id, players in by_guild.items():
+                if session.get(Guild, guild_id) is None:
+                    session.add(Guild(id=guild_id))
+                existing = {
+                    user.id: user for user in
+                    session.query(User).filter(User.guild_id == guild_id, User.id.in_(list(players)))
+                }
+                for user_id, row in players.items():
+                    user = existing.get(user_id)
+                    if check_versions and (user.version if user else None) != row["version"]:
+                        raise StalePlayerError(guild_id, user_id)
+                    if user is None:
+                        user = User(id=user_id, guild_id=guild_id, version=0)
+                        session.add(user)
+                    else:
+                        user.version += 1
+                    versions[(guild_id, user_id)] = user.version
+                    for field, value in row["fields"].items():
+                        setattr(user, field, value)
+                    if row["replace_items"]:
+                        session.query(InventoryItem).filter_by(guild_id=guild_id, user_id=user_id).delete()
+                    for item, qty in row["item_changes"].items():
+                        if qty:
+                            session.execute(
+                                sqlite_insert(InventoryItem)
+                                .values(guild_id=guild_id, user_id=user_id, item=item, qty=qty)
+                                .on_conflict_do_update(index_elements=["guild_id", "user_id", "item"], set_={"qty": qty})
+                            )
+                        else:
+                            session.query(InventoryItem).filter_by(guild_id=guild_id, user_id=user_id, item=item).delete()
+                    for achievement in row["new_achievements"]:
+                        session.execute(
+                            sqlite_insert(UserAchievement)
+                            .values(guild_id=guild_id, user_id=user_id, achievement=achievement, unlocked_at=now)
+                            .on_conflict_do_nothing()
+                        )
+            session.commit()
+            return versions
+        except (SQLAlchemyError, StalePlayerError):
+            session.rollback()
+            raise
+        finally:
+            bind = session.bind
+            session.close()
+            bind.close()
+
+    async def flush(self, keys=None, check_versions=False):
+        """Write dirty players (all, or just ``keys``) in one transaction."""
+        # Serialised so each diff is taken against state that has actually been written
+        async with self.flush_lock:
+            dirty, rows, written = self.snapshot(keys)
+            try:
+                versions = await self.run(self.write, rows, check_versions)
+            except StalePlayerError:
+                # Someone else changed these rows; our copies are stale, so reload on next use
+                for key in dirty:
+                    self.discard(key)
+                raise
+            except SQLAlchemyError:
+                self.dirty |= dirty
+                raise
+            for key, state in written.items():
+                if key in self.entries:
+                    self.stored[key] = state
+                    self.versions[key] = versions[key]
+
+class Ledger:
+    """Append-only record of every balance change.
+
+    ``record()`` only appends to an in-memory buffer, so it adds no latency to the
+    action; a background loop writes the buffer in one batched insert. Entries older
+    than the retention window are periodically compacted into one snapshot row per
+    player carrying their net change and closing balance.
+    """
+
+    def __init__(self, max_buffer=50000):
+        self.max_buffer = max_buffer
+        self.buffer = []
+
+    def record(self, guild_id, user_id, delta, balance, reason):
+        self.buffer.append({
+            "guild_id": guild_id,
+            "user_id": user_id,
+            "delta": delta,
+            "balance": balance,
+            "reason": reason,
+            "created_at": time.time()
+        })
+
+    def take(self):
+        rows, self.buffer = self.buffer, []
+        return rows
+
+    def restore(self, rows):
+        """Put rows from a failed write back in front, dropping the oldest past ``max_buffer``."""
+        self.buffer = rows + self.buffer
+        overflow = len(self.buffer) - self.max_buffer
+        if overflow > 0:
+            logger.warning(f"CoinRush ledger buffer full, dropped {overflow} entries")
+            del self.buffer[:overflow]
+
+    @staticmethod
+    def write(rows):
+        if rows:
+            with engine.begin() as conn:
+                conn.execute(LedgerEntry.__table__.insert(), rows)
+
+    @staticmethod
+    def compact(cutoff):
+        """Fold every player's entries older than ``cutoff`` into a single snapshot row."""
+        with engine.connect().execution_options(immediate=True) as conn, conn.begin():
+            last_id = conn.exec_driver_sql("SELECT MAX(id) FROM ledger WHERE created_at < ?", (cutoff,)).scalar()
+            if last_id is None:
+                return 0
+            conn.exec_driver_sql("""
+                INSERT INTO ledger (guild_id, user_id, delta, balance, reason, created_at)
+                SELECT guild_id, user_id, SUM(delta),
+                    (SELECT balance FROM ledger AS latest
+                     WHERE latest.guild_id = old.guild_id AND latest.user_id = old.user_id AND latest.id <= ?
+                     ORDER BY latest.created_at DESC, latest.id DESC LIMIT 1),
+                    'snapshot', MAX(created_at)
+                FROM ledger AS old
+                WHERE created_at < ? AND id <= ?
+                GROUP BY guild_id, user_id
+            """, (last_id, cutoff, last_id))
+            return conn.exec_driver_sql("DELETE FROM ledger WHERE created_at < ? AND id <= ?", (cutoff, last_id)).rowcount
+
+    @staticmethod
+    def history(guild_id, user_id, limit):
+        session = Session()
+        try:
+            return [
+                (row.delta, row.balance, row.reason, row.created_at) for row in
+                session.query(LedgerEntry)
+                .filter_by(guild_id=guild_id, user_id=user_id)
+                .order_by(LedgerEntry.created_at.desc(), LedgerEntry.id.desc())
+                .limit(limit)
+            ]
+        finally:
+            session.close()
+
+class RankIndex:
+    """Per-guild coin rankings kept sorted in memory, so rank lookups are a bisect.
+
+    Each guild holds its (-coins, user_id) keys as a list of sorted buckets of up to
+    ``2 * BUCKET_SIZE`` entries, plus the coins each player is filed under. A single
+    sorted list would make every balance change an O(n) insert/delete; with buckets
+    an update shifts one bucket and a rank lookup sums bucket lengths, both O(sqrt n)
+    in practice. Guilds are loaded from the database on their first rank lookup and
+    then kept current by ``update()`` whenever a player is saved.
+    """
+
+    BUCKET_SIZE = 512
+
+    def __init__(self):
+        # guild_id -> {"buckets": [sorted [(-coins, user_id)]], "maxes": [last key of each bucket], "coins": {user_id: coins}}
+        self.guilds = {}
+
+    def is_loaded(self, guild_id):
+        return guild_id in self.guilds
+
+    def load(self, guild_id, players):
+        """Build a guild's ranking from (user_id, coins) pairs."""
+        coins = dict(players)
+        keys = sorted((-amount, user_id) for user_id, amount in coins.items())
+        buckets = [keys[i:i + self.BUCKET_SIZE] for i in range(0, len(keys), self.BUCKET_SIZE)]
+        self.guilds[guild_id] = {"buckets": buckets, "maxes": [bucket[-1] for bucket in buckets], "coins": coins}
+
+    def _insert(self, ranking, key):
+        buckets, maxes = ranking["buckets"], ranking["maxes"]
+        if not buckets:
+            buckets.append([key])
+            maxes.append(key)
+            return
+        i = min(bisect.bisect_left(maxes, key), len(buckets) - 1)
+        bucket = buckets[i]
+        bisect.insort(bucket, key)
+        maxes[i] = bucket[-1]
+        if len(bucket) > 2 * self.BUCKET_SIZE:
+            half = bucket[self.BUCKET_SIZE:]
+            del bucket[self.BUCKET_SIZE:]
+            buckets.insert(i + 1, half)
+            maxes[i:i + 1] = [bucket[-1], half[-1]]
+
+    def _remove(self, ranking, key):
+        buckets, maxes = ranking["buckets"], ranking["maxes"]
+        i = bisect.bisect_left(maxes, key)
+        bucket = buckets[i]
+        del bucket[bisect.bisect_left(bucket, key)]
+        if bucket:
+            maxes[i] = bucket[-1]
+        else:
+            del buckets[i], maxes[i]
+
+    def update(self, guild_id, user_id, coins):
+        ranking = self.guilds.get(guild_id)
+        if ranking is None:
+            return  # not loaded yet; the load will pick up current values
+        old = ranking["coins"].get(user_id)
+        if old == coins:
+            return
+        if old is not None:
+            self._remove(ranking, (-old, user_id))
+        self._insert(ranking, (-coins, user_id))
+        ranking["coins"][user_id] = coins
+
+    def players(self, guild_id):
+        """Return the ids of every ranked player in a loaded guild."""
+        ranking = self.guilds.get(guild_id)
+        return list(ranking["coins"]) if ranking else []
+
+    def rank(self, guild_id, user_id):
+        """Return the 1-based rank (players with more coins + 1), or None if unranked."""
+        ranking = self.guilds.get(guild_id)
+        if ranking is None or user_id not in ranking["coins"]:
+            return None
+        key = (-ranking["coins"][user_id],)
+        buckets = ranking["buckets"]
+        i = bisect.bisect_left(ranking["maxes"], key)
+        ahead = sum(len(bucket) for bucket in buckets[:i])
+        if i < len(buckets):
+            ahead += bisect.bisect_left(buckets[i], key)
+        return ahead + 1
+
+class TargetPool:
+    """Per-guild set of players worth stealing from, sampled in O(1).
+
+    A player is in the pool while they hold at least ``STEAL_MIN_COINS`` or any item.
+    Members are kept in a list with a position map so adds, swap-removes and uniform
+    picks are all constant time. Wealth-weighted picks use rejection sampling against
+    the largest balance seen, which is only an upper bound after players get poorer.
+    """
+
+    def __init__(self):
+        self.guilds = {}  # guild_id -> {"ids": [user_id], "pos": {user_id: index}, "coins": {user_id: coins}, "max": int}
+
+    def is_loaded(self, guild_id):
+        return guild_id in self.guilds
+
+    def load(self, guild_id, players):
+        """Build a guild's pool from (user_id, coins) pairs of eligible players."""
+        coins = dict(players)
+        ids = list(coins)
+        self.guilds[guild_id] = {
+            "ids": ids,
+            "pos": {user_id: i for i, user_id in enumerate(ids)},
+            "coins": coins,
+            "max": max(coins.values(), default=0)
+        }
+
+    def update(self, guild_id, user_id, data):
+        pool = self.guilds.get(guild_id)
+        if pool is None:
+            return  # not loaded yet; the load will pick up current values
+        if data["coins"] >= STEAL_MIN_COINS or data["items"]:
+            if user_id not in pool["pos"]:
+                pool["pos"][user_id] = len(pool["ids"])
+                pool["ids"].append(user_id)
+            pool["coins"][user_id] = data["coins"]
+            pool["max"] = max(pool["max"], data["coins"])
+        elif user_id in pool["pos"]:
+            ids, pos = pool["ids"], pool["pos"]
+            index = pos.pop(user_id)
+            last = ids.pop()
+            if last != user_id:
+                ids[index] = last
+                pos[last] = index
+            del pool["coins"][user_id]
+
+    def sample(self, guild_id, weighted=False, attempts=16):
+        """Return a random eligible user_id (richer players likelier if ``weighted``), or None."""
+        pool = self.guilds.get(guild_id)
+        if not pool or not pool["ids"]:
+            return None
+        user_id = random.choice(pool["ids"])
+        if weighted and pool["max"] > 0:
+            for _ in range(attempts):
+                if random.random() * pool["max"] < pool["coins"][user_id]:
+                    break
+                user_id = random.choice(pool["ids"])
+        return user_id
+
+class CooldownService:
+    """In-memory action cooldowns keyed by (guild_id, user_id, action).
+
+    Players' ``last_<action>`` timestamps stay the source of truth and are persisted
+    by the normal player flush; this service mirrors them so cooldown checks never
+    load a player. It is bulk-loaded at startup with every timestamp still inside its
+    window and kept current by ``update()`` whenever a player is saved. Entries past
+    their window are pruned, since no entry means no cooldown.
+    """
+
+    COOLDOWNS = {"work": 600, "steal": 300, "invest": 1800, "daily": 86400}
+
+    def __init__(self):
+        self.expires = {}  # (guild_id, user_id, action) -> timestamp the cooldown ends
+
+    def load(self, rows, now):
+        """Load (guild_id, user_id, {action: last_used}) rows."""
+        for guild_id, user_id, last_used in rows:
+            self.update(guild_id, user_id, last_used, now)
+
+    def update(self, guild_id, user_id, last_used, now=None):
+        now = datetime.datetime.utcnow().timestamp() if now is None else now
+        for action, last in last_used.items():
+            expires = (last or 0) + self.COOLDOWNS[action]
+            key = (str(guild_id), str(user_id), action)
+            if expires > now:
+                self.expires[key] = expires
+            else:
+                self.expires.pop(key, None)
+
+    def update_player(self, guild_id, user_id, data):
+        self.update(guild_id, user_id, {action: data[f"last_{action}"] for action in self.COOLDOWNS})
+
+    def remaining(self, guild_id, user_id, action, now):
+        """Seconds until ``action`` is available again, 0 if it already is."""
+        expires = self.expires.get((str(guild_id), str(user_id), action))
+        return max(0, math.ceil(expires - now)) if expires else 0
+
+    def prune(self, now):
+        expired = [key for key, expires in self.expires.items() if expires <= now]
+        for key in expired:
+            del self.expires[key]
+        return len(expired)
+
+class ViewRegistry:
+    """Bounds how many CoinRush game views stay live in memory.
+
+    Views are tracked by message id in least-recently-used order, globally, per guild
+    and per (guild, user). Registering past a cap, or sitting idle past
+    ``idle_seconds``, evicts the oldest view. Evicted views are stopped, and their
+    buttons keep working through the persistent ``CoinRushButton`` handler, which
+    revives a fresh view on the next click.
+    """
+
+    def __init__(self, max_per_user=2, max_per_guild=200, idle_seconds=900):
+        self.max_per_user = max_per_user
+        self.max_per_guild = max_per_guild
+        self.idle_seconds = idle_seconds
+        self.views = OrderedDict()  # message_id -> view
+        self.by_guild = {}  # guild_id -> OrderedDict of message_id -> None
+        self.by_user = {}  # (guild_id, user_id) -> OrderedDict of message_id -> None
+        self.last_used = {}  # message_id -> monotonic time
+
+    def get(self, message_id):
+        return self.views.get(message_id)
+
+    def _groups(self, view):
+        guild_id = str(view.guild_id)
+        return (
+            self.by_guild.setdefault(guild_id, OrderedDict()),
+            self.by_user.setdefault((guild_id, view.user.id), OrderedDict())
+        )
+
+    def touch(self, view):
+        message_id = view.message.id
+        if message_id not in self.views:
+            return
+        self.views.move_to_end(message_id)
+        for group in self._groups(view):
+            group.move_to_end(message_id)
+        self.last_used[message_id] = time.monotonic()
+
+    def register(self, view):
+        """Track ``view`` (its message must be set) and stop any views pushed past a cap."""
+        message_id = view.message.id
+        self.views[message_id] = view
+        guild_views, user_views = self._groups(view)
+        guild_views[message_id] = None
+        user_views[message_id] = None
+        self.last_used[message_id] = time.monotonic()
+        for group, cap in ((user_views, self.max_per_user), (guild_views, self.max_per_guild)):
+            while len(group) > cap:
+                self.evict(self.views[next(iter(group))])
+
+    def remove(self, view):
+        message_id = view.message.id
+        if self.views.pop(message_id, None) is None:
+            return
+        del self.last_used[message_id]
+        guild_id = str(view.guild_id)
+        for groups, key in ((self.by_guild, guild_id), (self.by_user, (guild_id, view.user.id))):
+            group = groups[key]
+            del group[message_id]
+            if not group:
+                del groups[key]
+
+    def evict(self, view):
+        self.remove(view)
+        view.stop()
+
+    def evict_idle(self, now=None):
+        now = time.monotonic() if now is None else now
+        stale = [self.views[message_id] for message_id, used in self.last_used.items() if now - used > self.idle_seconds]
+        for view in stale:
+            self.evict(view)
+        return len(stale)
 
 class CoinRush(commands.Cog):
     """An enhanced economy game with jobs, coins, items, trading, achievements, and a casino (guild-only)."""
 
+    LEDGER_RETENTION_DAYS = 30
+
     def __init__(self, bot):
         self.bot = bot
         self.base_image_path = os.path.join("assets", "images", "coinrush_base.jpg")
@@ -77,181 +879,393 @@ class CoinRush(commands.Cog):
             "Cartel Boss": {"pay_min": 50, "pay_max": 100, "elicit": True, "emoji": "🕴️"},
             "Crypto Investor": {"pay_min": 5, "pay_max": 90, "elicit": False, "emoji": "📈"}
         }
-        self.shop_items = {
-            "Cool Hat": {"cost": 100, "effect": "work_boost", "value": 0.1, "sell_price": 75},
-            "Laser Gun": {"cost": 300, "effect": "steal_boost", "value": 0.15, "sell_price": 225},
-            "Medkit": {"cost": 150, "effect": "work_stability", "value": 10, "sell_price": 100},
-            "Stealth Cloak": {"cost": 250, "effect": "steal_protect", "value": 0.25, "sell_price": 175},
-            "Toolbox": {"cost": 120, "effect": "work_boost", "value": 0.05, "sell_price": 90},
-            "Shield": {"cost": 180, "effect": "steal_protect", "value": 0.15, "sell_price": 135},
-            "Jetpack": {"cost": 350, "effect": "work_boost", "value": 0.2, "sell_price": 260},
-            "Spy Drone": {"cost": 280, "effect": "steal_boost", "value": 0.1, "sell_price": 210},
-            "Lucky Coin": {"cost": 90, "effect": "work_stability", "value": 5, "sell_price": 65},
-            "Golden Key": {"cost": 400, "effect": "work_boost", "value": 0.25, "sell_price": 300},
-            "Smoke Bomb": {"cost": 220, "effect": "steal_protect", "value": 0.3, "sell_price": 165},
-            "Night Vision": {"cost": 260, "effect": "steal_boost", "value": 0.12, "sell_price": 195},
-            "VIP Badge": {"cost": 1000, "effect": "steal_protect", "value": 0.95, "sell_price": 750},
-            "Coffee Mug": {"cost": 80, "effect": "work_boost", "value": 0.08, "sell_price": 60},
-            "Lockpick Set": {"cost": 200, "effect": "steal_boost", "value": 0.2, "sell_price": 150},
-            "Steel Armor": {"cost": 320, "effect": "steal_protect", "value": 0.35, "sell_price": 240},
-            "Energy Drink": {"cost": 110, "effect": "work_stability", "value": 8, "sell_price": 80},
-            "Flashlight": {"cost": 140, "effect": "steal_boost", "value": 0.08, "sell_price": 105},
-            "Safe Box": {"cost": 270, "effect": "steal_protect", "value": 0.28, "sell_price": 200},
-            "Rocket Boots": {"cost": 380, "effect": "work_boost", "value": 0.22, "sell_price": 285}
-        }
-        self.achievements = {
-            "First Payday": {"description": "Earn your first coins from work", "condition": lambda data: data["total_earnings"] >= 1},
-            "Thief": {"description": "Successfully steal from someone", "condition": lambda data: data["steals"] >= 1},
-            "Millionaire": {"description": "Reach 1,000 coins", "condition": lambda data: data["coins"] >= 1000},
-            "Shopaholic": {"description": "Buy 5 items", "condition": lambda data: data["items_bought"] >= 5},
-            "Risk Taker": {"description": "Work an elicit job 10 times", "condition": lambda data: data["elicit_works"] >= 10},
-            "Investor": {"description": "Make a profit from investing", "condition": lambda data: data["investment_profits"] >= 1},
-            "Trader": {"description": "Complete a trade", "condition": lambda data: data["trades"] >= 1},
-            "VIP": {"description": "Own a VIP Badge", "condition": lambda data: "VIP Badge" in data["items"]},
-            "Gambler": {"description": "Win a jackpot in the casino", "condition": lambda data: data.get("jackpots_won", 0) >= 1}
-        }
+        self.shop_items = SHOP_ITEMS
+        self.achievements = ACHIEVEMENTS
         self.vip_role_name = "⭐VIP"
         self.easter_egg_encoded = "QnkxU2lyQ3J5cHRpYyDwn6W1IHJqdy1kYWQtbHktNC1ldmVyIC0gR2l0SHViOiBnaXRodWIuY29tL1NpckNyeXB0aWMgLSBEaXNGcmFtZXMgQ29yZS4="
+        self.db_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="coinrush-db")
+        self.players = PlayerCache(self.db_executor)
+        self.ranks = RankIndex()
+        self.targets = TargetPool()
+        self.views = ViewRegistry()
+        self.cooldowns = CooldownService()
+        self.bot.add_dynamic_items(CoinRushButton)
+        self.ledger = Ledger()
+        self.renderer = ImageRenderer(
+            [self.base_image_path, self.busted_image_path, self.hospital_image_path], self.font_path,
+            image_format=config.GAME_IMAGE_FORMAT, quality=config.GAME_IMAGE_QUALITY
+        )
+        self.flush_players.start()
+        self.flush_ledger.start()
+        self.compact_ledger.start()
+        self.evict_views.start()
 
-    def get_user_data(self, guild_id: str, user_id: str, session=None):
-        close_session = False
-        if session is None:
-            session = Session()
-            close_session = True
-        
-        guild = session.query(Guild).get(guild_id)
-        if not guild:
-            guild = Guild(id=guild_id)
-            session.add(guild)
-            session.commit()
-        
-        user = session.query(User).filter_by(id=user_id, guild_id=guild_id).first()
-        if not user:
-            user = User(id=user_id, guild_id=guild_id)
-            session.add(user)
-            session.commit()
-        
-        user_data = {
-            "coins": user.coins,
-            "items": json.loads(user.items),
-            "last_work": user.last_work,
-            "last_steal": user.last_steal,
-            "last_daily": user.last_daily,
-            "job": user.job,
-            "has_owned_vip": user.has_owned_vip,
-            "last_invest": user.last_invest,
-            "achievements": json.loads(user.achievements),
-            "total_earnings": user.total_earnings,
-            "steals": user.steals,
-            "items_bought": user.items_bought,
-            "elicit_works": user.elicit_works,
-            "investment_profits": user.investment_profits,
-            "trades": user.trades,
-            "jackpots_won": user.jackpots_won
-        }
-        
-        if close_session:
+    async def cog_load(self):
+        now = datetime.datetime.utcnow().timestamp()
+        self.cooldowns.load(await self.players.run(self.query_active_cooldowns, now), now)
+
+    async def cog_unload(self):
+        self.flush_players.cancel()
+        self.flush_ledger.cancel()
+        self.compact_ledger.cancel()
+        self.evict_views.cancel()
+        self.bot.remove_dynamic_items(CoinRushButton)
+        for view in list(self.views.views.values()):
+            self.views.evict(view)
+        try:
+            await self.players.flush()
+            await self.write_ledger()
+        finally:
+            self.db_executor.shutdown(wait=True)
+            self.renderer.close()
+
+    async def write_ledger(self):
+        rows = self.ledger.take()
+        try:
+            await self.players.run(Ledger.write, rows)
+        except SQLAlchemyError:
+            self.ledger.restore(rows)
+            raise
+
+    @tasks.loop(seconds=10)
+    async def flush_ledger(self):
+        """Append buffered ledger entries in one batch."""
+        try:
+            await self.write_ledger()
+        except SQLAlchemyError as e:
+            logger.error(f"Failed to write CoinRush ledger: {e}")
+
+    @tasks.loop(hours=24)
+    async def compact_ledger(self):
+        """Fold ledger entries past the retention window into per-player snapshots."""
+        cutoff = time.time() - self.LEDGER_RETENTION_DAYS * 86400
+        try:
+            removed = await self.players.run(Ledger.compact, cutoff)
+            if removed:
+                logger.info(f"Compacted {removed} CoinRush ledger entries")
+        except SQLAlchemyError as e:
+            logger.error(f"Failed to compact CoinRush ledger: {e}")
+
+    @tasks.loop(minutes=1)
+    async def evict_views(self):
+        """Stop game views nobody has clicked in a while; their buttons stay usable via revive_view."""
+        self.views.evict_idle()
+
+    async def revive_view(self, interaction: discord.Interaction, action: str, owner_id: int):
+        """Serve a click on a game message whose view is no longer live."""
+        if interaction.message is None or self.views.get(interaction.message.id):
+            return  # the live view is handling this click
+        if interaction.user.id != owner_id:
+            await interaction.response.send_message("This UI is for someone else!", ephemeral=True)
+            return
+        view = CoinRushView(self, interaction.user, interaction.guild.id)
+        view.message = interaction.message
+        self.bot.add_view(view, message_id=interaction.message.id)
+        self.views.register(view)
+        await getattr(view, f"{action}_button").callback(interaction)
+
+    @tasks.loop(seconds=30)
+    async def flush_players(self):
+        """Periodically write changed players to the database in one batch."""
+        self.cooldowns.prune(datetime.datetime.utcnow().timestamp())
+        try:
+            await self.players.flush()
+        except SQLAlchemyError as e:
+            logger.error(f"Failed to save CoinRush players: {e}")
+
+    async def get_user_data(self, guild_id: str, user_id: str):
+        """Return the cached player dict; mutate it and call save_user_data to persist."""
+        return await self.players.get(guild_id, user_id)
+
+    def save_user_data(self, guild_id: str, user_id: str, data: dict, reason: str = None, coins_before: int = None):
+        """Mark a player as changed; the write happens on the next flush.
+
+        ``reason`` labels the ledger entry if the balance moved (e.g. "work", "casino").
+        Pass the balance the caller started from as ``coins_before`` so only the
+        caller's own change is booked under ``reason``.
+        """
+        self.players.mark_dirty(guild_id, user_id, data)
+        self.index_player(guild_id, user_id, data)
+        delta = None if coins_before is None else data["coins"] - coins_before
+        self.record_coins(guild_id, user_id, data, reason, delta)
+
+    def index_player(self, guild_id, user_id, data):
+        """Keep the in-memory rank and steal-target indexes in step with a player's state."""
+        guild_id, user_id = str(guild_id), str(user_id)
+        self.ranks.update(guild_id, user_id, data["coins"])
+        self.targets.update(guild_id, user_id, data)
+        self.cooldowns.update_player(guild_id, user_id, data)
+
+    def record_coins(self, guild_id, user_id, data, reason=None, delta=None):
+        """Append ledger entries for the balance change since it was last recorded.
+
+        ``delta`` is the caller's own change; any other unrecorded movement is booked
+        separately as "adjust" rather than under ``reason``. Without ``delta`` the
+        whole movement is the caller's.
+        """
+        guild_id, user_id = str(guild_id), str(user_id)
+        unrecorded = data["coins"] - data["recorded_coins"]
+        if delta is None:
+            delta = unrecorded
+        if unrecorded != delta:
+            self.ledger.record(guild_id, user_id, unrecorded - delta, data["coins"] - delta, "adjust")
+        if delta:
+            self.ledger.record(guild_id, user_id, delta, data["coins"], reason or "adjust")
+        data["recorded_coins"] = data["coins"]
+
+    async def get_guild_data(self, guild_id: str):
+        """Return every player in a guild, preferring cached (possibly unsaved) state."""
+        guild_id = str(guild_id)
+        stored = await self.players.run(self.load_guild_players, guild_id)
+        guild_data = {user_id: self.players.peek(guild_id, user_id) or data for user_id, data in stored.items()}
+        for (cached_guild_id, user_id), data in self.players.entries.items():
+            if cached_guild_id == guild_id:
+                guild_data.setdefault(user_id, data)
+        return guild_data
+
+    async def get_leaderboard_page(self, guild_id: str, page: int, per_page: int = 10):
+        """Return (total_players, [(user_id, job, coins), ...]) for one page, richest first."""
+        guild_id = str(guild_id)
+        # The query reads the database, so write this guild's unsaved players first (if any)
+        dirty = [key for key in self.players.dirty if key[0] == guild_id]
+        if dirty:
+            await self.players.flush(dirty)
+        return await self.players.run(self.query_leaderboard_page, str(guild_id), page, per_page)
+
+    async def load_ranks(self, guild_id: str):
+        """Load a guild's rank index on first use."""
+        if not self.ranks.is_loaded(guild_id):
+            stored = await self.players.run(self.query_guild_coins, guild_id)
+            if not self.ranks.is_loaded(guild_id):
+                # Cached players may hold newer (unflushed) balances than the database
+                for (cached_guild_id, cached_user_id), data in self.players.entries.items():
+                    if cached_guild_id == guild_id:
+                        stored[cached_user_id] = data["coins"]
+                self.ranks.load(guild_id, stored.items())
+
+    async def get_player_ids(self, guild_id: str):
+        """Return the ids of everyone who has played in a guild, without loading their data."""
+        guild_id = str(guild_id)
+        await self.load_ranks(guild_id)
+        return self.ranks.players(guild_id)
+
+    async def get_rank(self, guild_id: str, user_id: str):
+        """Return a player's 1-based coin rank in the guild, or None if they have never played."""
+        guild_id, user_id = str(guild_id), str(user_id)
+        await self.load_ranks(guild_id)
+        cached = self.players.peek(guild_id, user_id)
+        if cached is not None:
+            self.ranks.update(guild_id, user_id, cached["coins"])
+        return self.ranks.rank(guild_id, user_id)
+
+    async def pick_steal_target(self, guild: discord.Guild, thief_id: str, weighted: bool = True, attempts: int = 8):
+        """Return a random member worth robbing (not the thief, not a bot), or None."""
+        guild_id = str(guild.id)
+        if not self.targets.is_loaded(guild_id):
+            stored = await self.players.run(self.query_steal_targets, guild_id)
+            if not self.targets.is_loaded(guild_id):
+                self.targets.load(guild_id, stored.items())
+                # Cached players may hold newer (unflushed) state than the database
+                for (cached_guild_id, user_id), data in list(self.players.entries.items()):
+                    if cached_guild_id == guild_id:
+                        self.targets.update(guild_id, user_id, data)
+        for _ in range(attempts):
+            target_id = self.targets.sample(guild_id, weighted=weighted)
+            if target_id is None:
+                return None
+            if target_id == thief_id:
+                continue
+            member = guild.get_member(int(target_id))
+            if member is not None and not member.bot:
+                return member
+        return None
+
+    @staticmethod
+    def query_active_cooldowns(now):
+        session = Session()
+        try:
+            columns = {action: getattr(User, f"last_{action}") for action in CooldownService.COOLDOWNS}
+            active = [column > now - CooldownService.COOLDOWNS[action] for action, column in columns.items()]
+            rows = session.query(User.guild_id, User.id, *columns.values()).filter(or_(*active))
+            return [(guild_id, user_id, dict(zip(columns, last_used))) for guild_id, user_id, *last_used in rows]
+        finally:
             session.close()
-        
-        return user_data
 
-    def save_user_data(self, guild_id: str, user_id: str, data: dict, session=None):
-        close_session = False
-        if session is None:
-            session = Session()
-            close_session = True
-        
-        guild = session.query(Guild).get(guild_id)
-        if not guild:
-            guild = Guild(id=guild_id)
-            session.add(guild)
-        
-        user = session.query(User).filter_by(id=user_id, guild_id=guild_id).first()
-        if not user:
-            user = User(id=user_id, guild_id=guild_id)
-            session.add(user)
-        
-        user.coins = data["coins"]
-        user.items = json.dumps(data["items"])
-        user.last_work = data["last_work"]
-        user.last_steal = data["last_steal"]
-        user.last_daily = data["last_daily"]
-        user.job = data["job"]
-        user.has_owned_vip = data["has_owned_vip"]
-        user.last_invest = data["last_invest"]
-        user.achievements = json.dumps(data["achievements"])
-        user.total_earnings = data["total_earnings"]
-        user.steals = data["steals"]
-        user.items_bought = data["items_bought"]
-        user.elicit_works = data["elicit_works"]
-        user.investment_profits = data["investment_profits"]
-        user.trades = data["trades"]
-        user.jackpots_won = data["jackpots_won"]
-        
-        session.commit()
-        if close_session:
+    @staticmethod
+    def query_steal_targets(guild_id):
+        session = Session()
+        try:
+            holders = session.query(InventoryItem.user_id).filter(InventoryItem.guild_id == guild_id)
+            return dict(
+                session.query(User.id, User.coins)
+                .filter(User.guild_id == guild_id)
+                .filter((User.coins >= STEAL_MIN_COINS) | User.id.in_(holders))
+            )
+        finally:
             session.close()
 
-    def get_guild_data(self, guild_id: str):
+    @staticmethod
+    def query_leaderboard_page(guild_id, page, per_page):
         session = Session()
-        guild = session.query(Guild).get(guild_id)
-        if not guild:
+        try:
+            total = session.query(func.count()).select_from(User).filter(User.guild_id == guild_id).scalar()
+            rows = (
+                session.query(User.id, User.job, User.coins)
+                .filter(User.guild_id == guild_id)
+                .order_by(User.coins.desc(), User.id)
+                .limit(per_page)
+                .offset(page * per_page)
+                .all()
+            )
+            return total, [tuple(row) for row in rows]
+        finally:
             session.close()
-            return {}
-        
-        guild_data = {}
-        for user in guild.users:
-            guild_data[user.id] = self.get_user_data(guild_id, user.id, session)
-        
-        session.close()
-        return guild_data
 
-    def save_guild_data(self, guild_id: str, data: dict):
+    @staticmethod
+    def query_guild_coins(guild_id):
         session = Session()
-        guild = session.query(Guild).get(guild_id)
-        if not guild:
-            guild = Guild(id=guild_id)
-            session.add(guild)
-        
-        for user_id, user_data in data.items():
-            self.save_user_data(guild_id, user_id, user_data, session)
-        
-        session.commit()
-        session.close()
+        try:
+            return dict(session.query(User.id, User.coins).filter(User.guild_id == guild_id))
+        finally:
+            session.close()
 
-    def check_achievements(self, user_id: str, guild_id: str):
+    @staticmethod
+    def load_guild_players(guild_id):
         session = Session()
-        user_data = self.get_user_data(guild_id, user_id, session)
-        unlocked = user_data.get("achievements", [])
-        new_unlocks = []
-        for ach_name, ach_data in self.achievements.items():
-            if ach_name not in unlocked and ach_data["condition"](user_data):
-                new_unlocks.append(ach_name)
-                unlocked.append(ach_name)
-        user_data["achievements"] = unlocked
-        self.save_user_data(guild_id, user_id, user_data, session)
-        session.close()
+        try:
+            inventories, achievements = {}, {}
+            for row in session.query(InventoryItem).filter_by(guild_id=guild_id):
+                inventories.setdefault(row.user_id, []).append((row.item, row.qty))
+            for row in session.query(UserAchievement).filter_by(guild_id=guild_id):
+                achievements.setdefault(row.user_id, []).append(row.achievement)
+            return {
+                user.id: user_to_data(user, inventories.get(user.id, ()), achievements.get(user.id, ()))
+                for user in session.query(User).filter_by(guild_id=guild_id)
+            }
+        finally:
+            session.close()
+
+    def save_guild_data(self, guild_id: str, data: dict):
+        for user_id, user_data in data.items():
+            self.save_user_data(guild_id, user_id, user_data)
+
+    async def transact(self, guild_id: str, user_ids, operation, reason=None, retries=3):
+        """Apply ``operation`` to several players atomically and commit them in one transaction.
+
+        ``operation`` receives {user_id: player dict} and must not await, so no other
+        coroutine can see a half-applied change; its return value is passed back. The
+        players are then written together under BEGIN IMMEDIATE with a version check.
+        If another writer got there first, the players are reloaded and the operation
+        re-run, up to ``retries`` times before StalePlayerError is raised. A database
+        error raises TransactionError. Either way the cached players are rolled back.
+        """
+        guild_id = str(guild_id)
+        user_ids = [str(user_id) for user_id in user_ids]
+        keys = [(guild_id, user_id) for user_id in user_ids]
+        try:
+            for attempt in range(retries):
+                for user_id in user_ids:
+                    await self.get_user_data(guild_id, user_id)
+                # Write changes made outside this transaction first; a stale or failed commit
+                # below discards the cached players, and must not take those changes with it
+                if any(key in self.players.dirty for key in keys):
+                    await self.players.flush(keys)
+                # Take the dicts only once every load has finished, so none was swapped out meanwhile
+                players = {user_id: self.players.peek(guild_id, user_id) for user_id in user_ids}
+                if None in players.values():
+                    continue  # evicted while another player was loading
+                coins_before = {user_id: data["coins"] for user_id, data in players.items()}
+                result = operation(players)
+                # Book each player's change now, before any await lets another handler's mix in;
+                # if the commit fails, these dicts are discarded along with their ledger marks
+                changes = []
+                for user_id, data in players.items():
+                    self.players.mark_dirty(guild_id, user_id, data)
+                    self.index_player(guild_id, user_id, data)
+                    delta = data["coins"] - coins_before[user_id]
+                    if delta:
+                        changes.append((user_id, delta, data["coins"]))
+                        data["recorded_coins"] += delta
+                try:
+                    await self.players.flush(keys, check_versions=True)
+                except StalePlayerError as e:
+                    logger.info(f"CoinRush transaction hit a stale player {e.args}, attempt {attempt + 1}/{retries}")
+                    continue
+                except SQLAlchemyError:
+                    await self.rollback_players(keys)
+                    raise
+                # Ledger entries only for the attempt that actually committed
+                for user_id, delta, balance in changes:
+                    self.ledger.record(guild_id, user_id, delta, balance, reason or "adjust")
+                return result
+        except SQLAlchemyError as e:
+            logger.error(f"CoinRush transaction for {user_ids} in {guild_id} failed: {e}")
+            raise TransactionError(guild_id, *user_ids) from e
+        await self.rollback_players(keys)
+        raise StalePlayerError(guild_id, *user_ids)
+
+    async def rollback_players(self, keys):
+        """Drop uncommitted changes to these players and re-index them from the database."""
+        for key in keys:
+            self.players.discard(key)
+        try:
+            for guild_id, user_id in keys:
+                self.index_player(guild_id, user_id, await self.get_user_data(guild_id, user_id))
+        except SQLAlchemyError as e:
+            logger.error(f"Failed to reload CoinRush players {keys}: {e}")
+
+    async def check_achievements(self, user_id: str, guild_id: str):
+        """Evaluate the achievements affected by the player's latest changes.
+
+        Unlocks are only marked on the cached player; the next flush writes them in a batch.
+        """
+        user_data = await self.get_user_data(guild_id, user_id)
+        new_unlocks = evaluate_achievements(user_data)
+        if new_unlocks:
+            self.save_user_data(guild_id, user_id, user_data)
         return new_unlocks
 
+    async def backfill_achievements(self, names=None):
+        """Evaluate achievements (all, or just ``names``) for every stored player.
+
+        Cached players are unlocked in memory; everyone else is evaluated in the
+        database thread and their unlocks inserted in one batch per guild.
+        Returns the number of new unlocks.
+        """
+        names = set(names or ACHIEVEMENTS)
+        unlocked = 0
+        for (guild_id, user_id), data in list(self.players.entries.items()):
+            new_unlocks = evaluate_achievements(data, names)
+            if new_unlocks:
+                unlocked += len(new_unlocks)
+                self.save_user_data(guild_id, user_id, data)
+        cached = set(self.players.entries)
+        return unlocked + await self.players.run(self.backfill_stored_achievements, names, cached)
+
+    @staticmethod
+    def backfill_stored_achievements(names, skip):
+        session = Session()
+        try:
+            guild_ids = [guild_id for guild_id, in session.query(User.guild_id).distinct()]
+        finally:
+            session.close()
+        unlocked = 0
+        for guild_id in guild_ids:
+            now = time.time()
+            rows = [
+                {"guild_id": guild_id, "user_id": user_id, "achievement": achievement, "unlocked_at": now}
+                for user_id, data in CoinRush.load_guild_players(guild_id).items()
+                if (guild_id, user_id) not in skip
+                for achievement in evaluate_achievements(data, names)
+            ]
+            if rows:
+                with engine.begin() as conn:
+                    conn.execute(sqlite_insert(UserAchievement).on_conflict_do_nothing(), rows)
+                unlocked += len(rows)
+        return unlocked
+
     def initialize_user_data(self):
-        return {
-            "coins": 0,
-            "items": [],
-            "last_work": 0,
-            "last_steal": 0,
-            "last_daily": 0,
-            "job": None,
-            "has_owned_vip": False,
-            "last_invest": 0,
-            "achievements": [],
-            "total_earnings": 0,
-            "steals": 0,
-            "items_bought": 0,
-            "elicit_works": 0,
-            "investment_profits": 0,
-            "trades": 0,
-            "jackpots_won": 0
-        }
+        return default_player_data()
 
     def create_embed(self, title, description, color=discord.Color.blue(), image_bytes=None):
         embed = discord.Embed(
@@ -261,8 +1275,9 @@ class CoinRush(commands.Cog):
             timestamp=datetime.datetime.utcnow()
         )
         if image_bytes:
-            file = discord.File(image_bytes, filename="image.png")
-            embed.set_image(url="attachment://image.png")
+            filename = f"image.{self.renderer.extension}"
+            file = discord.File(image_bytes, filename=filename)
+            embed.set_image(url=f"attachment://{filename}")
             return embed, file
         embed.set_footer(
             text=f"{config.BOT_NAME} v{config.BOT_VERSION}",
@@ -271,40 +1286,14 @@ class CoinRush(commands.Cog):
         return embed, None
 
     async def generate_image(self, message, busted=False, hospital=False):
-        try:
-            if hospital:
-                img_path = self.hospital_image_path
-            elif busted:
-                img_path = self.busted_image_path
-            else:
-                img_path = self.base_image_path
-            img = Image.open(img_path).convert("RGBA") if os.path.exists(img_path) else Image.new("RGBA", (600, 400), (100, 100, 100, 255))
-            draw = ImageDraw.Draw(img)
-            font_size = 60
-            font = ImageFont.truetype(self.font_path, font_size) if os.path.exists(self.font_path) else ImageFont.load_default()
-
-            text_color = (255, 255, 255)
-            outline_color = (0, 0, 0)
-            lines = message.split('\n')
-            total_height = len(lines) * font_size
-            start_y = (img.height - total_height) // 2
-
-            for i, line in enumerate(lines):
-                text_bbox = draw.textbbox((0, 0), line, font=font)
-                text_width = text_bbox[2] - text_bbox[0]
-                text_x = (img.width - text_width) // 2
-                text_y = start_y + i * font_size
-
-                for dx, dy in [(-2, -2), (2, 2), (-2, 2), (2, -2)]:
-                    draw.text((text_x + dx, text_y + dy), line, font=font, fill=outline_color)
-                draw.text((text_x, text_y), line, font=font, fill=text_color)
-
-            buffer = io.BytesIO()
-            img.save(buffer, format="PNG")
-            buffer.seek(0)
-            return buffer
-        except Exception:
-            return None
+        """Render an outcome image off the event loop; returns a BytesIO or None on failure."""
+        if hospital:
+            img_path = self.hospital_image_path
+        elif busted:
+            img_path = self.busted_image_path
+        else:
+            img_path = self.base_image_path
+        return await self.renderer.render(img_path, message)
 
     @commands.Cog.listener()
     async def on_guild_join(self, guild):
@@ -353,6 +1342,17 @@ class CoinRush(commands.Cog):
             embed, _ = self.create_embed("❌ Setup Failed", f"{ctx.author.mention}, an error occurred!")
             await ctx.send(embed=embed, delete_after=5)
 
+    @commands.command(name="coinrushbackfill")
+    @commands.is_owner()
+    async def coinrush_backfill(self, ctx, *, achievement: str = None):
+        if achievement and achievement not in self.achievements:
+            embed, _ = self.create_embed("❌ Unknown Achievement", f"{ctx.author.mention}, no achievement named '{achievement}'!")
+            await ctx.send(embed=embed, delete_after=5)
+            return
+        unlocked = await self.backfill_achievements([achievement] if achievement else None)
+        embed, _ = self.create_embed("🏆 Achievements Backfilled", f"{ctx.author.mention}, granted {unlocked} achievement unlocks.")
+        await ctx.send(embed=embed)
+
     @commands.command(name="coinhelp")
     async def coin_help(self, ctx):
         if not ctx.guild:
@@ -368,6 +1368,7 @@ class CoinRush(commands.Cog):
             f"`{BOT_PREFIX}daily` - Claim daily coins.\n"
             f"`{BOT_PREFIX}trade` - Trade coins/items.\n"
             f"`{BOT_PREFIX}coinleader` - Top coin holders.\n"
+            f"`{BOT_PREFIX}coinhistory` - Your recent coin changes.\n"
             f"`{BOT_PREFIX}achievements` - View your achievements.\n"
             f"`{BOT_PREFIX}coinhelp` - This menu.\n"
             f"`{BOT_PREFIX}coinrushsetup` - Setup VIP role.\n\n"
@@ -391,7 +1392,7 @@ class CoinRush(commands.Cog):
 
         user_id = str(ctx.author.id)
         guild_id = str(ctx.guild.id)
-        user_data = self.get_user_data(guild_id, user_id)
+        user_data = await self.get_user_data(guild_id, user_id)
         if not user_data:
             user_data = self.initialize_user_data()
             self.save_user_data(guild_id, user_id, user_data)
@@ -413,7 +1414,7 @@ class CoinRush(commands.Cog):
 
         user_id = str(ctx.author.id)
         guild_id = str(ctx.guild.id)
-        user_data = self.get_user_data(guild_id, user_id)
+        user_data = await self.get_user_data(guild_id, user_id)
         if not user_data:
             user_data = self.initialize_user_data()
             self.save_user_data(guild_id, user_id, user_data)
@@ -456,7 +1457,7 @@ class CoinRush(commands.Cog):
 
         user_id = str(ctx.author.id)
         guild_id = str(ctx.guild.id)
-        user_data = self.get_user_data(guild_id, user_id)
+        user_data = await self.get_user_data(guild_id, user_id)
         if not user_data:
             user_data = self.initialize_user_data()
             self.save_user_data(guild_id, user_id, user_data)
@@ -481,24 +1482,26 @@ class CoinRush(commands.Cog):
 
         user_id = str(ctx.author.id)
         guild_id = str(ctx.guild.id)
-        user_data = self.get_user_data(guild_id, user_id)
-        if not user_data:
-            user_data = self.initialize_user_data()
-            self.save_user_data(guild_id, user_id, user_data)
-
         now = datetime.datetime.utcnow().timestamp()
-        last_daily = user_data["last_daily"]
-        if now - last_daily < 86400:
-            remaining = int(86400 - (now - last_daily))
+        remaining = self.cooldowns.remaining(guild_id, user_id, "daily", now)
+        if remaining:
             hours, remainder = divmod(remaining, 3600)
             minutes = remainder // 60
             await ctx.send(f"{ctx.author.mention}, next daily in {hours}h {minutes}m!", delete_after=5)
             return
 
+        user_data = await self.get_user_data(guild_id, user_id)
+        if not user_data:
+            user_data = self.initialize_user_data()
+            self.save_user_data(guild_id, user_id, user_data)
+        if self.cooldowns.remaining(guild_id, user_id, "daily", now):
+            return  # a concurrent claim got in while the player loaded
+
         reward = random.randint(50, 100)
+        coins_before = user_data["coins"]
         user_data["coins"] += reward
         user_data["last_daily"] = now
-        self.save_user_data(guild_id, user_id, user_data)
+        self.save_user_data(guild_id, user_id, user_data, reason="daily", coins_before=coins_before)
         image = await self.generate_image(f"Success!\n+{reward} Coins")
         embed, file = self.create_embed("Daily Reward!", f"{ctx.author.mention}, claimed {reward} coins!", image_bytes=image)
         await ctx.send(embed=embed, file=file, ephemeral=True, delete_after=6)
@@ -512,16 +1515,12 @@ class CoinRush(commands.Cog):
 
         user_id = str(ctx.author.id)
         guild_id = str(ctx.guild.id)
-        guild_data = self.get_guild_data(guild_id)
-
-        # Initialize user data if not present
-        if user_id not in guild_data:
-            guild_data[user_id] = self.initialize_user_data()
-            self.save_user_data(guild_id, user_id, guild_data[user_id])
+        # New players are only dirty in the cache; index them so others can trade with them
+        self.index_player(guild_id, user_id, await self.get_user_data(guild_id, user_id))
 
         tradable_players = [
             (uid, self.bot.get_user(int(uid)))
-            for uid in guild_data.keys()
+            for uid in await self.get_player_ids(guild_id)
             if uid != user_id and self.bot.get_user(int(uid)) and not self.bot.get_user(int(uid)).bot
         ]
         if not tradable_players:
@@ -542,72 +1541,92 @@ class CoinRush(commands.Cog):
             return
 
         guild_id = str(ctx.guild.id)
-        guild_data = self.get_guild_data(guild_id)
-        if not guild_data:
+        total, rows = await self.get_leaderboard_page(guild_id, 0)
+        if not total:
             embed, _ = self.create_embed(f"Coinrush Leaderboard - {ctx.guild.name}", "No one has coins yet!")
             await ctx.send(embed=embed)
             return
+        own_rank = await self.get_rank(guild_id, str(ctx.author.id))
 
         class LeaderboardView(View):
-            def __init__(self, cog, guild, guild_data, page=0):
+            """Pages through the leaderboard one indexed query at a time."""
+            def __init__(self, cog, guild, total, rows, own_rank, page=0):
                 super().__init__(timeout=60)
                 self.cog = cog
                 self.guild = guild
-                self.guild_data = guild_data
+                self.total = total
+                self.rows = rows
+                self.own_rank = own_rank
                 self.page = page
                 self.per_page = 10
                 self.message = None
-                self.add_items()
+                self.update_buttons()
 
-            def get_sorted_players(self):
-                return sorted(self.guild_data.items(), key=lambda x: x[1]["coins"], reverse=True)
+            @property
+            def total_pages(self):
+                return max(1, (self.total + self.per_page - 1) // self.per_page)
 
             def format_leaderboard(self):
-                sorted_players = self.get_sorted_players()
-                total_pages = (len(sorted_players) + self.per_page - 1) // self.per_page
                 start = self.page * self.per_page
-                end = min(start + self.per_page, len(sorted_players))
                 rank_emojis = ["🥇", "🥈", "🥉"] + [f"{i+1}️⃣" for i in range(3, 10)]
                 leaderboard_text = "🏆Rank | 👤Player | ⚒️Job | 🪙Coins\n" + "-"*40 + "\n"
-                for i, (uid, data) in enumerate(sorted_players[start:end], start=start):
+                for i, (uid, job, coins) in enumerate(self.rows, start=start):
                     member = self.guild.get_member(int(uid))
                     name = member.display_name if member else f"Unknown ({uid})"
-                    job = data["job"] or "Unemployed"
+                    job = job or "Unemployed"
                     job_emoji = self.cog.jobs[job]["emoji"] if job in self.cog.jobs else "❓"
                     rank_emoji = rank_emojis[i] if i < len(rank_emojis) else f"{i+1}"
-                    leaderboard_text += f"{rank_emoji} | {name:<15} | {job_emoji} {job:<12} | {data['coins']}\n"
-                leaderboard_text += f"\nPage {self.page + 1}/{total_pages}"
+                    leaderboard_text += f"{rank_emoji} | {name:<15} | {job_emoji} {job:<12} | {coins}\n"
+                leaderboard_text += f"\nPage {self.page + 1}/{self.total_pages}"
+                if self.own_rank:
+                    leaderboard_text += f" • Your rank: #{self.own_rank}"
                 return leaderboard_text
 
-            def add_items(self):
-                self.clear_items()
-                sorted_players = self.get_sorted_players()
-                total_pages = (len(sorted_players) + self.per_page - 1) // self.per_page
-                self.add_item(Button(label="◀", style=discord.ButtonStyle.grey, custom_id="prev_page", disabled=self.page == 0))
-                self.add_item(Button(label="▶", style=discord.ButtonStyle.grey, custom_id="next_page", disabled=self.page >= total_pages - 1))
+            def update_buttons(self):
+                self.prev_page.disabled = self.page == 0
+                self.next_page.disabled = self.page >= self.total_pages - 1
 
-            async def update_view(self):
+            async def show_page(self, interaction, page):
+                self.total, self.rows = await self.cog.get_leaderboard_page(self.guild.id, page, self.per_page)
+                self.page = min(page, self.total_pages - 1)
+                self.update_buttons()
                 embed, _ = self.cog.create_embed(f"🏆 Coinrush Leaderboard - {self.guild.name}", self.format_leaderboard())
-                self.add_items()
-                await self.message.edit(embed=embed, view=self)
+                await interaction.response.edit_message(embed=embed, view=self)
 
-            @discord.ui.button(custom_id="prev_page")
+            @discord.ui.button(label="◀", style=discord.ButtonStyle.grey)
             async def prev_page(self, interaction: discord.Interaction, button: Button):
-                self.page -= 1
-                await self.update_view()
-                await interaction.response.defer()
+                await self.show_page(interaction, self.page - 1)
 
-            @discord.ui.button(custom_id="next_page")
+            @discord.ui.button(label="▶", style=discord.ButtonStyle.grey)
             async def next_page(self, interaction: discord.Interaction, button: Button):
-                self.page += 1
-                await self.update_view()
-                await interaction.response.defer()
+                await self.show_page(interaction, self.page + 1)
 
-        view = LeaderboardView(self, ctx.guild, guild_data)
+        view = LeaderboardView(self, ctx.guild, total, rows, own_rank)
         embed, _ = self.create_embed(f"🏆 Coinrush Leaderboard - {ctx.guild.name}", view.format_leaderboard())
         message = await ctx.send(embed=embed, view=view)
         view.message = message
 
+    @commands.command(name="coinhistory")
+    async def coin_history(self, ctx):
+        if not ctx.guild:
+            embed, _ = self.create_embed("❌ Guild-Only Game", f"{ctx.author.mention}, CoinRush is guild-only!")
+            await ctx.send(embed=embed, delete_after=5)
+            return
+
+        await self.write_ledger()
+        entries = await self.players.run(Ledger.history, str(ctx.guild.id), str(ctx.author.id), 15)
+        if not entries:
+            embed, _ = self.create_embed("📜 Coin History", f"{ctx.author.mention}, no coin activity yet!")
+            await ctx.send(embed=embed, delete_after=10)
+            return
+
+        lines = [
+            f"`{delta:+}` {reason.replace('_', ' ')} • 🪙 {balance} • <t:{int(created_at)}:R>"
+            for delta, balance, reason, created_at in entries
+        ]
+        embed, _ = self.create_embed(f"📜 {ctx.author.display_name}'s Coin History", "\n".join(lines))
+        await ctx.send(embed=embed)
+
     @commands.command(name="coin")
     async def coin_game(self, ctx):
         if not ctx.guild:
@@ -617,532 +1636,603 @@ class CoinRush(commands.Cog):
 
         user_id = str(ctx.author.id)
         guild_id = str(ctx.guild.id)
-        user_data = self.get_user_data(guild_id, user_id)
+        user_data = await self.get_user_data(guild_id, user_id)
         if not user_data:
             user_data = self.initialize_user_data()
             self.save_user_data(guild_id, user_id, user_data)
         job = user_data["job"] or "Unemployed"
         welcome_message = "Welcome back to CoinRush!" if user_data["job"] else "Welcome to CoinRush!"
 
-        class CoinRushView(View):
-            def __init__(self, cog, user, guild_id):
-                super().__init__(timeout=None)
-                self.cog = cog
-                self.user = user
-                self.guild_id = guild_id
-                self.message = None
-                self.shop_message = None
-                self.shop_open = False
+        embed, _ = self.create_embed("CoinRush Game", f"{ctx.author.mention}, {welcome_message}\nJob: {job}\nPlay below!")
+        view = CoinRushView(self, ctx.author, ctx.guild.id)
+        message = await ctx.send(embed=embed, view=view)
+        view.message = message
+        self.views.register(view)
 
-            async def interaction_check(self, interaction: discord.Interaction) -> bool:
-                if interaction.user.id != self.user.id:
-                    await interaction.response.send_message("This UI is for someone else!", ephemeral=True)
-                    return False
-                return True
+class CoinRushView(View):
+    ACTIONS = ("work", "steal", "shop", "balance", "invest", "trade", "casino", "finish")
 
-            async def notify_achievements(self, new_unlocks):
-                if new_unlocks:
-                    ach_text = "\n".join([f"🏆 **{ach}** - {self.cog.achievements[ach]['description']}" for ach in new_unlocks])
-                    embed, _ = self.cog.create_embed("Achievement Unlocked!", f"{self.user.mention}\n{ach_text}")
-                    await self.message.channel.send(embed=embed, delete_after=6)
+    def __init__(self, cog, user, guild_id):
+        super().__init__(timeout=None)
+        self.cog = cog
+        self.user = user
+        self.guild_id = guild_id
+        self.message = None
+        self.shop_message = None
+        self.shop_open = False
+        # Stable ids let CoinRushButton serve this message after the view is evicted or the bot restarts
+        for action in self.ACTIONS:
+            getattr(self, f"{action}_button").custom_id = f"coinrush:{action}:{user.id}"
 
-            @discord.ui.button(label="Work", style=discord.ButtonStyle.green, emoji="💼")
-            async def work_button(self, interaction: discord.Interaction, button: Button):
-                user_id = str(self.user.id)
-                guild_id = self.guild_id
-                user_data = self.cog.get_user_data(guild_id, user_id)
-                if not user_data:
-                    user_data = self.cog.initialize_user_data()
-                    self.cog.save_user_data(guild_id, user_id, user_data)
+    async def interaction_check(self, interaction: discord.Interaction) -> bool:
+        if interaction.user.id != self.user.id:
+            await interaction.response.send_message("This UI is for someone else!", ephemeral=True)
+            return False
+        self.cog.views.touch(self)
+        return True
 
-                now = datetime.datetime.utcnow().timestamp()
-                last_work = user_data["last_work"]
-                if now - last_work < 600:
-                    remaining = int(600 - (now - last_work))
-                    hours, remainder = divmod(remaining, 3600)
-                    minutes = remainder // 60
-                    await interaction.response.send_message(f"Work in {hours}h {minutes}m!", ephemeral=True)
-                    return
+    async def notify_achievements(self, new_unlocks):
+        if new_unlocks:
+            ach_text = "\n".join([f"🏆 **{ach}** - {self.cog.achievements[ach]['description']}" for ach in new_unlocks])
+            embed, _ = self.cog.create_embed("Achievement Unlocked!", f"{self.user.mention}\n{ach_text}")
+            await self.message.channel.send(embed=embed, delete_after=6)
 
-                job = user_data["job"]
-                if not job:
-                    await interaction.response.send_message(f"Set a job with `{BOT_PREFIX}setjob <job>`!", ephemeral=True)
-                    return
+    @discord.ui.button(label="Work", style=discord.ButtonStyle.green, emoji="💼")
+    async def work_button(self, interaction: discord.Interaction, button: Button):
+        user_id = str(self.user.id)
+        guild_id = self.guild_id
+        now = datetime.datetime.utcnow().timestamp()
+        # Answered from memory, so rejected clicks never load the player
+        remaining = self.cog.cooldowns.remaining(guild_id, user_id, "work", now)
+        if remaining:
+            hours, remainder = divmod(remaining, 3600)
+            minutes = remainder // 60
+            await interaction.response.send_message(f"Work in {hours}h {minutes}m!", ephemeral=True)
+            return
 
-                if random.random() < 0.05:
-                    bill = random.randint(20, 100)
-                    if "Medkit" in user_data["items"] and random.random() < 0.5:
-                        user_data["items"].remove("Medkit")
-                        image = await self.cog.generate_image("Success!\nMedkit Used!")
-                        embed, file = self.cog.create_embed("Hospital Avoided!", f"{self.user.mention}, used a Medkit to avoid a {bill} coin hospital bill!", image_bytes=image)
-                    else:
-                        user_data["coins"] -= bill
-                        image = await self.cog.generate_image(f"Hospital!\n-{bill} Coins")
-                        embed, file = self.cog.create_embed("Hospital Visit!", f"{self.user.mention}, bill: {bill} coins!", image_bytes=image)
-                else:
-                    pay_min = self.cog.jobs[job]["pay_min"]
-                    pay_max = self.cog.jobs[job]["pay_max"]
-                    for item in user_data["items"]:
-                        if self.cog.shop_items[item]["effect"] == "work_stability":
-                            pay_min += self.cog.shop_items[item]["value"]
-                    earnings = random.randint(pay_min, pay_max)
-                    for item in user_data["items"]:
-                        if self.cog.shop_items[item]["effect"] == "work_boost":
-                            earnings = int(earnings * (1 + self.cog.shop_items[item]["value"]))
-
-                    if self.cog.jobs[job]["elicit"] and random.random() < 0.2:
-                        fine = random.randint(50, 150)
-                        if "Smoke Bomb" in user_data["items"] and random.random() < 0.3:
-                            user_data["items"].remove("Smoke Bomb")
-                            image = await self.cog.generate_image("Success!\nSmoke Bomb Used!")
-                            embed, file = self.cog.create_embed("Bust Escaped!", f"{self.user.mention}, used a Smoke Bomb to escape a {fine} coin fine!", image_bytes=image)
-                        else:
-                            user_data["coins"] -= fine
-                            image = await self.cog.generate_image(f"Busted!\n-{fine} Coins")
-                            embed, file = self.cog.create_embed("Busted!", f"{self.user.mention}, busted as {job}! Paid {fine} coins!", image_bytes=image)
-                    else:
-                        user_data["coins"] += earnings
-                        user_data["total_earnings"] += earnings
-                        if self.cog.jobs[job]["elicit"]:
-                            user_data["elicit_works"] += 1
-                        image = await self.cog.generate_image(f"Success!\n+{earnings} Coins")
-                        embed, file = self.cog.create_embed("Work Complete!", f"{self.user.mention}, earned {earnings} coins as {job}!", image_bytes=image)
-
-                user_data["last_work"] = now
-                self.cog.save_user_data(guild_id, user_id, user_data)
-                new_unlocks = self.cog.check_achievements(user_id, self.guild_id)
-                await interaction.response.send_message(embed=embed, file=file, ephemeral=True, delete_after=6)
-                await self.notify_achievements(new_unlocks)
-
-            @discord.ui.button(label="Steal", style=discord.ButtonStyle.red, emoji="🕵️")
-            async def steal_button(self, interaction: discord.Interaction, button: Button):
-                user_id = str(self.user.id)
-                guild_id = self.guild_id
-                user_data = self.cog.get_user_data(guild_id, user_id)
-                if not user_data:
-                    user_data = self.cog.initialize_user_data()
-                    self.cog.save_user_data(guild_id, user_id, user_data)
+        user_data = await self.cog.get_user_data(guild_id, user_id)
+        if not user_data:
+            user_data = self.cog.initialize_user_data()
+            self.cog.save_user_data(guild_id, user_id, user_data)
+        if self.cog.cooldowns.remaining(guild_id, user_id, "work", now):
+            # A concurrent click got in while the player loaded
+            await interaction.response.send_message("You just worked, take a break!", ephemeral=True)
+            return
 
-                now = datetime.datetime.utcnow().timestamp()
-                last_steal = user_data["last_steal"]
-                if now - last_steal < 300:
-                    remaining = int(300 - (now - last_steal))
-                    hours, remainder = divmod(remaining, 3600)
-                    minutes = remainder // 60
-                    await interaction.response.send_message(f"Steal in {hours}h {minutes}m!", ephemeral=True)
-                    return
+        job = user_data["job"]
+        if not job:
+            await interaction.response.send_message(f"Set a job with `{BOT_PREFIX}setjob <job>`!", ephemeral=True)
+            return
 
-                target = random.choice([m for m in interaction.guild.members if m != self.user and not m.bot])
-                target_id = str(target.id)
-                target_data = self.cog.get_user_data(guild_id, target_id)
-                if not target_data:
-                    target_data = self.cog.initialize_user_data()
-                    self.cog.save_user_data(guild_id, target_id, target_data)
+        # Settle the shift and save it before the first await, so a double click sees the cooldown
+        coins_before = user_data["coins"]
+        if random.random() < 0.05:
+            bill = random.randint(20, 100)
+            if "Medkit" in user_data["items"] and random.random() < 0.5:
+                remove_item(user_data, "Medkit")
+                caption = "Success!\nMedkit Used!"
+                title, description = "Hospital Avoided!", f"{self.user.mention}, used a Medkit to avoid a {bill} coin hospital bill!"
+            else:
+                user_data["coins"] -= bill
+                caption = f"Hospital!\n-{bill} Coins"
+                title, description = "Hospital Visit!", f"{self.user.mention}, bill: {bill} coins!"
+        else:
+            modifiers = user_data["modifiers"]
+            pay_max = self.cog.jobs[job]["pay_max"]
+            pay_min = self.cog.jobs[job]["pay_min"] + modifiers["work_stability"]
+            earnings = int(random.randint(pay_min, max(pay_min, pay_max)) * modifiers["work_boost"])
+
+            if self.cog.jobs[job]["elicit"] and random.random() < 0.2:
+                fine = random.randint(50, 150)
+                if "Smoke Bomb" in user_data["items"] and random.random() < 0.3:
+                    remove_item(user_data, "Smoke Bomb")
+                    caption = "Success!\nSmoke Bomb Used!"
+                    title, description = "Bust Escaped!", f"{self.user.mention}, used a Smoke Bomb to escape a {fine} coin fine!"
+                else:
+                    user_data["coins"] -= fine
+                    caption = f"Busted!\n-{fine} Coins"
+                    title, description = "Busted!", f"{self.user.mention}, busted as {job}! Paid {fine} coins!"
+            else:
+                user_data["coins"] += earnings
+                user_data["total_earnings"] += earnings
+                if self.cog.jobs[job]["elicit"]:
+                    user_data["elicit_works"] += 1
+                caption = f"Success!\n+{earnings} Coins"
+                title, description = "Work Complete!", f"{self.user.mention}, earned {earnings} coins as {job}!"
+
+        user_data["last_work"] = now
+        self.cog.save_user_data(guild_id, user_id, user_data, reason="work", coins_before=coins_before)
+        image = await self.cog.generate_image(caption)
+        embed, file = self.cog.create_embed(title, description, image_bytes=image)
+        new_unlocks = await self.cog.check_achievements(user_id, self.guild_id)
+        await interaction.response.send_message(embed=embed, file=file, ephemeral=True, delete_after=6)
+        await self.notify_achievements(new_unlocks)
+
+    @discord.ui.button(label="Steal", style=discord.ButtonStyle.red, emoji="🕵️")
+    async def steal_button(self, interaction: discord.Interaction, button: Button):
+        user_id = str(self.user.id)
+        guild_id = self.guild_id
+        now = datetime.datetime.utcnow().timestamp()
+        remaining = self.cog.cooldowns.remaining(guild_id, user_id, "steal", now)
+        if remaining:
+            hours, remainder = divmod(remaining, 3600)
+            minutes = remainder // 60
+            await interaction.response.send_message(f"Steal in {hours}h {minutes}m!", ephemeral=True)
+            return
 
-                if target_data["coins"] < 10 and not target_data["items"]:
-                    await interaction.response.send_message(f"{target.mention} has nothing to steal!", ephemeral=True)
-                    return
+        user_data = await self.cog.get_user_data(guild_id, user_id)
+        if not user_data:
+            user_data = self.cog.initialize_user_data()
+            self.cog.save_user_data(guild_id, user_id, user_data)
 
-                steal_chance = 0.5
-                for item in user_data["items"]:
-                    if self.cog.shop_items[item]["effect"] == "steal_boost":
-                        steal_chance += self.cog.shop_items[item]["value"]
-                for item in target_data["items"]:
-                    if self.cog.shop_items[item]["effect"] == "steal_protect":
-                        steal_chance -= self.cog.shop_items[item]["value"]
-
-                if random.random() < steal_chance:
-                    if random.random() < 0.3 and target_data["items"]:
-                        stolen_item = random.choice(target_data["items"])
-                        user_data["items"].append(stolen_item)
-                        target_data["items"].remove(stolen_item)
-                        if stolen_item == "VIP Badge":
-                            vip_role = discord.utils.get(interaction.guild.roles, name=self.cog.vip_role_name)
-                            if vip_role:
-                                try:
-                                    await target.remove_roles(vip_role, reason="VIP Badge stolen")
-                                    await self.user.add_roles(vip_role, reason="VIP Badge stolen")
-                                except discord.errors.Forbidden:
-                                    await interaction.channel.send("Failed to manage VIP role!")
-                            target_data["has_owned_vip"] = False
-                        result = f"Item: {stolen_item}"
-                        image = await self.cog.generate_image(f"Success!\n{result}")
-                        embed, file = self.cog.create_embed("Steal Successful!", f"{self.user.mention} stole {result} from {target.mention}!", image_bytes=image)
-                    else:
-                        stolen = random.randint(5, 20)
-                        if "Lockpick Set" in user_data["items"] and random.random() < 0.4:
-                            stolen = int(stolen * 1.5)
-                            user_data["items"].remove("Lockpick Set")
-                            result = f"{stolen} Coins (Lockpick Bonus!)"
-                            image = await self.cog.generate_image(f"Success!\n{result}")
-                            embed, file = self.cog.create_embed("Steal Successful!", f"{self.user.mention} used a Lockpick Set to steal {stolen} coins from {target.mention}!", image_bytes=image)
-                        else:
-                            result = f"{stolen} Coins"
-                            image = await self.cog.generate_image(f"Success!\n{result}")
-                            embed, file = self.cog.create_embed("Steal Successful!", f"{self.user.mention} stole {stolen} coins from {target.mention}!", image_bytes=image)
-                        user_data["coins"] += stolen
-                        target_data["coins"] -= stolen
-                    user_data["steals"] += 1
-                else:
-                    penalty = min(10, max(0, user_data["coins"]))
-                    if "Smoke Bomb" in user_data["items"] and random.random() < 0.3:
-                        user_data["items"].remove("Smoke Bomb")
-                        image = await self.cog.generate_image("Success!\nSmoke Bomb Used!")
-                        embed, file = self.cog.create_embed("Escape Successful!", f"{self.user.mention} used a Smoke Bomb to escape a {penalty} coin penalty!", image_bytes=image)
-                    else:
-                        user_data["coins"] -= penalty
-                        image = await self.cog.generate_image(f"Caught!\n-{penalty} Coins")
-                        embed, file = self.cog.create_embed("Steal Failed!", f"{self.user.mention} caught stealing from {target.mention}, lost {penalty} coins!", image_bytes=image)
-
-                user_data["last_steal"] = now
-                self.cog.save_user_data(guild_id, user_id, user_data)
-                self.cog.save_user_data(guild_id, target_id, target_data)
-                new_unlocks = self.cog.check_achievements(user_id, self.guild_id)
-                await interaction.response.send_message(embed=embed, file=file, ephemeral=True, delete_after=6)
-                await self.notify_achievements(new_unlocks)
-
-            @discord.ui.button(label="Shop", style=discord.ButtonStyle.blurple, emoji="🛒")
-            async def shop_button(self, interaction: discord.Interaction, button: Button):
-                if self.shop_open:
-                    await interaction.response.send_message("Shop already open!", ephemeral=True)
-                    return
+        target = await self.cog.pick_steal_target(interaction.guild, user_id)
+        if target is None:
+            await interaction.response.send_message("No one around is worth robbing right now!", ephemeral=True)
+            return
+        target_id = str(target.id)
+
+        def attempt_steal(players):
+            # Runs without awaiting, so both balances change together or not at all
+            user_data, target_data = players[user_id], players[target_id]
+            if now - user_data["last_steal"] < 300:
+                return {"outcome": "cooldown"}
+            if target_data["coins"] < STEAL_MIN_COINS and not target_data["items"]:
+                return {"outcome": "empty"}
+            user_data["last_steal"] = now
+            steal_chance = 0.5 + user_data["modifiers"]["steal_boost"] - target_data["modifiers"]["steal_protect"]
+            if random.random() < steal_chance:
+                user_data["steals"] += 1
+                if random.random() < 0.3 and target_data["items"]:
+                    stolen_item = random.choice(target_data["items"])
+                    add_item(user_data, stolen_item)
+                    remove_item(target_data, stolen_item)
+                    if stolen_item == "VIP Badge":
+                        target_data["has_owned_vip"] = False
+                    return {"outcome": "item", "item": stolen_item}
+                stolen = random.randint(5, 20)
+                lockpick = "Lockpick Set" in user_data["items"] and random.random() < 0.4
+                if lockpick:
+                    stolen = int(stolen * 1.5)
+                    remove_item(user_data, "Lockpick Set")
+                user_data["coins"] += stolen
+                target_data["coins"] -= stolen
+                return {"outcome": "coins", "stolen": stolen, "lockpick": lockpick}
+            penalty = min(10, max(0, user_data["coins"]))
+            if "Smoke Bomb" in user_data["items"] and random.random() < 0.3:
+                remove_item(user_data, "Smoke Bomb")
+                return {"outcome": "escaped", "penalty": penalty}
+            user_data["coins"] -= penalty
+            return {"outcome": "caught", "penalty": penalty}
 
-                self.shop_open = True
-                for item in self.children:
-                    item.disabled = True
-                await self.message.edit(view=self)
+        try:
+            result = await self.cog.transact(guild_id, [user_id, target_id], attempt_steal, reason="steal")
+        except StalePlayerError:
+            await interaction.response.send_message("The heist got interrupted, try again!", ephemeral=True)
+            return
+        except TransactionError:
+            await interaction.response.send_message("Couldn't save the heist, please try again later!", ephemeral=True)
+            return
+        if result["outcome"] == "cooldown":
+            await interaction.response.send_message("You just stole, lay low for a bit!", ephemeral=True)
+            return
+        if result["outcome"] == "empty":
+            await interaction.response.send_message(f"{target.mention} has nothing to steal!", ephemeral=True)
+            return
 
-                user_id = str(self.user.id)
-                guild_id = self.guild_id
-                user_data = self.cog.get_user_data(guild_id, user_id)
-                if not user_data:
-                    user_data = self.cog.initialize_user_data()
-                    self.cog.save_user_data(guild_id, user_id, user_data)
+        if result["outcome"] == "item":
+            stolen_item = result["item"]
+            if stolen_item == "VIP Badge":
+                vip_role = discord.utils.get(interaction.guild.roles, name=self.cog.vip_role_name)
+                if vip_role:
+                    try:
+                        await target.remove_roles(vip_role, reason="VIP Badge stolen")
+                        await self.user.add_roles(vip_role, reason="VIP Badge stolen")
+                    except discord.errors.Forbidden:
+                        await interaction.channel.send("Failed to manage VIP role!")
+            steal_result = f"Item: {stolen_item}"
+            image = await self.cog.generate_image(f"Success!\n{steal_result}")
+            embed, file = self.cog.create_embed("Steal Successful!", f"{self.user.mention} stole {steal_result} from {target.mention}!", image_bytes=image)
+        elif result["outcome"] == "coins":
+            stolen = result["stolen"]
+            if result["lockpick"]:
+                image = await self.cog.generate_image(f"Success!\n{stolen} Coins (Lockpick Bonus!)")
+                embed, file = self.cog.create_embed("Steal Successful!", f"{self.user.mention} used a Lockpick Set to steal {stolen} coins from {target.mention}!", image_bytes=image)
+            else:
+                image = await self.cog.generate_image(f"Success!\n{stolen} Coins")
+                embed, file = self.cog.create_embed("Steal Successful!", f"{self.user.mention} stole {stolen} coins from {target.mention}!", image_bytes=image)
+        elif result["outcome"] == "escaped":
+            image = await self.cog.generate_image("Success!\nSmoke Bomb Used!")
+            embed, file = self.cog.create_embed("Escape Successful!", f"{self.user.mention} used a Smoke Bomb to escape a {result['penalty']} coin penalty!", image_bytes=image)
+        else:
+            penalty = result["penalty"]
+            image = await self.cog.generate_image(f"Caught!\n-{penalty} Coins")
+            embed, file = self.cog.create_embed("Steal Failed!", f"{self.user.mention} caught stealing from {target.mention}, lost {penalty} coins!", image_bytes=image)
+
+        new_unlocks = await self.cog.check_achievements(user_id, self.guild_id)
+        await interaction.response.send_message(embed=embed, file=file, ephemeral=True, delete_after=6)
+        await self.notify_achievements(new_unlocks)
+
+    @discord.ui.button(label="Shop", style=discord.ButtonStyle.blurple, emoji="🛒")
+    async def shop_button(self, interaction: discord.Interaction, button: Button):
+        if self.shop_open:
+            await interaction.response.send_message("Shop already open!", ephemeral=True)
+            return
 
-                shop_list = "\n".join([f"{item}: {data['cost']} coins ({data['effect']})" for item, data in self.cog.shop_items.items()])
-                embed, _ = self.cog.create_embed("CoinRush Shop", f"Items:\n{shop_list}\n\nSelect to buy/sell!")
-
-                class ShopSelect(Select):
-                    def __init__(self, cog, user, guild_id, parent_view):
-                        options = [discord.SelectOption(label=item, description=f"{data['cost']} coins") for item, data in cog.shop_items.items()]
-                        super().__init__(placeholder="Buy an item", options=options)
-                        self.cog = cog
-                        self.user = user
-                        self.guild_id = guild_id
-                        self.parent_view = parent_view
-
-                    async def callback(self, interaction: discord.Interaction):
-                        await interaction.response.send_message("Processing...", ephemeral=True)
-                        item = self.values[0]
-                        cost = self.cog.shop_items[item]["cost"]
-                        user_id = str(self.user.id)
-                        guild_id = self.guild_id
-                        user_data = self.cog.get_user_data(guild_id, user_id)
-                        if not user_data:
-                            user_data = self.cog.initialize_user_data()
-                            self.cog.save_user_data(guild_id, user_id, user_data)
-
-                        if user_data["coins"] < cost:
-                            await interaction.followup.send(f"Not enough coins for {item} (need {cost})!", ephemeral=True)
-                            return
-                        if item in user_data["items"]:
-                            await interaction.followup.send(f"You already own {item}!", ephemeral=True)
-                            return
-                        user_data["coins"] -= cost
-                        user_data["items"].append(item)
-                        user_data["items_bought"] += 1
-                        if item == "VIP Badge":
-                            user_data["has_owned_vip"] = True
-                            vip_role = discord.utils.get(interaction.guild.roles, name=self.cog.vip_role_name)
-                            if vip_role:
-                                try:
-                                    await self.user.add_roles(vip_role, reason="VIP Badge purchased")
-                                except discord.errors.Forbidden:
-                                    await interaction.followup.send("Failed to assign VIP role!", ephemeral=True)
-                        self.cog.save_user_data(guild_id, user_id, user_data)
-                        image = await self.cog.generate_image(f"Success!\nBought {item}!")
-                        embed, file = self.cog.create_embed("Purchase Complete!", f"{self.user.mention} bought {item} for {cost} coins!", image_bytes=image)
-                        new_unlocks = self.cog.check_achievements(user_id, self.guild_id)
-                        await interaction.followup.send(embed=embed, file=file, ephemeral=True, delete_after=6)
-                        await self.parent_view.notify_achievements(new_unlocks)
-
-                class SellSelect(Select):
-                    def __init__(self, cog, user, guild_id, parent_view):
-                        user_id = str(user.id)
-                        guild_id = cog.guild_id
-                        user_data = cog.get_user_data(guild_id, user_id)
-                        if not user_data:
-                            user_data = cog.initialize_user_data()
-                            cog.save_user_data(guild_id, user_id, user_data)
-                        options = [discord.SelectOption(label=item, description=f"Sell for {cog.shop_items[item]['sell_price']} coins")
-                                  for item in set(user_data["items"])] if user_data["items"] else [discord.SelectOption(label="No items", description="Nothing to sell")]
-                        super().__init__(placeholder="Sell an item", options=options)
-                        self.cog = cog
-                        self.user = user
-                        self.guild_id = guild_id
-                        self.parent_view = parent_view
-
-                    async def callback(self, interaction: discord.Interaction):
-                        await interaction.response.defer()
-                        item = self.values[0]
-                        if item == "No items":
-                            await interaction.followup.send("No items to sell!", ephemeral=True)
-                            return
-                        user_id = str(self.user.id)
-                        guild_id = self.guild_id
-                        user_data = self.cog.get_user_data(guild_id, user_id)
-                        if not user_data:
-                            user_data = self.cog.initialize_user_data()
-                            self.cog.save_user_data(guild_id, user_id, user_data)
-                        sell_price = self.cog.shop_items[item]["sell_price"]
-                        user_data["coins"] += sell_price
-                        user_data["items"].remove(item)
-                        if item == "VIP Badge" and "VIP Badge" not in user_data["items"]:
-                            vip_role = discord.utils.get(interaction.guild.roles, name=self.cog.vip_role_name)
-                            if vip_role:
-                                try:
-                                    await self.user.remove_roles(vip_role, reason="VIP Badge sold")
-                                except discord.errors.Forbidden:
-                                    await interaction.followup.send("Failed to remove VIP role!", ephemeral=True)
-                            user_data["has_owned_vip"] = False
-                        self.cog.save_user_data(guild_id, user_id, user_data)
-                        image = await self.cog.generate_image(f"Success!\nSold {item}!")
-                        embed, file = self.cog.create_embed("Sale Complete!", f"{self.user.mention} sold {item} for {sell_price} coins!", image_bytes=image)
-                        await interaction.followup.send(embed=embed, file=file, ephemeral=True, delete_after=6)
-
-                shop_view = View()
-                shop_view.add_item(ShopSelect(self.cog, self.user, self.guild_id, self))
-                shop_view.add_item(SellSelect(self.cog, self.user, self.guild_id, self))
-                shop_view.add_item(Button(label="Close Shop", style=discord.ButtonStyle.red, emoji="❌", custom_id="close_shop"))
-
-                async def close_shop_callback(interaction: discord.Interaction):
-                    if interaction.user.id != self.user.id:
-                        await interaction.response.send_message("Only the owner can close!", ephemeral=True)
-                        return
-                    self.shop_open = False
-                    for item in self.children:
-                        item.disabled = False
-                    await self.message.edit(view=self)
-                    if self.shop_message:
-                        try:
-                            await self.shop_message.delete()
-                        except (discord.errors.Forbidden, discord.errors.NotFound):
-                            pass
-                        self.shop_message = None
-                    await interaction.response.send_message("Shop closed!", ephemeral=True)
+        self.shop_open = True
+        for item in self.children:
+            item.disabled = True
+        await self.message.edit(view=self)
 
-                for item in shop_view.children:
-                    if item.custom_id == "close_shop":
-                        item.callback = close_shop_callback
+        user_id = str(self.user.id)
+        guild_id = self.guild_id
+        user_data = await self.cog.get_user_data(guild_id, user_id)
+        if not user_data:
+            user_data = self.cog.initialize_user_data()
+            self.cog.save_user_data(guild_id, user_id, user_data)
 
-                self.shop_message = await interaction.channel.send(embed=embed, view=shop_view, delete_after=60)
-                await interaction.response.defer()
+        shop_list = "\n".join([f"{item}: {data['cost']} coins ({data['effect']})" for item, data in self.cog.shop_items.items()])
+        embed, _ = self.cog.create_embed("CoinRush Shop", f"Items:\n{shop_list}\n\nSelect to buy/sell!")
 
-            @discord.ui.button(label="Balance", style=discord.ButtonStyle.grey, emoji="💰")
-            async def balance_button(self, interaction: discord.Interaction, button: Button):
+        class ShopSelect(Select):
+            def __init__(self, cog, user, guild_id, parent_view):
+                options = [discord.SelectOption(label=item, description=f"{data['cost']} coins") for item, data in cog.shop_items.items()]
+                super().__init__(placeholder="Buy an item", options=options)
+                self.cog = cog
+                self.user = user
+                self.guild_id = guild_id
+                self.parent_view = parent_view
+
+            async def callback(self, interaction: discord.Interaction):
+                await interaction.response.send_message("Processing...", ephemeral=True)
+                item = self.values[0]
+                cost = self.cog.shop_items[item]["cost"]
                 user_id = str(self.user.id)
                 guild_id = self.guild_id
-                user_data = self.cog.get_user_data(guild_id, user_id)
+                user_data = await self.cog.get_user_data(guild_id, user_id)
                 if not user_data:
                     user_data = self.cog.initialize_user_data()
                     self.cog.save_user_data(guild_id, user_id, user_data)
 
-                if user_data["coins"] == 1337:
-                    easter_egg_message = base64.b64decode(self.cog.easter_egg_encoded).decode('utf-8')
-                    embed, _ = self.cog.create_embed(
-                        "1337 Easter Egg!",
-                        f"{self.user.mention}, magic number hit!\n\n*{easter_egg_message}*"
-                    )
-                else:
-                    items = ", ".join(user_data["items"]) if user_data["items"] else "None"
-                    job = user_data["job"] or "Unemployed"
-                    job_emoji = self.cog.jobs[job]["emoji"] if job in self.cog.jobs else "❓"
-                    ach_count = len(user_data["achievements"])
-                    embed, _ = self.cog.create_embed(
-                        "Your Balance",
-                        f"{self.user.mention}\n🪙 Coins: {user_data['coins']}\n{job_emoji} Job: {job}\n🎒 Items: {items}\n🏆 Achievements: {ach_count}/{len(self.cog.achievements)}"
-                    )
-                await interaction.response.send_message(embed=embed, ephemeral=True)
+                if user_data["coins"] < cost:
+                    await interaction.followup.send(f"Not enough coins for {item} (need {cost})!", ephemeral=True)
+                    return
+                if item in user_data["items"]:
+                    await interaction.followup.send(f"You already own {item}!", ephemeral=True)
+                    return
+                coins_before = user_data["coins"]
+                user_data["coins"] -= cost
+                add_item(user_data, item)
+                user_data["items_bought"] += 1
+                if item == "VIP Badge":
+                    user_data["has_owned_vip"] = True
+                # Save before awaiting the role change, so the cached dict can't be replaced in between
+                self.cog.save_user_data(guild_id, user_id, user_data, reason="shop_buy", coins_before=coins_before)
+                if item == "VIP Badge":
+                    vip_role = discord.utils.get(interaction.guild.roles, name=self.cog.vip_role_name)
+                    if vip_role:
+                        try:
+                            await self.user.add_roles(vip_role, reason="VIP Badge purchased")
+                        except discord.errors.Forbidden:
+                            await interaction.followup.send("Failed to assign VIP role!", ephemeral=True)
+                image = await self.cog.generate_image(f"Success!\nBought {item}!")
+                embed, file = self.cog.create_embed("Purchase Complete!", f"{self.user.mention} bought {item} for {cost} coins!", image_bytes=image)
+                new_unlocks = await self.cog.check_achievements(user_id, self.guild_id)
+                await interaction.followup.send(embed=embed, file=file, ephemeral=True, delete_after=6)
+                await self.parent_view.notify_achievements(new_unlocks)
+
+        class SellSelect(Select):
+            def __init__(self, cog, user, guild_id, parent_view, user_data):
+                options = [discord.SelectOption(label=item, description=f"Sell for {cog.shop_items[item]['sell_price']} coins")
+                          for item in set(user_data["items"])] if user_data["items"] else [discord.SelectOption(label="No items", description="Nothing to sell")]
+                super().__init__(placeholder="Sell an item", options=options)
+                self.cog = cog
+                self.user = user
+                self.guild_id = guild_id
+                self.parent_view = parent_view
 
-            @discord.ui.button(label="Invest", style=discord.ButtonStyle.grey, emoji="📈")
-            async def invest_button(self, interaction: discord.Interaction, button: Button):
+            async def callback(self, interaction: discord.Interaction):
+                await interaction.response.defer()
+                item = self.values[0]
+                if item == "No items":
+                    await interaction.followup.send("No items to sell!", ephemeral=True)
+                    return
                 user_id = str(self.user.id)
                 guild_id = self.guild_id
-                user_data = self.cog.get_user_data(guild_id, user_id)
+                user_data = await self.cog.get_user_data(guild_id, user_id)
                 if not user_data:
                     user_data = self.cog.initialize_user_data()
                     self.cog.save_user_data(guild_id, user_id, user_data)
-
-                now = datetime.datetime.utcnow().timestamp()
-                last_invest = user_data.get("last_invest", 0)
-                if now - last_invest < 1800:
-                    remaining = int(1800 - (now - last_invest))
-                    hours, remainder = divmod(remaining, 3600)
-                    minutes = remainder // 60
-                    await interaction.response.send_message(f"Invest again in {minutes}m!", ephemeral=True)
+                if item not in user_data["items"]:
+                    await interaction.followup.send(f"You no longer own {item}!", ephemeral=True)
                     return
+                sell_price = self.cog.shop_items[item]["sell_price"]
+                coins_before = user_data["coins"]
+                user_data["coins"] += sell_price
+                remove_item(user_data, item)
+                lost_vip = item == "VIP Badge" and "VIP Badge" not in user_data["items"]
+                if lost_vip:
+                    user_data["has_owned_vip"] = False
+                # Save before awaiting the role change, so the cached dict can't be replaced in between
+                self.cog.save_user_data(guild_id, user_id, user_data, reason="shop_sell", coins_before=coins_before)
+                if lost_vip:
+                    vip_role = discord.utils.get(interaction.guild.roles, name=self.cog.vip_role_name)
+                    if vip_role:
+                        try:
+                            await self.user.remove_roles(vip_role, reason="VIP Badge sold")
+                        except discord.errors.Forbidden:
+                            await interaction.followup.send("Failed to remove VIP role!", ephemeral=True)
+                image = await self.cog.generate_image(f"Success!\nSold {item}!")
+                embed, file = self.cog.create_embed("Sale Complete!", f"{self.user.mention} sold {item} for {sell_price} coins!", image_bytes=image)
+                await interaction.followup.send(embed=embed, file=file, ephemeral=True, delete_after=6)
+
+        shop_view = View()
+        shop_view.add_item(ShopSelect(self.cog, self.user, self.guild_id, self))
+        shop_view.add_item(SellSelect(self.cog, self.user, self.guild_id, self, user_data))
+        shop_view.add_item(Button(label="Close Shop", style=discord.ButtonStyle.red, emoji="❌", custom_id="close_shop"))
+
+        async def close_shop_callback(interaction: discord.Interaction):
+            if interaction.user.id != self.user.id:
+                await interaction.response.send_message("Only the owner can close!", ephemeral=True)
+                return
+            self.shop_open = False
+            for item in self.children:
+                item.disabled = False
+            await self.message.edit(view=self)
+            if self.shop_message:
+                try:
+                    await self.shop_message.delete()
+                except (discord.errors.Forbidden, discord.errors.NotFound):
+                    pass
+                self.shop_message = None
+            await interaction.response.send_message("Shop closed!", ephemeral=True)
 
-                if user_data["coins"] < 50:
-                    await interaction.response.send_message("You need at least 50 coins to invest!", ephemeral=True)
-                    return
+        for item in shop_view.children:
+            if item.custom_id == "close_shop":
+                item.callback = close_shop_callback
 
-                investment = min(random.randint(50, 200), user_data["coins"])
-                user_data["coins"] -= investment
-                success_chance = 0.6 if user_data["job"] == "Crypto Investor" else 0.5
-                if random.random() < success_chance:
-                    profit = int(investment * random.uniform(1.2, 2.0))
-                    user_data["coins"] += profit
-                    user_data["investment_profits"] += profit - investment
-                    image = await self.cog.generate_image(f"Success!\n+{profit - investment} Coins")
-                    embed, file = self.cog.create_embed("Investment Success!", f"{self.user.mention} invested {investment} coins and earned {profit} coins!", image_bytes=image)
-                else:
-                    loss = investment
-                    image = await self.cog.generate_image(f"Failed!\n-{loss} Coins")
-                    embed, file = self.cog.create_embed("Investment Failed!", f"{self.user.mention} lost {loss} coins in a bad investment!", image_bytes=image)
-
-                user_data["last_invest"] = now
-                self.cog.save_user_data(guild_id, user_id, user_data)
-                new_unlocks = self.cog.check_achievements(user_id, self.guild_id)
-                await interaction.response.send_message(embed=embed, file=file, ephemeral=True, delete_after=6)
-                await self.notify_achievements(new_unlocks)
-
-            @discord.ui.button(label="Trade", style=discord.ButtonStyle.grey, emoji="🤝")
-            async def trade_button(self, interaction: discord.Interaction, button: Button):
-                if self.shop_open:
-                    await interaction.response.send_message("Finish current task first!", ephemeral=True)
-                    return
+        self.shop_message = await interaction.channel.send(embed=embed, view=shop_view, delete_after=60)
+        await interaction.response.defer()
 
-                if self.shop_message:
-                    try:
-                        await self.shop_message.delete()
-                    except (discord.errors.Forbidden, discord.errors.NotFound):
-                        pass
-                    self.shop_message = None
+    @discord.ui.button(label="Balance", style=discord.ButtonStyle.grey, emoji="💰")
+    async def balance_button(self, interaction: discord.Interaction, button: Button):
+        user_id = str(self.user.id)
+        guild_id = self.guild_id
+        user_data = await self.cog.get_user_data(guild_id, user_id)
+        if not user_data:
+            user_data = self.cog.initialize_user_data()
+            self.cog.save_user_data(guild_id, user_id, user_data)
+
+        if user_data["coins"] == 1337:
+            easter_egg_message = base64.b64decode(self.cog.easter_egg_encoded).decode('utf-8')
+            embed, _ = self.cog.create_embed(
+                "1337 Easter Egg!",
+                f"{self.user.mention}, magic number hit!\n\n*{easter_egg_message}*"
+            )
+        else:
+            items = ", ".join(user_data["items"]) if user_data["items"] else "None"
+            job = user_data["job"] or "Unemployed"
+            job_emoji = self.cog.jobs[job]["emoji"] if job in self.cog.jobs else "❓"
+            ach_count = len(user_data["achievements"])
+            rank = await self.cog.get_rank(guild_id, user_id)
+            rank_line = f"\n🏅 Rank: #{rank}" if rank else ""
+            embed, _ = self.cog.create_embed(
+                "Your Balance",
+                f"{self.user.mention}\n🪙 Coins: {user_data['coins']}{rank_line}\n{job_emoji} Job: {job}\n🎒 Items: {items}\n🏆 Achievements: {ach_count}/{len(self.cog.achievements)}"
+            )
+        await interaction.response.send_message(embed=embed, ephemeral=True)
 
-                self.shop_open = True
-                for item in self.children:
-                    item.disabled = True
-                await self.message.edit(view=self)
+    @discord.ui.button(label="Invest", style=discord.ButtonStyle.grey, emoji="📈")
+    async def invest_button(self, interaction: discord.Interaction, button: Button):
+        user_id = str(self.user.id)
+        guild_id = self.guild_id
+        now = datetime.datetime.utcnow().timestamp()
+        remaining = self.cog.cooldowns.remaining(guild_id, user_id, "invest", now)
+        if remaining:
+            minutes = remaining // 60
+            await interaction.response.send_message(f"Invest again in {minutes}m!", ephemeral=True)
+            return
 
-                user_id = str(self.user.id)
-                guild_id = self.guild_id
-                guild_data = self.cog.get_guild_data(guild_id)
-                if user_id not in guild_data:
-                    guild_data[user_id] = self.cog.initialize_user_data()
-                    self.cog.save_user_data(guild_id, user_id, guild_data[user_id])
-
-                tradable_players = [
-                    (uid, self.cog.bot.get_user(int(uid)))
-                    for uid in guild_data.keys()
-                    if uid != user_id and self.cog.bot.get_user(int(uid)) and not self.cog.bot.get_user(int(uid)).bot
-                ]
-                if not tradable_players:
-                    await interaction.response.send_message("No valid trade partners!", ephemeral=True)
-                    self.shop_open = False
-                    for item in self.children:
-                        item.disabled = False
-                    await self.message.edit(view=self)
-                    return
+        user_data = await self.cog.get_user_data(guild_id, user_id)
+        if not user_data:
+            user_data = self.cog.initialize_user_data()
+            self.cog.save_user_data(guild_id, user_id, user_data)
+        if self.cog.cooldowns.remaining(guild_id, user_id, "invest", now):
+            # A concurrent click got in while the player loaded
+            await interaction.response.send_message("You just invested, wait a bit!", ephemeral=True)
+            return
 
-                embed, _ = self.cog.create_embed("🤝 Trade Hub", f"{self.user.mention}, select a player to trade with!")
-                trade_select_view = TradeSelect(self.cog, self.user, self.guild_id, self, tradable_players)
-                self.shop_message = await interaction.channel.send(embed=embed, view=trade_select_view, delete_after=60)
-                trade_select_view.message = self.shop_message
-                await interaction.response.send_message("Trade hub opened!", ephemeral=True)
+        if user_data["coins"] < 50:
+            await interaction.response.send_message("You need at least 50 coins to invest!", ephemeral=True)
+            return
 
-            @discord.ui.button(label="Casino", style=discord.ButtonStyle.grey, emoji="🎰")
-            async def casino_button(self, interaction: discord.Interaction, button: Button):
-                if self.shop_open:
-                    await interaction.response.send_message("Finish current task first!", ephemeral=True)
-                    return
+        # Settle the investment and save it before the first await, so a double click sees the cooldown
+        coins_before = user_data["coins"]
+        investment = min(random.randint(50, 200), user_data["coins"])
+        user_data["coins"] -= investment
+        success_chance = 0.6 if user_data["job"] == "Crypto Investor" else 0.5
+        if random.random() < success_chance:
+            profit = int(investment * random.uniform(1.2, 2.0))
+            user_data["coins"] += profit
+            user_data["investment_profits"] += profit - investment
+            caption = f"Success!\n+{profit - investment} Coins"
+            title, description = "Investment Success!", f"{self.user.mention} invested {investment} coins and earned {profit} coins!"
+        else:
+            loss = investment
+            caption = f"Failed!\n-{loss} Coins"
+            title, description = "Investment Failed!", f"{self.user.mention} lost {loss} coins in a bad investment!"
+
+        user_data["last_invest"] = now
+        self.cog.save_user_data(guild_id, user_id, user_data, reason="invest", coins_before=coins_before)
+        image = await self.cog.generate_image(caption)
+        embed, file = self.cog.create_embed(title, description, image_bytes=image)
+        new_unlocks = await self.cog.check_achievements(user_id, self.guild_id)
+        await interaction.response.send_message(embed=embed, file=file, ephemeral=True, delete_after=6)
+        await self.notify_achievements(new_unlocks)
+
+    @discord.ui.button(label="Trade", style=discord.ButtonStyle.grey, emoji="🤝")
+    async def trade_button(self, interaction: discord.Interaction, button: Button):
+        if self.shop_open:
+            await interaction.response.send_message("Finish current task first!", ephemeral=True)
+            return
 
-                self.shop_open = True
-                for item in self.children:
-                    item.disabled = True
-                await self.message.edit(view=self)
+        if self.shop_message:
+            try:
+                await self.shop_message.delete()
+            except (discord.errors.Forbidden, discord.errors.NotFound):
+                pass
+            self.shop_message = None
 
-                user_id = str(self.user.id)
-                guild_id = self.guild_id
-                user_data = self.cog.get_user_data(guild_id, user_id)
-                if not user_data:
-                    user_data = self.cog.initialize_user_data()
-                    self.cog.save_user_data(guild_id, user_id, user_data)
+        self.shop_open = True
+        for item in self.children:
+            item.disabled = True
+        await self.message.edit(view=self)
 
-                embed, _ = self.cog.create_embed("🎰 CoinRush Casino", f"{self.user.mention}, welcome to the casino!\nType a bet amount to play slots (e.g., '50').\nMatch 3 symbols to win!")
-                self.shop_message = await interaction.channel.send(embed=embed, delete_after=60)
-                await interaction.response.defer()
+        user_id = str(self.user.id)
+        guild_id = self.guild_id
+        self.cog.index_player(guild_id, user_id, await self.cog.get_user_data(guild_id, user_id))
 
-                def check(m):
-                    return m.author.id == self.user.id and m.channel == interaction.channel and m.content.isdigit()
+        tradable_players = [
+            (uid, self.cog.bot.get_user(int(uid)))
+            for uid in await self.cog.get_player_ids(guild_id)
+            if uid != user_id and self.cog.bot.get_user(int(uid)) and not self.cog.bot.get_user(int(uid)).bot
+        ]
+        if not tradable_players:
+            await interaction.response.send_message("No valid trade partners!", ephemeral=True)
+            self.shop_open = False
+            for item in self.children:
+                item.disabled = False
+            await self.message.edit(view=self)
+            return
 
-                try:
-                    msg = await self.cog.bot.wait_for("message", check=check, timeout=30)
-                    bet = int(msg.content)
-                    if bet < 1:
-                        await interaction.channel.send("Bet must be at least 1 coin!", delete_after=5)
-                        self.shop_open = False
-                        for item in self.children:
-                            item.disabled = False
-                        await self.message.edit(view=self)
-                        await self.shop_message.delete()
-                        return
-                    if user_data["coins"] < bet:
-                        await interaction.channel.send(f"Not enough coins! You have {user_data['coins']} coins.", delete_after=5)
-                        self.shop_open = False
-                        for item in self.children:
-                            item.disabled = False
-                        await self.message.edit(view=self)
-                        await self.shop_message.delete()
-                        return
+        embed, _ = self.cog.create_embed("🤝 Trade Hub", f"{self.user.mention}, select a player to trade with!")
+        trade_select_view = TradeSelect(self.cog, self.user, self.guild_id, self, tradable_players)
+        self.shop_message = await interaction.channel.send(embed=embed, view=trade_select_view, delete_after=60)
+        trade_select_view.message = self.shop_message
+        await interaction.response.send_message("Trade hub opened!", ephemeral=True)
 
-                    user_data["coins"] -= bet
-                    result = [random.choice(["🍒", "🍋", "💎", "7️⃣"]) for _ in range(3)]
-                    if result[0] == result[1] == result[2]:
-                        winnings = bet * 5
-                        user_data["coins"] += winnings
-                        user_data["jackpots_won"] = user_data.get("jackpots_won", 0) + 1
-                        image = await self.cog.generate_image(f"Success!\n+{winnings} Coins")
-                        embed, file = self.cog.create_embed("🎰 Jackpot!", f"{self.user.mention} spun {result} and won {winnings} coins!", image_bytes=image)
-                    else:
-                        image = await self.cog.generate_image(f"Failed!\n-{bet} Coins")
-                        embed, file = self.cog.create_embed("🎰 No Luck!", f"{self.user.mention} spun {result} and lost {bet} coins.", image_bytes=image)
+    @discord.ui.button(label="Casino", style=discord.ButtonStyle.grey, emoji="🎰")
+    async def casino_button(self, interaction: discord.Interaction, button: Button):
+        if self.shop_open:
+            await interaction.response.send_message("Finish current task first!", ephemeral=True)
+            return
 
-                    self.cog.save_user_data(guild_id, user_id, user_data)
-                    new_unlocks = self.cog.check_achievements(user_id, self.guild_id)
-                    await interaction.channel.send(embed=embed, file=file, delete_after=6)
-                    await self.notify_achievements(new_unlocks)
+        self.shop_open = True
+        for item in self.children:
+            item.disabled = True
+        await self.message.edit(view=self)
 
-                except asyncio.TimeoutError:
-                    await interaction.channel.send("Casino timed out!", delete_after=5)
+        user_id = str(self.user.id)
+        guild_id = self.guild_id
+        user_data = await self.cog.get_user_data(guild_id, user_id)
+        if not user_data:
+            user_data = self.cog.initialize_user_data()
+            self.cog.save_user_data(guild_id, user_id, user_data)
+
+        embed, _ = self.cog.create_embed("🎰 CoinRush Casino", f"{self.user.mention}, welcome to the casino!\nType a bet amount to play slots (e.g., '50').\nMatch 3 symbols to win!")
+        self.shop_message = await interaction.channel.send(embed=embed, delete_after=60)
+        await interaction.response.defer()
+
+        def check(m):
+            return m.author.id == self.user.id and m.channel == interaction.channel and m.content.isdigit()
 
+        try:
+            msg = await self.cog.bot.wait_for("message", check=check, timeout=30)
+            bet = int(msg.content)
+            # The cached player may have changed or been evicted during the wait; use the current one
+            user_data = await self.cog.get_user_data(guild_id, user_id)
+            if bet < 1:
+                await interaction.channel.send("Bet must be at least 1 coin!", delete_after=5)
                 self.shop_open = False
                 for item in self.children:
                     item.disabled = False
                 await self.message.edit(view=self)
                 await self.shop_message.delete()
-
-            @discord.ui.button(label="Finish", style=discord.ButtonStyle.red, emoji="🏁")
-            async def finish_button(self, interaction: discord.Interaction, button: Button):
-                for item in self.children:
-                    item.disabled = True
-                embed, _ = self.cog.create_embed("Game Over", f"{self.user.mention}, session ended!")
+                return
+            if user_data["coins"] < bet:
+                await interaction.channel.send(f"Not enough coins! You have {user_data['coins']} coins.", delete_after=5)
                 self.shop_open = False
+                for item in self.children:
+                    item.disabled = False
+                await self.message.edit(view=self)
+                await self.shop_message.delete()
+                return
+
+            coins_before = user_data["coins"]
+            user_data["coins"] -= bet
+            result = [random.choice(["🍒", "🍋", "💎", "7️⃣"]) for _ in range(3)]
+            jackpot = result[0] == result[1] == result[2]
+            if jackpot:
+                winnings = bet * 5
+                user_data["coins"] += winnings
+                user_data["jackpots_won"] = user_data.get("jackpots_won", 0) + 1
+            # Commit the spin before awaiting the render, so nothing can act on half-applied state
+            self.cog.save_user_data(guild_id, user_id, user_data, reason="casino", coins_before=coins_before)
+            if jackpot:
+                image = await self.cog.generate_image(f"Success!\n+{winnings} Coins")
+                embed, file = self.cog.create_embed("🎰 Jackpot!", f"{self.user.mention} spun {result} and won {winnings} coins!", image_bytes=image)
+            else:
+                image = await self.cog.generate_image(f"Failed!\n-{bet} Coins")
+                embed, file = self.cog.create_embed("🎰 No Luck!", f"{self.user.mention} spun {result} and lost {bet} coins.", image_bytes=image)
+
+            new_unlocks = await self.cog.check_achievements(user_id, self.guild_id)
+            await interaction.channel.send(embed=embed, file=file, delete_after=6)
+            await self.notify_achievements(new_unlocks)
+
+        except asyncio.TimeoutError:
+            await interaction.channel.send("Casino timed out!", delete_after=5)
+
+        self.shop_open = False
+        for item in self.children:
+            item.disabled = False
+        await self.message.edit(view=self)
+        await self.shop_message.delete()
+
+    @discord.ui.button(label="Finish", style=discord.ButtonStyle.red, emoji="🏁")
+    async def finish_button(self, interaction: discord.Interaction, button: Button):
+        for item in self.children:
+            item.disabled = True
+        embed, _ = self.cog.create_embed("Game Over", f"{self.user.mention}, session ended!")
+        self.shop_open = False
+        try:
+            await interaction.response.edit_message(embed=embed, view=self)
+            if self.shop_message:
                 try:
-                    await interaction.response.edit_message(embed=embed, view=self)
-                    if self.shop_message:
-                        try:
-                            await self.shop_message.delete()
-                        except (discord.errors.Forbidden, discord.errors.NotFound):
-                            pass
-                        self.shop_message = None
-                except discord.errors.HTTPException:
-                    await interaction.channel.send("Session ended, but couldn’t update UI!")
-                self.stop()
+                    await self.shop_message.delete()
+                except (discord.errors.Forbidden, discord.errors.NotFound):
+                    pass
+                self.shop_message = None
+        except discord.errors.HTTPException:
+            await interaction.channel.send("Session ended, but couldn’t update UI!")
+        self.cog.views.remove(self)
+        self.stop()
 
-        embed, _ = self.create_embed("CoinRush Game", f"{ctx.author.mention}, {welcome_message}\nJob: {job}\nPlay below!")
-        view = CoinRushView(self, ctx.author, ctx.guild.id)
-        message = await ctx.send(embed=embed, view=view)
-        view.message = message
+class CoinRushButton(discord.ui.DynamicItem[Button], template=r"coinrush:(?P<action>[a-z]+):(?P<user_id>[0-9]+)"):
+    """Persistent handler for game buttons whose view was evicted or lost in a restart.
+
+    The template also matches buttons of live views, which discord.py dispatches to
+    both; such clicks are recognised in ``from_custom_id`` and dropped by
+    ``interaction_check`` before any callback is scheduled.
+    """
+
+    def __init__(self, action: str, user_id: int, live: bool = False):
+        super().__init__(Button(custom_id=f"coinrush:{action}:{user_id}"))
+        self.action = action
+        self.user_id = user_id
+        self.live = live
+
+    @classmethod
+    async def from_custom_id(cls, interaction: discord.Interaction, item: Button, match):
+        cog = interaction.client.get_cog("CoinRush")
+        live = cog is not None and interaction.message is not None and cog.views.get(interaction.message.id) is not None
+        return cls(match["action"], int(match["user_id"]), live=live)
+
+    async def interaction_check(self, interaction: discord.Interaction) -> bool:
+        return not self.live  # the live view handles this click
+
+    async def callback(self, interaction: discord.Interaction):
+        cog = interaction.client.get_cog("CoinRush")
+        if cog is not None and self.action in CoinRushView.ACTIONS:
+            await cog.revive_view(interaction, self.action, self.user_id)
 
 class TradeSelect(View):
     def __init__(self, cog, user, guild_id, parent_view, targets):
@@ -1176,11 +2266,11 @@ class TradeSelect(View):
         guild_id = self.guild_id
         
         # Ensure both initiator and target have data
-        initiator_data = self.cog.get_user_data(guild_id, str(self.user.id))
+        initiator_data = await self.cog.get_user_data(guild_id, str(self.user.id))
         if not initiator_data:
             initiator_data = self.cog.initialize_user_data()
             self.cog.save_user_data(guild_id, str(self.user.id), initiator_data)
-        target_data = self.cog.get_user_data(guild_id, target_id)
+        target_data = await self.cog.get_user_data(guild_id, target_id)
         if not target_data:
             target_data = self.cog.initialize_user_data()
             self.cog.save_user_data(guild_id, target_id, target_data)
@@ -1221,7 +2311,7 @@ class TradeSelect(View):
             async def offer_coins(self, interaction: discord.Interaction, button: Button):
                 user_id = str(interaction.user.id)
                 guild_id = self.guild_id
-                user_data = self.cog.get_user_data(guild_id, user_id)
+                user_data = await self.cog.get_user_data(guild_id, user_id)
                 if not user_data:
                     user_data = self.cog.initialize_user_data()
                     self.cog.save_user_data(guild_id, user_id, user_data)
@@ -1242,7 +2332,7 @@ class TradeSelect(View):
             async def offer_item(self, interaction: discord.Interaction, button: Button):
                 user_id = str(interaction.user.id)
                 guild_id = self.guild_id
-                user_data = self.cog.get_user_data(guild_id, user_id)
+                user_data = await self.cog.get_user_data(guild_id, user_id)
                 if not user_data:
                     user_data = self.cog.initialize_user_data()
                     self.cog.save_user_data(guild_id, user_id, user_data)
@@ -1279,87 +2369,74 @@ class TradeSelect(View):
                     guild_id = self.guild_id
                     initiator_id = str(self.initiator.id)
                     target_id = str(self.target.id)
-                    
-                    initiator_data = self.cog.get_user_data(guild_id, initiator_id)
-                    if not initiator_data:
-                        initiator_data = self.cog.initialize_user_data()
-                        self.cog.save_user_data(guild_id, initiator_id, initiator_data)
-                    target_data = self.cog.get_user_data(guild_id, target_id)
-                    if not target_data:
-                        target_data = self.cog.initialize_user_data()
-                        self.cog.save_user_data(guild_id, target_id, target_data)
-
-                    for item in self.initiator_offer["items"]:
-                        if item not in initiator_data["items"]:
-                            embed, _ = self.cog.create_embed("Trade Failed", f"{self.initiator.mention} doesn’t have {item}!")
-                            await interaction.channel.send(embed=embed, delete_after=6)
-                            self.parent_view.shop_open = False
-                            for item in self.parent_view.children:
-                                item.disabled = False
-                            try:
-                                await self.parent_view.message.edit(view=self.parent_view)
-                            except discord.errors.NotFound:
-                                pass
-                            await self.message.delete()
-                            self.stop()
-                            return
-                    for item in self.target_offer["items"]:
-                        if item not in target_data["items"]:
-                            embed, _ = self.cog.create_embed("Trade Failed", f"{self.target.mention} doesn’t have {item}!")
-                            await interaction.channel.send(embed=embed, delete_after=6)
-                            self.parent_view.shop_open = False
-                            for item in self.parent_view.children:
-                                item.disabled = False
+                    sides = [
+                        (self.initiator, initiator_id, self.initiator_offer, target_id),
+                        (self.target, target_id, self.target_offer, initiator_id)
+                    ]
+
+                    def execute_trade(players):
+                        # Validate and swap in one step, so an offer can't be spent elsewhere in between
+                        for member, user_id, offer, _ in sides:
+                            data = players[user_id]
+                            missing = Counter(offer["items"]) - Counter(data["items"])
+                            if missing:
+                                return member, next(iter(missing))
+                            if data["coins"] < offer["coins"]:
+                                return member, f"{offer['coins']} coins"
+                        for _, user_id, offer, other_id in sides:
+                            giver, receiver = players[user_id], players[other_id]
+                            giver["coins"] -= offer["coins"]
+                            receiver["coins"] += offer["coins"]
+                            for item in offer["items"]:
+                                remove_item(giver, item)
+                                add_item(receiver, item)
+                                if item == "VIP Badge":
+                                    giver["has_owned_vip"] = False
+                            giver["trades"] += 1
+                        return None
+
+                    try:
+                        failure = await self.cog.transact(guild_id, [initiator_id, target_id], execute_trade, reason="trade")
+                    except StalePlayerError:
+                        failure = (self.initiator, "an up-to-date balance (try again)")
+                    except TransactionError:
+                        await interaction.followup.send("Couldn't save the trade, press Accept to try again!", ephemeral=True)
+                        return
+                    if failure:
+                        member, missing = failure
+                        embed, _ = self.cog.create_embed("Trade Failed", f"{member.mention} doesn’t have {missing}!")
+                        await interaction.channel.send(embed=embed, delete_after=6)
+                        self.parent_view.shop_open = False
+                        for item in self.parent_view.children:
+                            item.disabled = False
+                        try:
+                            await self.parent_view.message.edit(view=self.parent_view)
+                        except discord.errors.NotFound:
+                            pass
+                        await self.message.delete()
+                        self.stop()
+                        return
+
+                    for giver, _, offer, _ in sides:
+                        if "VIP Badge" not in offer["items"]:
+                            continue
+                        receiver = self.target if giver is self.initiator else self.initiator
+                        vip_role = discord.utils.get(interaction.guild.roles, name=self.cog.vip_role_name)
+                        if vip_role:
                             try:
-                                await self.parent_view.message.edit(view=self.parent_view)
-                            except discord.errors.NotFound:
-                                pass
-                            await self.message.delete()
-                            self.stop()
-                            return
-
-                    initiator_data["coins"] -= self.initiator_offer["coins"]
-                    initiator_data["coins"] += self.target_offer["coins"]
-                    target_data["coins"] -= self.target_offer["coins"]
-                    target_data["coins"] += self.initiator_offer["coins"]
-
-                    for item in self.initiator_offer["items"]:
-                        initiator_data["items"].remove(item)
-                        target_data["items"].append(item)
-                        if item == "VIP Badge":
-                            vip_role = discord.utils.get(interaction.guild.roles, name=self.cog.vip_role_name)
-                            if vip_role:
-                                try:
-                                    await self.initiator.remove_roles(vip_role, reason="VIP Badge traded")
-                                    await self.target.add_roles(vip_role, reason="VIP Badge received")
-                                except discord.errors.Forbidden:
-                                    await interaction.channel.send("Failed to manage VIP role!", delete_after=5)
-                            initiator_data["has_owned_vip"] = False
-                    for item in self.target_offer["items"]:
-                        target_data["items"].remove(item)
-                        initiator_data["items"].append(item)
-                        if item == "VIP Badge":
-                            vip_role = discord.utils.get(interaction.guild.roles, name=self.cog.vip_role_name)
-                            if vip_role:
-                                try:
-                                    await self.target.remove_roles(vip_role, reason="VIP Badge traded")
-                                    await self.initiator.add_roles(vip_role, reason="VIP Badge received")
-                                except discord.errors.Forbidden:
-                                    await interaction.channel.send("Failed to manage VIP role!", delete_after=5)
-                            target_data["has_owned_vip"] = False
-
-                    initiator_data["trades"] += 1
-                    target_data["trades"] += 1
-                    self.cog.save_user_data(guild_id, initiator_id, initiator_data)
-                    self.cog.save_user_data(guild_id, target_id, target_data)
+                                await giver.remove_roles(vip_role, reason="VIP Badge traded")
+                                await receiver.add_roles(vip_role, reason="VIP Badge received")
+                            except discord.errors.Forbidden:
+                                await interaction.channel.send("Failed to manage VIP role!", delete_after=5)
+
                     embed, _ = self.cog.create_embed(
                         "Trade Complete!",
                         f"{self.initiator.mention} gave: {self.initiator_offer['coins']} coins, {', '.join(self.initiator_offer['items']) or 'None'}\n"
                         f"{self.target.mention} gave: {self.target_offer['coins']} coins, {', '.join(self.target_offer['items']) or 'None'}"
                     )
                     await interaction.channel.send(embed=embed)
-                    new_unlocks_initiator = self.cog.check_achievements(initiator_id, self.guild_id)
-                    new_unlocks_target = self.cog.check_achievements(target_id, self.guild_id)
+                    new_unlocks_initiator = await self.cog.check_achievements(initiator_id, self.guild_id)
+                    new_unlocks_target = await self.cog.check_achievements(target_id, self.guild_id)
                     if new_unlocks_initiator:
                         embed, _ = self.cog.create_embed("Achievement Unlocked!", f"{self.initiator.mention}\n" + "\n".join([f"🏆 **{ach}**" for ach in new_unlocks_initiator]))
                         await interaction.channel.send(embed=embed, delete_after=6)
@@ -4,11 +4,10 @@ import config
 from config import BOT_PREFIX
 import random
 import aiohttp
-from PIL import Image, ImageDraw, ImageFont
-import io
 import os
 import datetime
 import base64
+from cmds.games._imaging import ImageRenderer
 
 class GuessGame(commands.Cog):
     """A cog for a Guess the Number game with text feedback, supporting multiplayer in guilds and solo in DMs."""
@@ -19,15 +18,14 @@ class GuessGame(commands.Cog):
         self.font_path = os.path.join("assets", "fonts", "impact.ttf")
         self.games = {}  # Store active games: {(guild_id, channel_id/user_id): secret_number}
         self.easter_egg_encoded = "VGhlIEFuc3dlciBpcyA0MiEgLSBCeSBTaXJDcnlwdGlj"
+        # Feedback messages are a handful of fixed strings, so after the first render each is a cache hit
+        self.renderer = ImageRenderer(
+            [self.base_image_path], self.font_path, workers=1, cache_size=16,
+            image_format=config.GAME_IMAGE_FORMAT, quality=config.GAME_IMAGE_QUALITY
+        )
 
-    def _load_base_image(self):
-        """Load the base image for guesses, with a fallback if missing."""
-        try:
-            if not os.path.exists(self.base_image_path):
-                return Image.new("RGBA", (600, 400), (100, 100, 100, 255))  # Gray background
-            return Image.open(self.base_image_path).convert("RGBA")
-        except Exception:
-            return Image.new("RGBA", (600, 400), (100, 100, 100, 255))
+    def cog_unload(self):
+        self.renderer.close()
 
     def create_embed(self, title, description, color=discord.Color.blue(), image_file=None):
         """Helper method for clean embeds."""
@@ -47,42 +45,10 @@ class GuessGame(commands.Cog):
 
     async def generate_feedback_image(self, message):
         """Generate an image with a feedback message using impact.ttf."""
-        try:
-            img = self._load_base_image()
-            draw = ImageDraw.Draw(img)
-
-            # Use impact.ttf with fallback to default
-            font_size = 60
-            try:
-                if not os.path.exists(self.font_path):
-                    font = ImageFont.truetype("arial.ttf", font_size)
-                else:
-                    font = ImageFont.truetype(self.font_path, font_size)
-            except Exception:
-                font = ImageFont.load_default()
-                font_size = 40
-
-            text_color = (255, 255, 255)  # White text
-            outline_color = (0, 0, 0)  # Black outline
-
-            # Center the text
-            text_bbox = draw.textbbox((0, 0), message, font=font)
-            text_width = text_bbox[2] - text_bbox[0]
-            text_height = text_bbox[3] - text_bbox[1]
-            text_pos = (img.width // 2 - text_width // 2, img.height // 2 - text_height // 2)
-
-            # Draw outline
-            for dx, dy in [(-2, -2), (2, 2), (-2, 2), (2, -2)]:
-                draw.text((text_pos[0] + dx, text_pos[1] + dy), message, font=font, fill=outline_color)
-            # Draw main text
-            draw.text(text_pos, message, font=font, fill=text_color)
-
-            buffer = io.BytesIO()
-            img.save(buffer, format="PNG")
-            buffer.seek(0)
-            return discord.File(buffer, filename="guess_feedback.png")
-        except Exception as e:
-            raise Exception(f"Image generation failed: {str(e)}")
+        buffer = await self.renderer.render(self.base_image_path, message)
+        if buffer is None:
+            raise Exception("Image generation failed")
+        return discord.File(buffer, filename=f"guess_feedback.{self.renderer.extension}")
 
     @commands.command(name="guess")
     async def guess_number(self, ctx, guess: int = None):
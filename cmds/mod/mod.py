@@ -1,66 +1,37 @@
 import discord
 from discord.ext import commands
-import os
-import json
 import asyncio
+import copy
+import time
 import config
 from config import OWNER_ID, BOT_PREFIX, MOD_ROLE, TIMEOUT_ROLE_NAME
 from datetime import datetime, timedelta
+from cmds.utils.automod import AutoModeration
 
 class Mod(commands.Cog):
     """Enhanced moderation commands such as kick, ban, mute, etc., integrating AutoModeration warnings."""
 
     def __init__(self, bot):
         self.bot = bot
-        self.data_dir = "data"
-        os.makedirs(self.data_dir, exist_ok=True)
-        self.settings_file = os.path.join(self.data_dir, "automod_data.json")
-
-    def load_settings(self, guild_id):
-        """Load settings from automod_data.json for a specific guild."""
-        if os.path.exists(self.settings_file):
-            with open(self.settings_file, "r") as f:
-                try:
-                    data = json.load(f)
-                    return data.get(str(guild_id), {})
-                except json.JSONDecodeError:
-                    return {}
-        return {}
-
-    def save_settings(self, guild_id, settings):
-        """Save settings to automod_data.json for a specific guild."""
-        with open(self.settings_file, "r+") as f:
-            try:
-                data = json.load(f)
-            except (json.JSONDecodeError, FileNotFoundError):
-                data = {}
-            data[str(guild_id)] = settings
-            f.seek(0)
-            json.dump(data, f, indent=4)
-            f.truncate()
+
+    @property
+    def automod(self):
+        """The AutoModeration cog, which owns guild thresholds and the shared warning store (None if not loaded)."""
+        return self.bot.get_cog("AutoModeration")
 
     def get_guild_settings(self, guild_id):
-        """Get or initialize guild settings from automod_data.json."""
-        guild_id_str = str(guild_id)
-        settings = self.load_settings(guild_id)
-        if not settings:
-            settings = {
-                "enabled": False,
-                "banned_words": [],
-                "mute_threshold": 5,
-                "ban_threshold": 10,
-                "mute_duration": 60,
-                "warnings": [],
-                "log_channel": None,
-                "ban_default_offensive": False
-            }
-            self.save_settings(guild_id, settings)
-        else:
-            # Migrate old integer warnings if present
-            if "warnings" in settings and not isinstance(settings["warnings"], list):
-                settings["warnings"] = [{"reason": "Legacy warning", "issuer": "Unknown", "timestamp": datetime.utcnow().isoformat(), "user_id": "unknown"}] if settings["warnings"] > 0 else []
-                self.save_settings(guild_id, settings)
-        return settings
+        """Get guild settings from AutoModeration's in-memory cache, or the defaults if it isn't loaded."""
+        automod = self.automod
+        if automod is None:
+            return copy.deepcopy(AutoModeration.DEFAULT_SETTINGS)
+        return automod.get_guild_settings(guild_id)
+
+    async def _require_automod(self, ctx):
+        """Return the AutoModeration cog, or tell the user the command needs it."""
+        automod = self.automod
+        if automod is None:
+            await self._send_error_message(ctx, "This command needs the AutoModeration module, which isn't loaded.")
+        return automod
 
     def create_embed(self, title, description, color=discord.Color.blue(), fields=None):
         """Helper method to create embeds."""
@@ -200,6 +171,70 @@ class Mod(commands.Cog):
         except Exception as e:
             await self._send_error_message(ctx, f"Failed to ban {member.mention}.", str(e))
 
+    @commands.command(name="tempban")
+    @commands.has_permissions(ban_members=True)
+    async def tempban(self, ctx, member: discord.Member, duration: int, *, reason: str = None):
+        """Ban a member for a specified duration (in minutes)."""
+        if not await self._check_dm(ctx):
+            return
+        if duration <= 0:
+            await self._send_error_message(ctx, "Duration must be greater than 0.")
+            return
+        automod = await self._require_automod(ctx)
+        if automod is None:
+            return
+
+        try:
+            await member.ban(reason=reason)
+        except discord.errors.Forbidden:
+            await self._send_error_message(ctx, f"I lack permission to ban {member.mention}.")
+            return
+        except Exception as e:
+            await self._send_error_message(ctx, f"Failed to ban {member.mention}.", str(e))
+            return
+
+        try:
+            await automod.scheduler.schedule(
+                ctx.guild.id, member.id, "unban", time.time() + duration * 60,
+                channel_id=ctx.channel.id, reason=f"Ban expired after {duration} minutes"
+            )
+        except Exception as e:
+            await self._send_error_message(
+                ctx, f"{member.mention} is banned, but the automatic unban could not be scheduled. Unban them manually.", str(e)
+            )
+            return
+
+        try:
+            embed = self.create_embed(
+                "⛔ Member Temporarily Banned",
+                f"{member.mention} (`{member.id}`) has been banned.",
+                color=discord.Color.red(),
+                fields=[
+                    ("Moderator", ctx.author.mention),
+                    ("Reason", reason or "No reason provided"),
+                    ("Duration", f"{duration} minutes")
+                ]
+            )
+            embed.set_thumbnail(url="https://cdn-icons-png.flaticon.com/512/7235/7235288.png")
+            await ctx.send(embed=embed)
+
+            dm_embed = self.create_embed(
+                "⛔ Temporarily Banned",
+                f"You were banned from **{ctx.guild.name}**.",
+                color=discord.Color.red(),
+                fields=[
+                    ("Reason", reason or "No reason provided"),
+                    ("Duration", f"{duration} minutes")
+                ]
+            )
+            try:
+                await member.send(embed=dm_embed)
+            except discord.errors.Forbidden:
+                pass
+
+        except Exception as e:
+            await self._send_error_message(ctx, f"{member.mention} is banned, but the confirmation could not be sent.", str(e))
+
     @commands.command(name="unban")
     @commands.has_permissions(ban_members=True)
     async def unban(self, ctx, user_id: str, *, reason: str = None):
@@ -210,6 +245,8 @@ class Mod(commands.Cog):
         try:
             user = await self.bot.fetch_user(int(user_id))
             await ctx.guild.unban(user, reason=reason)
+            if self.automod is not None:
+                await self.automod.scheduler.cancel(ctx.guild.id, user.id, "unban")
             embed = self.create_embed(
                 "🔓 User Unbanned",
                 f"{user.mention} (`{user.id}`) has been unbanned.",
@@ -317,15 +354,13 @@ class Mod(commands.Cog):
                 pass
 
             if duration:
-                await asyncio.sleep(duration * 60)
-                if mute_role in member.roles:
-                    await member.remove_roles(mute_role)
-                    unmute_embed = self.create_embed(
-                        "🗣️ Mute Expired",
-                        f"{member.mention} (`{member.id}`) has been unmuted after {duration} minutes.",
-                        color=discord.Color.green()
+                if self.automod is None:
+                    await self._send_error_message(ctx, f"AutoModeration isn't loaded, so {member.mention} must be unmuted manually.")
+                else:
+                    await self.automod.scheduler.schedule(
+                        ctx.guild.id, member.id, "unmute", time.time() + duration * 60,
+                        channel_id=ctx.channel.id, reason=f"Mute expired after {duration} minutes"
                     )
-                    await ctx.send(embed=unmute_embed)
 
         except discord.errors.Forbidden:
             await self._send_error_message(ctx, f"I lack permission to mute {member.mention}.")
@@ -346,6 +381,8 @@ class Mod(commands.Cog):
                 return
 
             await member.remove_roles(mute_role)
+            if self.automod is not None:
+                await self.automod.scheduler.cancel(ctx.guild.id, member.id, "unmute")
             embed = self.create_embed(
                 "🗣️ Member Unmuted",
                 f"{member.mention} (`{member.id}`) has been unmuted.",
@@ -376,6 +413,9 @@ class Mod(commands.Cog):
         """Warn a member for inappropriate behavior, integrating with AutoModeration warnings."""
         if not await self._check_dm(ctx):
             return
+        automod = await self._require_automod(ctx)
+        if automod is None:
+            return
 
         try:
             guild_id = ctx.guild.id
@@ -389,9 +429,7 @@ class Mod(commands.Cog):
                 "timestamp": datetime.utcnow().isoformat(),
                 "user_id": user_id_str
             }
-            settings["warnings"].append(warning)
-            user_warnings = [w for w in settings["warnings"] if w.get("user_id", "unknown") == user_id_str]
-            warning_count = len(user_warnings)
+            warning_count = await automod.warnings.add_async(guild_id, user_id_str, warning["reason"], warning["issuer"], warning["timestamp"])
 
             if warning_count >= max_warns:
                 await member.ban(reason=f"Auto-ban after {max_warns} warnings. Last reason: {reason}")
@@ -424,9 +462,8 @@ class Mod(commands.Cog):
                     await member.send(embed=dm_embed)
                 except discord.errors.Forbidden:
                     pass
-                settings["warnings"] = [w for w in settings["warnings"] if w.get("user_id", "unknown") != user_id_str]
+                await automod.warnings.clear_async(guild_id, user_id_str)
             else:
-                self.save_settings(guild_id, settings)
                 embed = self.create_embed(
                     "⚠️ Member Warned",
                     f"{member.mention} (`{member.id}`) has been warned.",
@@ -467,21 +504,25 @@ class Mod(commands.Cog):
         """Display a member’s warnings with details."""
         if not await self._check_dm(ctx):
             return
+        automod = await self._require_automod(ctx)
+        if automod is None:
+            return
 
         try:
             guild_id = ctx.guild.id
             settings = self.get_guild_settings(guild_id)
-            user_id_str = str(member.id)
-            # Handle both old (no user_id) and new (with user_id) warnings
-            user_warnings = [w for w in settings["warnings"] if w.get("user_id", user_id_str) == user_id_str]
+            warning_count = await automod.warnings.count_async(guild_id, member.id)
 
-            if user_warnings:
+            if warning_count:
+                # Show the most recent page; embeds are capped at 25 fields
+                offset = max(0, warning_count - 10)
+                user_warnings = await automod.warnings.fetch_async(guild_id, member.id, limit=10, offset=offset)
                 embed = self.create_embed(
                     f"📜 Warnings for {member}",
-                    f"{member.mention} (`{member.id}`) has {len(user_warnings)} warnings.",
+                    f"{member.mention} (`{member.id}`) has {warning_count} warnings." + (f" Showing the latest {len(user_warnings)}." if offset else ""),
                     color=discord.Color.orange()
                 )
-                for i, warning in enumerate(user_warnings, 1):
+                for i, warning in enumerate(user_warnings, offset + 1):
                     embed.add_field(
                         name=f"Warning {i}",
                         value=f"**Reason:** {warning['reason']}\n**Issuer:** {warning['issuer']}\n**Timestamp:** {warning['timestamp']}",
@@ -489,7 +530,7 @@ class Mod(commands.Cog):
                     )
                 embed.add_field(
                     name="Total",
-                    value=f"{len(user_warnings)}/{settings['mute_threshold']} Before Mute | (Ban at {settings['ban_threshold']})",
+                    value=f"{warning_count}/{settings['mute_threshold']} Before Mute | (Ban at {settings['ban_threshold']})",
                     inline=True
                 )
                 embed.set_thumbnail(url="https://cdn-icons-png.flaticon.com/512/7235/7235288.png")
@@ -510,16 +551,13 @@ class Mod(commands.Cog):
         """Clear all warnings for a member."""
         if not await self._check_dm(ctx):
             return
+        automod = await self._require_automod(ctx)
+        if automod is None:
+            return
 
         try:
             guild_id = ctx.guild.id
-            settings = self.get_guild_settings(guild_id)
-            user_id_str = str(member.id)
-            user_warnings = [w for w in settings["warnings"] if w.get("user_id", user_id_str) == user_id_str]
-
-            if user_warnings:
-                settings["warnings"] = [w for w in settings["warnings"] if w.get("user_id", user_id_str) != user_id_str]
-                self.save_settings(guild_id, settings)
+            if await automod.warnings.clear_async(guild_id, member.id):
                 embed = self.create_embed(
                     "🧹 Warnings Cleared",
                     f"All warnings for {member.mention} (`{member.id}`) have been cleared.",
@@ -582,6 +620,7 @@ class Mod(commands.Cog):
                 fields=[
                     (f"✋ {BOT_PREFIX}kick <member> [reason]", "Kick a member."),
                     (f"⛔ {BOT_PREFIX}ban <member> [reason]", "Ban a member."),
+                    (f"⏳ {BOT_PREFIX}tempban <member> <minutes> [reason]", "Ban a member for a set time."),
                     (f"🔓 {BOT_PREFIX}unban <user_id> [reason]", "Unban a user by ID."),
                     (f"🧹 {BOT_PREFIX}clear <amount>", "Clear messages (max 100)."),
                     (f"🤐 {BOT_PREFIX}mute <member> [minutes] [reason]", "Mute a member (optional duration)."),
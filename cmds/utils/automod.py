@@ -5,9 +5,603 @@ import json
 import os
 import asyncio
 import re
+import time
+import heapq
+import copy
+import logging
+import threading
+from collections import deque, OrderedDict
 from datetime import datetime
 import config
 
+logger = logging.getLogger(__name__)
+
+def compile_banned_words(words):
+    """Compile banned words into one trie-shaped regex so shared prefixes are only scanned once."""
+    trie = {}
+    for word in words:
+        if not word:
+            continue
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[""] = True
+    if not trie:
+        return None
+    return re.compile(_trie_to_pattern(trie))
+
+def _trie_to_pattern(node):
+    """Render a trie node as a regex fragment, preferring the longest word at each branch."""
+    branches = [re.escape(char) + _trie_to_pattern(child) for char, child in sorted(node.items()) if char]
+    if not branches:
+        return ""
+    pattern = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+    if "" in node:
+        pattern = "(?:" + pattern + ")?"
+    return pattern
+
+URL_PATTERN = re.compile(
+    r"https?://([^\s/?#<>]+)[^\s<>]*"
+    # Bare links such as discord.gg/abc or www.example.com, but not emails or file.txt.bak
+    r"|(?<![\w@./:-])((?:[a-z0-9](?:[a-z0-9-]*[a-z0-9])?\.)+([a-z]{2,63}))(?::\d{1,5})?([/?#][^\s<>]*)?(?![\w-])",
+    re.IGNORECASE
+)
+
+# A bare domain without "www." or a path only counts as a link under one of these,
+# so "file.txt" or "i.e" in ordinary chat aren't treated as URLs
+LINK_TLDS = frozenset({
+    "com", "net", "org", "gg", "io", "co", "me", "ly", "link", "xyz", "ru", "cn", "tk", "ml", "ga", "cf",
+    "gq", "top", "club", "site", "online", "shop", "app", "dev", "info", "biz", "tv", "us", "uk", "de", "gift"
+})
+
+def extract_urls(content):
+    """Return (url, host) pairs for every http(s) or bare-domain link in one pass over the content."""
+    urls = []
+    for match in URL_PATTERN.finditer(content):
+        if match.group(1) is None:
+            host, tld, path = match.group(2), match.group(3).lower(), match.group(4)
+            if not (path or host.lower().startswith("www.") or tld in LINK_TLDS):
+                continue
+            urls.append((match.group(0), host.lower()))
+            continue
+        host = match.group(1).rpartition("@")[2]  # drop any user:pass@ prefix
+        if host.startswith("["):
+            host = host.partition("]")[0] + "]"  # IPv6 literal
+        else:
+            host = host.partition(":")[0]
+        urls.append((match.group(0), host.rstrip(".").lower()))
+    return urls
+
+def parse_domains(text):
+    """Normalise a comma/whitespace separated domain list, accepting pasted URLs or *.wildcards."""
+    domains = []
+    for entry in re.split(r"[\s,]+", text.lower()):
+        entry = re.sub(r"^[a-z]+://", "", entry).split("/")[0].lstrip("*.").rstrip(".")
+        if entry and entry not in domains:
+            domains.append(entry)
+    return domains
+
+class DomainTrie:
+    """Domain set keyed by reversed labels, so ``example.com`` also matches ``cdn.example.com``."""
+
+    def __init__(self, domains=()):
+        self.root = {}
+        for domain in domains:
+            self.add(domain)
+
+    def add(self, domain):
+        node = self.root
+        for label in reversed(domain.split(".")):
+            node = node.setdefault(label, {})
+        node[""] = True
+
+    def matches(self, host):
+        """Return True if the host or any parent domain of it is in the set."""
+        node = self.root
+        for label in reversed(host.split(".")):
+            node = node.get(label)
+            if node is None:
+                return False
+            if "" in node:
+                return True
+        return False
+
+class WarningStore:
+    """Warning log kept in its own table, indexed for per-user lookups.
+
+    The sync methods are for startup and worker threads; event-loop code uses the
+    ``*_async`` variants, which run the same queries through ``asyncio.to_thread``.
+    """
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.lock = threading.RLock()  # one connection shared by to_thread workers
+        self._init_db()
+
+    def _init_db(self):
+        """Create the warnings table and its (guild, user, time) index."""
+        with self.conn:
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS warnings (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    guild_id TEXT NOT NULL,
+                    user_id TEXT NOT NULL,
+                    reason TEXT NOT NULL,
+                    issuer TEXT NOT NULL,
+                    timestamp TEXT NOT NULL
+                )
+            """)
+            self.conn.execute("CREATE INDEX IF NOT EXISTS idx_warnings_guild_user_time ON warnings (guild_id, user_id, timestamp)")
+
+    def add(self, guild_id, user_id, reason, issuer, timestamp):
+        """Record a warning and return the user's new warning count."""
+        with self.lock:
+            with self.conn:
+                self.conn.execute(
+                    "INSERT INTO warnings (guild_id, user_id, reason, issuer, timestamp) VALUES (?, ?, ?, ?, ?)",
+                    (str(guild_id), str(user_id), reason, issuer, timestamp)
+                )
+            return self.count(guild_id, user_id)
+
+    def insert_many(self, guild_id, warnings):
+        """Insert warning dicts without committing, so callers can include them in a larger transaction."""
+        self.conn.executemany(
+            "INSERT INTO warnings (guild_id, user_id, reason, issuer, timestamp) VALUES (?, ?, ?, ?, ?)",
+            [
+                (str(guild_id), str(w.get("user_id", "unknown")), w.get("reason", "No reason provided"),
+                 w.get("issuer", "Unknown"), w.get("timestamp") or datetime.utcnow().isoformat())
+                for w in warnings
+            ]
+        )
+
+    def add_many(self, guild_id, warnings):
+        """Bulk insert warning dicts (reason, issuer, timestamp, user_id) for a guild."""
+        with self.lock, self.conn:
+            self.insert_many(guild_id, warnings)
+
+    def count(self, guild_id, user_id=None):
+        """Count warnings for a user, or for the whole guild when no user is given."""
+        with self.lock:
+            if user_id is None:
+                row = self.conn.execute("SELECT COUNT(*) FROM warnings WHERE guild_id = ?", (str(guild_id),)).fetchone()
+            else:
+                row = self.conn.execute(
+                    "SELECT COUNT(*) FROM warnings WHERE guild_id = ? AND user_id = ?",
+                    (str(guild_id), str(user_id))
+                ).fetchone()
+        return row[0]
+
+    def fetch(self, guild_id, user_id, limit=10, offset=0):
+        """Return one page of a user's warnings, oldest first."""
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT reason, issuer, timestamp, user_id FROM warnings WHERE guild_id = ? AND user_id = ? "
+                "ORDER BY timestamp LIMIT ? OFFSET ?",
+                (str(guild_id), str(user_id), limit, offset)
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def clear(self, guild_id, user_id=None):
+        """Delete a user's warnings, or every warning in the guild; returns the number removed."""
+        with self.lock, self.conn:
+            if user_id is None:
+                cursor = self.conn.execute("DELETE FROM warnings WHERE guild_id = ?", (str(guild_id),))
+            else:
+                cursor = self.conn.execute(
+                    "DELETE FROM warnings WHERE guild_id = ? AND user_id = ?",
+                    (str(guild_id), str(user_id))
+                )
+        return cursor.rowcount
+
+    async def add_async(self, guild_id, user_id, reason, issuer, timestamp):
+        return await asyncio.to_thread(self.add, guild_id, user_id, reason, issuer, timestamp)
+
+    async def count_async(self, guild_id, user_id=None):
+        return await asyncio.to_thread(self.count, guild_id, user_id)
+
+    async def fetch_async(self, guild_id, user_id, limit=10, offset=0):
+        return await asyncio.to_thread(self.fetch, guild_id, user_id, limit, offset)
+
+    async def clear_async(self, guild_id, user_id=None):
+        return await asyncio.to_thread(self.clear, guild_id, user_id)
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+class ActionScheduler:
+    """Pending unmute/unban actions, persisted in SQLite and ordered in a min-heap by due time.
+
+    The heap and ``pending`` map are only touched on the event loop, while SQLite
+    writes run through ``asyncio.to_thread``. A due action keeps its row until
+    ``complete()`` confirms it ran, so an action that fails is retried instead of lost.
+    """
+
+    MAX_ATTEMPTS = 5
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.lock = threading.Lock()  # one connection shared by to_thread workers
+        self.heap = []  # (due_at, action_id); cancelled ids are skipped when popped
+        self.pending = {}  # action_id -> action dict
+        self._init_db()
+        self._load()
+
+    def _init_db(self):
+        """Create the scheduled_actions table."""
+        with self.conn:
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS scheduled_actions (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    guild_id TEXT NOT NULL,
+                    user_id TEXT NOT NULL,
+                    action TEXT NOT NULL,
+                    due_at REAL NOT NULL,
+                    channel_id TEXT,
+                    reason TEXT
+                )
+            """)
+            self.conn.execute("CREATE INDEX IF NOT EXISTS idx_scheduled_actions_target ON scheduled_actions (guild_id, user_id, action)")
+
+    def _load(self):
+        """Rebuild the heap from the table, including actions that fell due while offline."""
+        for row in self.conn.execute("SELECT * FROM scheduled_actions").fetchall():
+            self.pending[row["id"]] = dict(row, attempts=0)
+            self.heap.append((row["due_at"], row["id"]))
+        heapq.heapify(self.heap)
+
+    def _db_schedule(self, guild_id, user_id, action, due_at, channel_id, reason):
+        with self.lock, self.conn:
+            self.conn.execute(
+                "DELETE FROM scheduled_actions WHERE guild_id = ? AND user_id = ? AND action = ?",
+                (guild_id, user_id, action)
+            )
+            cursor = self.conn.execute(
+                "INSERT INTO scheduled_actions (guild_id, user_id, action, due_at, channel_id, reason) VALUES (?, ?, ?, ?, ?, ?)",
+                (guild_id, user_id, action, due_at, channel_id, reason)
+            )
+        return cursor.lastrowid
+
+    def _db_cancel(self, guild_id, user_id, action):
+        with self.lock, self.conn:
+            return self.conn.execute(
+                "DELETE FROM scheduled_actions WHERE guild_id = ? AND user_id = ? AND action = ?",
+                (guild_id, user_id, action)
+            ).rowcount
+
+    def _db_delete(self, action_id):
+        with self.lock, self.conn:
+            self.conn.execute("DELETE FROM scheduled_actions WHERE id = ?", (action_id,))
+
+    def _db_reschedule(self, action_id, due_at):
+        with self.lock, self.conn:
+            return self.conn.execute("UPDATE scheduled_actions SET due_at = ? WHERE id = ?", (due_at, action_id)).rowcount
+
+    def _drop_pending(self, guild_id, user_id, action):
+        for action_id, pending in list(self.pending.items()):
+            if (pending["guild_id"], pending["user_id"], pending["action"]) == (guild_id, user_id, action):
+                del self.pending[action_id]
+
+    async def schedule(self, guild_id, user_id, action, due_at, channel_id=None, reason=None):
+        """Schedule an action, replacing any pending one of the same kind for that user."""
+        guild_id, user_id = str(guild_id), str(user_id)
+        channel_id = str(channel_id) if channel_id else None
+        action_id = await asyncio.to_thread(self._db_schedule, guild_id, user_id, action, due_at, channel_id, reason)
+        self._drop_pending(guild_id, user_id, action)
+        self.pending[action_id] = {
+            "id": action_id,
+            "guild_id": guild_id,
+            "user_id": user_id,
+            "action": action,
+            "due_at": due_at,
+            "channel_id": channel_id,
+            "reason": reason,
+            "attempts": 0
+        }
+        heapq.heappush(self.heap, (due_at, action_id))
+        return action_id
+
+    async def cancel(self, guild_id, user_id, action):
+        """Cancel pending actions of one kind for a user; returns how many were cancelled."""
+        guild_id, user_id = str(guild_id), str(user_id)
+        self._drop_pending(guild_id, user_id, action)
+        return await asyncio.to_thread(self._db_cancel, guild_id, user_id, action)
+
+    def pop_due(self, now=None):
+        """Take every pending action whose due time has passed; call complete() or retry() on each."""
+        now = time.time() if now is None else now
+        due = []
+        while self.heap and self.heap[0][0] <= now:
+            _, action_id = heapq.heappop(self.heap)
+            action = self.pending.pop(action_id, None)
+            if action is not None:
+                due.append(action)
+        return due
+
+    async def complete(self, action):
+        """Forget an action that ran (or can never run)."""
+        await asyncio.to_thread(self._db_delete, action["id"])
+
+    async def retry(self, action, delay):
+        """Put a failed action back on the heap after ``delay`` seconds; gives up after MAX_ATTEMPTS."""
+        action["attempts"] += 1
+        if action["attempts"] >= self.MAX_ATTEMPTS:
+            await self.complete(action)
+            return False
+        action["due_at"] = time.time() + delay
+        if not await asyncio.to_thread(self._db_reschedule, action["id"], action["due_at"]):
+            return False  # cancelled while it was running
+        self.pending[action["id"]] = action
+        heapq.heappush(self.heap, (action["due_at"], action["id"]))
+        return True
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+class LogDispatcher:
+    """Per-channel log queues that pack embeds into as few messages as Discord allows.
+
+    An event identical to the last one still queued for the channel is folded into it
+    and sent once with a repeat count. A batch that fails to send goes back to the
+    front of its queue and the channel backs off; only 403/404 discard the queue.
+    """
+
+    MAX_EMBEDS = 10  # embeds per message
+    MAX_CHARS = 6000  # combined embed characters per message
+    MAX_BACKOFF = 300  # seconds between retries of a failing channel
+
+    def __init__(self, max_queue=200):
+        self.max_queue = max_queue
+        self.queues = {}  # channel_id -> deque of [merge key, embed, count]
+        self.channels = {}  # channel_id -> channel to send to
+        self.dropped = {}  # channel_id -> embeds discarded since the last send
+        self.flushing = set()  # channel ids with a send in progress
+        self.failures = {}  # channel_id -> consecutive failed sends
+        self.retry_at = {}  # channel_id -> time before which the channel isn't retried
+        self.tasks = set()  # flushes started by enqueue, referenced until done
+
+    @staticmethod
+    def merge_key(embed):
+        """What makes two log entries the same event; the timestamp is ignored."""
+        return (
+            embed.title,
+            embed.description,
+            tuple((field.name, field.value) for field in embed.fields),
+            embed.footer.text
+        )
+
+    def _trim(self, channel_id):
+        queue = self.queues[channel_id]
+        while len(queue) > self.max_queue:
+            _, _, count = queue.popleft()
+            self.dropped[channel_id] = self.dropped.get(channel_id, 0) + count
+
+    def enqueue(self, channel, embed):
+        """Queue an embed, dropping the oldest entry when the channel is backed up."""
+        queue = self.queues.setdefault(channel.id, deque())
+        self.channels[channel.id] = channel
+        key = self.merge_key(embed)
+        if queue and queue[-1][0] == key:
+            queue[-1][2] += 1
+            return
+        queue.append([key, embed, 1])
+        self._trim(channel.id)
+        if len(queue) >= self.MAX_EMBEDS and self.ready(channel.id):
+            task = asyncio.create_task(self.flush_channel(channel.id))
+            self.tasks.add(task)
+            task.add_done_callback(self.tasks.discard)
+
+    def ready(self, channel_id, now=None):
+        """Whether a flush may start now: none running and not backing off."""
+        now = time.monotonic() if now is None else now
+        return channel_id not in self.flushing and self.retry_at.get(channel_id, 0) <= now
+
+    @staticmethod
+    def _render(embed, count):
+        if count == 1:
+            return embed
+        embed = embed.copy()
+        footer = f"Repeated ×{count}"
+        embed.set_footer(text=f"{embed.footer.text} • {footer}" if embed.footer.text else footer, icon_url=embed.footer.icon_url)
+        return embed
+
+    def _next_batch(self, channel_id):
+        """Pop as many queued entries as fit in one message.
+
+        Returns ``(embeds, entries, dropped)``; the embeds lead with a drop summary if
+        entries were dropped, and ``entries``/``dropped`` allow requeueing on failure.
+        """
+        queue = self.queues[channel_id]
+        embeds, entries, size = [], [], 0
+        dropped = self.dropped.pop(channel_id, 0)
+        if dropped:
+            summary = discord.Embed(
+                title="⚠️ Log Entries Dropped",
+                description=f"{dropped} log entries were dropped because this channel fell behind.",
+                color=discord.Color.orange(),
+                timestamp=datetime.utcnow()
+            )
+            embeds.append(summary)
+            size += len(summary)
+        while queue and len(embeds) < self.MAX_EMBEDS:
+            embed = self._render(queue[0][1], queue[0][2])
+            if size + len(embed) > self.MAX_CHARS and embeds:
+                break
+            entries.append(queue.popleft())
+            embeds.append(embed)
+            size += len(embed)  # a single oversized embed still goes out on its own
+        return embeds, entries, dropped
+
+    def _requeue(self, channel_id, entries, dropped):
+        """Put a failed batch back at the front of its queue and back off the channel."""
+        queue = self.queues.setdefault(channel_id, deque())
+        queue.extendleft(reversed(entries))
+        if dropped:
+            self.dropped[channel_id] = self.dropped.get(channel_id, 0) + dropped
+        self._trim(channel_id)
+        failures = self.failures.get(channel_id, 0) + 1
+        self.failures[channel_id] = failures
+        delay = min(2 ** failures, self.MAX_BACKOFF)
+        self.retry_at[channel_id] = time.monotonic() + delay
+        return delay
+
+    async def flush_channel(self, channel_id):
+        """Send everything queued for one channel, one packed message at a time."""
+        if not self.ready(channel_id):
+            return
+        self.flushing.add(channel_id)
+        try:
+            channel = self.channels.get(channel_id)
+            while channel and (self.queues.get(channel_id) or self.dropped.get(channel_id)):
+                embeds, entries, dropped = self._next_batch(channel_id)
+                try:
+                    await channel.send(embeds=embeds)
+                except (discord.Forbidden, discord.NotFound):
+                    self.queues.get(channel_id, deque()).clear()
+                    self.dropped.pop(channel_id, None)
+                    break
+                except discord.HTTPException as e:
+                    delay = self._requeue(channel_id, entries, dropped)
+                    logger.warning(f"Failed to send {len(embeds)} log embed(s) to channel {channel_id}, retrying in {delay}s: {e}")
+                    break
+                self.failures.pop(channel_id, None)
+                self.retry_at.pop(channel_id, None)
+        finally:
+            self.flushing.discard(channel_id)
+            if not self.queues.get(channel_id) and not self.dropped.get(channel_id):
+                self.queues.pop(channel_id, None)
+                self.channels.pop(channel_id, None)
+                self.failures.pop(channel_id, None)
+                self.retry_at.pop(channel_id, None)
+
+    async def flush_all(self):
+        """Flush every ready channel with pending entries concurrently."""
+        now = time.monotonic()
+        pending = [channel_id for channel_id, queue in self.queues.items() if queue and self.ready(channel_id, now)]
+        results = await asyncio.gather(*(self.flush_channel(channel_id) for channel_id in pending), return_exceptions=True)
+        for channel_id, result in zip(pending, results):
+            if isinstance(result, Exception):
+                logger.error(f"Flushing logs for channel {channel_id} failed: {result}")
+
+class SpamTracker:
+    """Per-(guild, user) message history for flood, duplicate and mention-spam checks.
+
+    Each entry keeps a fixed-size deque of recent message times, so a check is O(1);
+    entries are evicted least-recently-used past ``max_entries`` or once idle.
+    """
+
+    DUPLICATE_WINDOW = 60  # seconds between identical messages that still count as repeats
+
+    def __init__(self, max_entries=50000, idle_seconds=600):
+        self.max_entries = max_entries
+        self.idle_seconds = idle_seconds
+        self.entries = OrderedDict()  # (guild_id, user_id) -> activity dict, oldest first
+
+    def check(self, message, settings, now=None):
+        """Record a message and return a violation reason, or None if it is within limits.
+
+        Each limit is the count that triggers: reaching it is a violation.
+        """
+        now = time.monotonic() if now is None else now
+        mentions = len(message.raw_mentions) + len(message.raw_role_mentions) + int(message.mention_everyone)
+        if mentions >= settings["mention_limit"]:
+            return f"Mention spam: {mentions} mentions in one message"
+
+        key = (message.guild.id, message.author.id)
+        activity = self.entries.pop(key, None)
+        limit = settings["spam_message_limit"]
+        if activity is None or activity["times"].maxlen != limit:
+            activity = {"times": deque(maxlen=limit), "last_content": None, "repeats": 0, "last_seen": now}
+        self.entries[key] = activity
+        if len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+        times = activity["times"]
+        times.append(now)
+        content = message.content.strip().lower()
+        if content and content == activity["last_content"] and now - activity["last_seen"] <= self.DUPLICATE_WINDOW:
+            activity["repeats"] += 1
+        else:
+            activity["repeats"] = 1
+        activity["last_content"] = content
+        activity["last_seen"] = now
+
+        if len(times) == limit and now - times[0] <= settings["spam_interval"]:
+            return f"Message flood: {limit} messages in {settings['spam_interval']}s"
+        if activity["repeats"] >= settings["duplicate_limit"]:
+            return f"Duplicate messages: sent the same message {activity['repeats']} times"
+        return None
+
+    def reset(self, guild_id, user_id):
+        """Forget a user's history, e.g. after they have been warned for it."""
+        self.entries.pop((guild_id, user_id), None)
+
+    def evict_idle(self, now=None):
+        """Drop entries that have not seen a message in ``idle_seconds``."""
+        now = time.monotonic() if now is None else now
+        while self.entries:
+            key, activity = next(iter(self.entries.items()))
+            if now - activity["last_seen"] < self.idle_seconds:
+                break
+            del self.entries[key]
+
+class RaidGuard:
+    """Per-guild join-rate counter that switches a guild into lockdown during a raid.
+
+    Recent joins live in a deque capped at the join limit, so recording a join is O(1)
+    no matter how fast members arrive. While locked down, joins and leaves are only
+    counted and summarised once the lockdown ends instead of being logged one by one.
+    """
+
+    def __init__(self):
+        self.joins = {}  # guild_id -> deque of recent (join time, member id)
+        self.lockdowns = {}  # guild_id -> lockdown state dict
+
+    def record_join(self, guild_id, settings, now=None, member_id=None):
+        """Record a join and return True if the guild is (now) in lockdown.
+
+        When this join starts a lockdown, the other members of the burst that
+        triggered it are kept in the lockdown's ``burst`` list so they can be checked too.
+        """
+        now = time.monotonic() if now is None else now
+        limit = settings["raid_join_limit"]
+        joins = self.joins.get(guild_id)
+        if joins is None or joins.maxlen != limit:
+            joins = self.joins[guild_id] = deque(maxlen=limit)
+        joins.append((now, member_id))
+        flooding = len(joins) == limit and now - joins[0][0] <= settings["raid_interval"]
+
+        lockdown = self.lockdowns.get(guild_id)
+        if lockdown is None:
+            if not flooding:
+                return False
+            lockdown = self.lockdowns[guild_id] = {
+                "started": now, "started_at": datetime.utcnow(), "joins": 0, "left": 0, "kicked": 0, "announced": False,
+                "burst": [joined_id for _, joined_id in list(joins)[:-1] if joined_id is not None]
+            }
+        if flooding or lockdown["joins"] == 0:
+            lockdown["until"] = now + settings["raid_lockdown_duration"] * 60
+        lockdown["joins"] += 1
+        return True
+
+    def get_lockdown(self, guild_id):
+        return self.lockdowns.get(guild_id)
+
+    def pop_expired(self, now=None):
+        """Remove and return (guild_id, lockdown) pairs whose lockdown period has passed."""
+        now = time.monotonic() if now is None else now
+        expired = [(guild_id, lockdown) for guild_id, lockdown in self.lockdowns.items() if lockdown["until"] <= now]
+        for guild_id, _ in expired:
+            del self.lockdowns[guild_id]
+            self.joins.pop(guild_id, None)
+        return expired
+
 class AutoModUI(discord.ui.View):
     """Interactive UI for configuring auto-moderation settings."""
     def __init__(self, cog, guild_id):
@@ -19,35 +613,38 @@ class AutoModUI(discord.ui.View):
 
     async def update_embed(self, interaction):
         """Update the embed with current settings, Banned Words at bottom."""
-        log_channel = await self.cog.get_log_channel(self.guild_id)
-        warning_count = len(self.settings["warnings"])
-        embed = self.cog.create_embed(
-            "⚙️ Auto-Moderation Configuration",
-            "Adjust settings using the controls below:",
-            fields=[
-                ("Status", f"{'✅ Enabled' if self.settings['enabled'] else '❌ Disabled'}"),
-                ("Mute Threshold", f"{self.settings['mute_threshold']} warnings"),
-                ("Ban Threshold", f"{self.settings['ban_threshold']} warnings"),
-                ("Mute Duration", f"{self.settings['mute_duration']} min"),
-                ("Default Offensive Words", f"{'✅ Enabled' if self.settings['ban_default_offensive'] else '❌ Disabled'}"),
-                ("Log Channel", log_channel.mention if log_channel else "Not set"),
-                ("Total Warnings", f"{warning_count}"),
-                ("Custom Banned Words", f"```{', '.join(self.settings['banned_words']) or 'None'}```")
-            ],
-            color=discord.Color.dark_blue()
-        )
+        embed = await self.cog.build_config_embed(self.guild_id)
         await interaction.response.edit_message(embed=embed, view=self)
 
     @discord.ui.button(label="Toggle Enable", style=discord.ButtonStyle.primary, emoji="🔄", row=0)
     async def toggle_enable(self, interaction: discord.Interaction, button: discord.ui.Button):
         self.settings["enabled"] = not self.settings["enabled"]
-        self.cog.save_settings()
+        self.cog.mark_dirty(self.guild_id)
         await self.update_embed(interaction)
 
     @discord.ui.button(label="Toggle Offensive", style=discord.ButtonStyle.primary, emoji="🛡️", row=0)
     async def toggle_offensive(self, interaction: discord.Interaction, button: discord.ui.Button):
         self.settings["ban_default_offensive"] = not self.settings["ban_default_offensive"]
-        self.cog.save_settings()
+        self.cog.invalidate_banned_words(self.guild_id)
+        self.cog.mark_dirty(self.guild_id)
+        await self.update_embed(interaction)
+
+    @discord.ui.button(label="Toggle Spam", style=discord.ButtonStyle.primary, emoji="🌊", row=0)
+    async def toggle_spam(self, interaction: discord.Interaction, button: discord.ui.Button):
+        self.settings["spam_enabled"] = not self.settings["spam_enabled"]
+        self.cog.mark_dirty(self.guild_id)
+        await self.update_embed(interaction)
+
+    @discord.ui.button(label="Toggle Raid", style=discord.ButtonStyle.primary, emoji="🚨", row=0)
+    async def toggle_raid(self, interaction: discord.Interaction, button: discord.ui.Button):
+        self.settings["raid_enabled"] = not self.settings["raid_enabled"]
+        self.cog.mark_dirty(self.guild_id)
+        await self.update_embed(interaction)
+
+    @discord.ui.button(label="Toggle Links", style=discord.ButtonStyle.primary, emoji="🔗", row=0)
+    async def toggle_links(self, interaction: discord.Interaction, button: discord.ui.Button):
+        self.settings["block_links"] = not self.settings["block_links"]
+        self.cog.mark_dirty(self.guild_id)
         await self.update_embed(interaction)
 
     @discord.ui.button(label="Set Mute Threshold", style=discord.ButtonStyle.secondary, emoji="📊", row=1)
@@ -62,6 +659,10 @@ class AutoModUI(discord.ui.View):
     async def set_duration(self, interaction: discord.Interaction, button: discord.ui.Button):
         await interaction.response.send_modal(SetDurationModal(self))
 
+    @discord.ui.button(label="Link Domains", style=discord.ButtonStyle.secondary, emoji="🌐", row=1)
+    async def set_link_domains(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await interaction.response.send_modal(LinkDomainsModal(self))
+
     @discord.ui.button(label="Add Word", style=discord.ButtonStyle.grey, emoji="➕", row=2)
     async def add_word(self, interaction: discord.Interaction, button: discord.ui.Button):
         await interaction.response.send_modal(AddWordModal(self))
@@ -74,10 +675,17 @@ class AutoModUI(discord.ui.View):
     async def set_log_channel(self, interaction: discord.Interaction, button: discord.ui.Button):
         await interaction.response.send_modal(SetLogChannelModal(self))
 
+    @discord.ui.button(label="Spam Limits", style=discord.ButtonStyle.grey, emoji="🚦", row=3)
+    async def set_spam_limits(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await interaction.response.send_modal(SpamLimitsModal(self))
+
+    @discord.ui.button(label="Raid Limits", style=discord.ButtonStyle.grey, emoji="🚧", row=3)
+    async def set_raid_limits(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await interaction.response.send_modal(RaidLimitsModal(self))
+
     @discord.ui.button(label="Clear Warnings", style=discord.ButtonStyle.red, emoji="🧹", row=3)
     async def clear_warnings(self, interaction: discord.Interaction, button: discord.ui.Button):
-        self.settings["warnings"] = []
-        self.cog.save_settings()
+        await self.cog.warnings.clear_async(self.guild_id)
         await self.update_embed(interaction)
 
     @discord.ui.button(label="Finish", style=discord.ButtonStyle.green, emoji="✅", row=3)
@@ -122,7 +730,8 @@ class AddWordModal(discord.ui.Modal, title="Add Banned Word"):
         word = self.word.value.lower()
         if word not in self.view.settings["banned_words"]:
             self.view.settings["banned_words"].append(word)
-            self.view.cog.save_settings()
+            self.view.cog.invalidate_banned_words(self.view.guild_id)
+            self.view.cog.mark_dirty(self.view.guild_id)
         await self.view.update_embed(interaction)
 
 class RemoveWordModal(discord.ui.Modal, title="Remove Banned Word"):
@@ -136,7 +745,8 @@ class RemoveWordModal(discord.ui.Modal, title="Remove Banned Word"):
         word = self.word.value.lower()
         if word in self.view.settings["banned_words"]:
             self.view.settings["banned_words"].remove(word)
-            self.view.cog.save_settings()
+            self.view.cog.invalidate_banned_words(self.view.guild_id)
+            self.view.cog.mark_dirty(self.view.guild_id)
         await self.view.update_embed(interaction)
 
 class SetMuteThresholdModal(discord.ui.Modal, title="Set Mute Threshold"):
@@ -152,7 +762,7 @@ class SetMuteThresholdModal(discord.ui.Modal, title="Set Mute Threshold"):
             if value < 1 or value >= self.view.settings["ban_threshold"]:
                 raise ValueError
             self.view.settings["mute_threshold"] = value
-            self.view.cog.save_settings()
+            self.view.cog.mark_dirty(self.view.guild_id)
             await self.view.update_embed(interaction)
         except ValueError:
             await interaction.response.send_message("❌ Please enter a number >= 1 and less than the ban threshold.", ephemeral=True)
@@ -170,7 +780,7 @@ class SetBanThresholdModal(discord.ui.Modal, title="Set Ban Threshold"):
             if value <= self.view.settings["mute_threshold"]:
                 raise ValueError
             self.view.settings["ban_threshold"] = value
-            self.view.cog.save_settings()
+            self.view.cog.mark_dirty(self.view.guild_id)
             await self.view.update_embed(interaction)
         except ValueError:
             await interaction.response.send_message("❌ Please enter a number greater than the mute threshold.", ephemeral=True)
@@ -188,11 +798,92 @@ class SetDurationModal(discord.ui.Modal, title="Set Mute Duration"):
             if value < 1:
                 raise ValueError
             self.view.settings["mute_duration"] = value
-            self.view.cog.save_settings()
+            self.view.cog.mark_dirty(self.view.guild_id)
             await self.view.update_embed(interaction)
         except ValueError:
             await interaction.response.send_message("❌ Please enter a number >= 1.", ephemeral=True)
 
+class SpamLimitsModal(discord.ui.Modal, title="Set Spam Limits"):
+    messages = discord.ui.TextInput(label="Messages per Interval That Trigger", placeholder="e.g. 5 (min 2)", style=discord.TextStyle.short)
+    interval = discord.ui.TextInput(label="Interval (seconds)", placeholder="e.g. 5 (min 1)", style=discord.TextStyle.short)
+    duplicates = discord.ui.TextInput(label="Repeated Messages That Trigger", placeholder="e.g. 3 (min 2)", style=discord.TextStyle.short)
+    mentions = discord.ui.TextInput(label="Mentions in One Message That Trigger", placeholder="e.g. 5 (min 1)", style=discord.TextStyle.short)
+
+    def __init__(self, view):
+        super().__init__()
+        self.view = view
+        settings = view.settings
+        self.messages.default = str(settings["spam_message_limit"])
+        self.interval.default = str(settings["spam_interval"])
+        self.duplicates.default = str(settings["duplicate_limit"])
+        self.mentions.default = str(settings["mention_limit"])
+
+    async def on_submit(self, interaction: discord.Interaction):
+        try:
+            messages, interval = int(self.messages.value), int(self.interval.value)
+            duplicates, mentions = int(self.duplicates.value), int(self.mentions.value)
+            if messages < 2 or interval < 1 or duplicates < 2 or mentions < 1:
+                raise ValueError
+            self.view.settings.update({
+                "spam_message_limit": messages,
+                "spam_interval": interval,
+                "duplicate_limit": duplicates,
+                "mention_limit": mentions
+            })
+            self.view.cog.mark_dirty(self.view.guild_id)
+            await self.view.update_embed(interaction)
+        except ValueError:
+            await interaction.response.send_message("❌ Please enter whole numbers: messages >= 2, interval >= 1, repeats >= 2, mentions >= 1.", ephemeral=True)
+
+class RaidLimitsModal(discord.ui.Modal, title="Set Raid Limits"):
+    joins = discord.ui.TextInput(label="Joins That Trigger Lockdown", placeholder="e.g. 10 (min 2)", style=discord.TextStyle.short)
+    interval = discord.ui.TextInput(label="Within (seconds)", placeholder="e.g. 10 (min 1)", style=discord.TextStyle.short)
+    account_age = discord.ui.TextInput(label="Kick Accounts Younger Than (days)", placeholder="e.g. 7 (0 = don't kick)", style=discord.TextStyle.short)
+    duration = discord.ui.TextInput(label="Lockdown Duration (minutes)", placeholder="e.g. 10 (min 1)", style=discord.TextStyle.short)
+
+    def __init__(self, view):
+        super().__init__()
+        self.view = view
+        settings = view.settings
+        self.joins.default = str(settings["raid_join_limit"])
+        self.interval.default = str(settings["raid_interval"])
+        self.account_age.default = str(settings["raid_min_account_age"])
+        self.duration.default = str(settings["raid_lockdown_duration"])
+
+    async def on_submit(self, interaction: discord.Interaction):
+        try:
+            joins, interval = int(self.joins.value), int(self.interval.value)
+            account_age, duration = int(self.account_age.value), int(self.duration.value)
+            if joins < 2 or interval < 1 or account_age < 0 or duration < 1:
+                raise ValueError
+            self.view.settings.update({
+                "raid_join_limit": joins,
+                "raid_interval": interval,
+                "raid_min_account_age": account_age,
+                "raid_lockdown_duration": duration
+            })
+            self.view.cog.mark_dirty(self.view.guild_id)
+            await self.view.update_embed(interaction)
+        except ValueError:
+            await interaction.response.send_message("❌ Please enter whole numbers: joins >= 2, interval >= 1, age >= 0, duration >= 1.", ephemeral=True)
+
+class LinkDomainsModal(discord.ui.Modal, title="Set Link Domains"):
+    allowed = discord.ui.TextInput(label="Whitelisted Domains", placeholder="e.g. youtube.com, github.com", style=discord.TextStyle.paragraph, required=False)
+    blocked = discord.ui.TextInput(label="Blocked Domains", placeholder="e.g. grabify.link, bit.ly", style=discord.TextStyle.paragraph, required=False)
+
+    def __init__(self, view):
+        super().__init__()
+        self.view = view
+        self.allowed.default = ", ".join(view.settings["allowed_domains"])
+        self.blocked.default = ", ".join(view.settings["blocked_domains"])
+
+    async def on_submit(self, interaction: discord.Interaction):
+        self.view.settings["allowed_domains"] = parse_domains(self.allowed.value)
+        self.view.settings["blocked_domains"] = parse_domains(self.blocked.value)
+        self.view.cog.invalidate_domain_filters(self.view.guild_id)
+        self.view.cog.mark_dirty(self.view.guild_id)
+        await self.view.update_embed(interaction)
+
 class SetLogChannelModal(discord.ui.Modal, title="Set Logging Channel"):
     channel = discord.ui.TextInput(label="Channel ID", placeholder="Enter a channel ID", style=discord.TextStyle.short)
 
@@ -207,7 +898,7 @@ class SetLogChannelModal(discord.ui.Modal, title="Set Logging Channel"):
             if not channel or not isinstance(channel, discord.TextChannel) or channel.guild.id != self.view.guild_id:
                 raise ValueError
             self.view.settings["log_channel"] = str(channel_id)
-            self.view.cog.save_settings()
+            self.view.cog.mark_dirty(self.view.guild_id)
             await self.view.update_embed(interaction)
         except ValueError:
             await interaction.response.send_message("❌ Please enter a valid text channel ID from this guild.", ephemeral=True)
@@ -240,15 +931,66 @@ class AutoModeration(commands.Cog):
         "c*nt", "f*ck", "n*gga", "r*tard", "tr*nny"
     ]
 
+    DEFAULT_SETTINGS = {
+        "enabled": False,
+        "banned_words": [],
+        "mute_threshold": 5,
+        "ban_threshold": 10,
+        "mute_duration": 60,
+        "log_channel": None,
+        "ban_default_offensive": False,
+        "spam_enabled": False,
+        "spam_message_limit": 5,
+        "spam_interval": 5,
+        "duplicate_limit": 3,
+        "mention_limit": 5,
+        "raid_enabled": False,
+        "raid_join_limit": 10,
+        "raid_interval": 10,
+        "raid_min_account_age": 7,
+        "raid_lockdown_duration": 10,
+        "block_links": False,
+        "allowed_domains": [],
+        "blocked_domains": []
+    }
+
+    ADDED_COLUMNS = {
+        "spam_enabled": "INTEGER DEFAULT 0",
+        "spam_message_limit": "INTEGER DEFAULT 5",
+        "spam_interval": "INTEGER DEFAULT 5",
+        "duplicate_limit": "INTEGER DEFAULT 3",
+        "mention_limit": "INTEGER DEFAULT 5",
+        "raid_enabled": "INTEGER DEFAULT 0",
+        "raid_join_limit": "INTEGER DEFAULT 10",
+        "raid_interval": "INTEGER DEFAULT 10",
+        "raid_min_account_age": "INTEGER DEFAULT 7",
+        "raid_lockdown_duration": "INTEGER DEFAULT 10",
+        "block_links": "INTEGER DEFAULT 0",
+        "allowed_domains": "TEXT DEFAULT '[]'",
+        "blocked_domains": "TEXT DEFAULT '[]'"
+    }
+
     def __init__(self, bot):
         self.bot = bot
         self.data_dir = "data"
         os.makedirs(self.data_dir, exist_ok=True)
         self.db_file = os.path.join(self.data_dir, "automod_data.db")
         self.setup_database()
+        self.warnings = WarningStore(self.db_file)
+        self.migrate_warnings()
+        self.migrate_legacy_json()
+        self.scheduler = ActionScheduler(self.db_file)
+        self.log_dispatcher = LogDispatcher()
         self.settings = self.load_settings()
-        self.url_pattern = re.compile(r'http[s]?://(?:[a-zA-Z]|[0-9]|[$-_@.&+]|[!*\\(\\),]|(?:%[0-9a-fA-F][0-9a-fA-F]))+')
+        self.dirty_guilds = set()  # guild ids with unsaved changes, written by flush_settings
+        self.banned_word_patterns = {}  # guild_id -> compiled matcher (or None when nothing is banned)
+        self.spam_tracker = SpamTracker()
+        self.raid_guard = RaidGuard()
+        self.domain_filters = {}  # guild_id -> (allow DomainTrie, deny DomainTrie)
         self.automod_task.start()
+        self.flush_settings.start()
+        self.run_scheduled_actions.start()
+        self.flush_logs.start()
 
     def setup_database(self):
         """Create the SQLite database and table if they don't exist."""
@@ -264,77 +1006,177 @@ class AutoModeration(commands.Cog):
                     mute_duration INTEGER DEFAULT 60,
                     warnings TEXT DEFAULT '[]',
                     log_channel TEXT,
-                    ban_default_offensive INTEGER DEFAULT 0
+                    ban_default_offensive INTEGER DEFAULT 0,
+                    spam_enabled INTEGER DEFAULT 0,
+                    spam_message_limit INTEGER DEFAULT 5,
+                    spam_interval INTEGER DEFAULT 5,
+                    duplicate_limit INTEGER DEFAULT 3,
+                    mention_limit INTEGER DEFAULT 5,
+                    raid_enabled INTEGER DEFAULT 0,
+                    raid_join_limit INTEGER DEFAULT 10,
+                    raid_interval INTEGER DEFAULT 10,
+                    raid_min_account_age INTEGER DEFAULT 7,
+                    raid_lockdown_duration INTEGER DEFAULT 10,
+                    block_links INTEGER DEFAULT 0,
+                    allowed_domains TEXT DEFAULT '[]',
+                    blocked_domains TEXT DEFAULT '[]'
                 )
             """)
+            # Columns added after the original schema
+            existing = {row[1] for row in cursor.execute("PRAGMA table_info(guild_settings)")}
+            for column, definition in self.ADDED_COLUMNS.items():
+                if column not in existing:
+                    cursor.execute(f"ALTER TABLE guild_settings ADD COLUMN {column} {definition}")
             conn.commit()
 
+    def migrate_warnings(self):
+        """Move warnings out of the legacy per-guild JSON column into the warnings table."""
+        conn = self.warnings.conn
+        rows = conn.execute("SELECT guild_id, warnings FROM guild_settings WHERE warnings != '[]'").fetchall()
+        for guild_id, warnings_json in rows:
+            try:
+                warnings = json.loads(warnings_json)
+            except (TypeError, json.JSONDecodeError):
+                warnings = []
+            # Insert and clear the legacy column together, so a crash can't import a guild twice
+            with conn:
+                if isinstance(warnings, list):
+                    self.warnings.insert_many(guild_id, [w for w in warnings if isinstance(w, dict)])
+                conn.execute("UPDATE guild_settings SET warnings = '[]' WHERE guild_id = ?", (guild_id,))
+
+    def migrate_legacy_json(self):
+        """Import warnings from the JSON file the Mod cog used to keep, then retire the file."""
+        legacy_file = os.path.join(self.data_dir, "automod_data.json")
+        if not os.path.exists(legacy_file):
+            return
+        try:
+            with open(legacy_file, "r") as f:
+                data = json.load(f)
+        except (json.JSONDecodeError, IOError) as e:
+            logger.error(f"Failed to read legacy warnings from {legacy_file}: {e}")
+            return
+        for guild_id, guild_data in data.items():
+            warnings = guild_data.get("warnings") if isinstance(guild_data, dict) else None
+            if isinstance(warnings, list):
+                self.warnings.add_many(guild_id, [w for w in warnings if isinstance(w, dict)])
+        os.replace(legacy_file, legacy_file + ".migrated")
+        logger.info(f"Imported legacy warnings from {legacy_file}")
+
     def load_settings(self):
         """Load all settings from the database into a dictionary."""
         settings = {}
         with sqlite3.connect(self.db_file) as conn:
+            conn.row_factory = sqlite3.Row
             cursor = conn.cursor()
             cursor.execute("SELECT * FROM guild_settings")
             rows = cursor.fetchall()
             for row in rows:
-                guild_id = row[0]
+                guild_id = row["guild_id"]
                 settings[guild_id] = {
-                    "enabled": bool(row[1]),
-                    "banned_words": json.loads(row[2]),
-                    "mute_threshold": row[3],
-                    "ban_threshold": row[4],
-                    "mute_duration": row[5],
-                    "warnings": json.loads(row[6]),
-                    "log_channel": row[7],
-                    "ban_default_offensive": bool(row[8])
+                    "enabled": bool(row["enabled"]),
+                    "banned_words": json.loads(row["banned_words"]),
+                    "mute_threshold": row["mute_threshold"],
+                    "ban_threshold": row["ban_threshold"],
+                    "mute_duration": row["mute_duration"],
+                    "log_channel": row["log_channel"],
+                    "ban_default_offensive": bool(row["ban_default_offensive"]),
+                    "spam_enabled": bool(row["spam_enabled"]),
+                    "spam_message_limit": row["spam_message_limit"],
+                    "spam_interval": row["spam_interval"],
+                    "duplicate_limit": row["duplicate_limit"],
+                    "mention_limit": row["mention_limit"],
+                    "raid_enabled": bool(row["raid_enabled"]),
+                    "raid_join_limit": row["raid_join_limit"],
+                    "raid_interval": row["raid_interval"],
+                    "raid_min_account_age": row["raid_min_account_age"],
+                    "raid_lockdown_duration": row["raid_lockdown_duration"],
+                    "block_links": bool(row["block_links"]),
+                    "allowed_domains": json.loads(row["allowed_domains"]),
+                    "blocked_domains": json.loads(row["blocked_domains"])
                 }
         return settings
 
     def save_settings(self):
-        """Save all settings to the database."""
+        """Write settings for guilds changed since the last save in a single transaction."""
+        if not self.dirty_guilds:
+            return
+        dirty, self.dirty_guilds = self.dirty_guilds, set()
+        try:
+            self.write_settings_rows(self.snapshot_settings(dirty))
+        except sqlite3.Error:
+            self.dirty_guilds |= dirty
+            raise
+
+    async def save_settings_async(self):
+        """Like save_settings, but the SQLite write runs off the event loop."""
+        if not self.dirty_guilds:
+            return
+        dirty, self.dirty_guilds = self.dirty_guilds, set()
+        rows = self.snapshot_settings(dirty)
+        try:
+            await asyncio.to_thread(self.write_settings_rows, rows)
+        except sqlite3.Error:
+            self.dirty_guilds |= dirty
+            raise
+
+    def snapshot_settings(self, guild_ids):
+        """Serialise the given guilds' settings into rows, so later edits can't race the write."""
+        rows = []
+        for guild_id in guild_ids:
+            data = self.settings.get(guild_id)
+            if data is None:
+                continue
+            rows.append((
+                guild_id,
+                int(data["enabled"]),
+                json.dumps(data["banned_words"]),
+                data["mute_threshold"],
+                data["ban_threshold"],
+                data["mute_duration"],
+                data["log_channel"],
+                int(data["ban_default_offensive"]),
+                int(data["spam_enabled"]),
+                data["spam_message_limit"],
+                data["spam_interval"],
+                data["duplicate_limit"],
+                data["mention_limit"],
+                int(data["raid_enabled"]),
+                data["raid_join_limit"],
+                data["raid_interval"],
+                data["raid_min_account_age"],
+                data["raid_lockdown_duration"],
+                int(data["block_links"]),
+                json.dumps(data["allowed_domains"]),
+                json.dumps(data["blocked_domains"])
+            ))
+        return rows
+
+    def write_settings_rows(self, rows):
+        """Upsert snapshot rows in one transaction; safe to call from a worker thread."""
+        if not rows:
+            return
         with sqlite3.connect(self.db_file) as conn:
-            cursor = conn.cursor()
-            for guild_id, data in self.settings.items():
-                cursor.execute("""
-                    INSERT OR REPLACE INTO guild_settings (
-                        guild_id, enabled, banned_words, mute_threshold, ban_threshold,
-                        mute_duration, warnings, log_channel, ban_default_offensive
-                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-                """, (
-                    guild_id,
-                    int(data["enabled"]),
-                    json.dumps(data["banned_words"]),
-                    data["mute_threshold"],
-                    data["ban_threshold"],
-                    data["mute_duration"],
-                    json.dumps(data["warnings"]),
-                    data["log_channel"],
-                    int(data["ban_default_offensive"])
-                ))
-            conn.commit()
+            conn.executemany("""
+                INSERT OR REPLACE INTO guild_settings (
+                    guild_id, enabled, banned_words, mute_threshold, ban_threshold,
+                    mute_duration, log_channel, ban_default_offensive,
+                    spam_enabled, spam_message_limit, spam_interval, duplicate_limit, mention_limit,
+                    raid_enabled, raid_join_limit, raid_interval, raid_min_account_age, raid_lockdown_duration,
+                    block_links, allowed_domains, blocked_domains
+                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """, rows)
+
+    def mark_dirty(self, guild_id):
+        """Flag a guild's settings for the next save."""
+        self.dirty_guilds.add(str(guild_id))
 
     def get_guild_settings(self, guild_id):
         """Get or initialize settings for a specific guild."""
         guild_id_str = str(guild_id)
         if guild_id_str not in self.settings:
-            self.settings[guild_id_str] = {
-                "enabled": False,
-                "banned_words": [],
-                "mute_threshold": 5,
-                "ban_threshold": 10,
-                "mute_duration": 60,
-                "warnings": [],
-                "log_channel": None,
-                "ban_default_offensive": False
-            }
-            with sqlite3.connect(self.db_file) as conn:
-                cursor = conn.cursor()
-                cursor.execute("""
-                    INSERT INTO guild_settings (guild_id) VALUES (?)
-                    ON CONFLICT(guild_id) DO NOTHING
-                """, (guild_id_str,))
-                conn.commit()
-            self.save_settings()
+            # New guilds start from defaults in memory; the row is written by the next flush.
+            self.settings[guild_id_str] = copy.deepcopy(self.DEFAULT_SETTINGS)
+            self.mark_dirty(guild_id_str)
         return self.settings[guild_id_str]
 
     def create_embed(self, title, description, color=discord.Color.blue(), fields=None):
@@ -353,6 +1195,40 @@ class AutoModeration(commands.Cog):
         )
         return embed
 
+    async def build_config_embed(self, guild_id):
+        """Build the configuration panel embed, Banned Words at bottom."""
+        settings = self.get_guild_settings(guild_id)
+        log_channel = await self.get_log_channel(guild_id)
+        warning_count = await self.warnings.count_async(guild_id)
+        spam_limits = (
+            f"{settings['spam_message_limit']} msgs/{settings['spam_interval']}s, "
+            f"{settings['duplicate_limit']} repeats, {settings['mention_limit']} mentions"
+        )
+        raid_limits = (
+            f"{settings['raid_join_limit']} joins/{settings['raid_interval']}s, "
+            f"kick < {settings['raid_min_account_age']}d, {settings['raid_lockdown_duration']} min lockdown"
+        )
+        return self.create_embed(
+            "⚙️ Auto-Moderation Configuration",
+            "Adjust settings using the controls below:",
+            fields=[
+                ("Status", f"{'✅ Enabled' if settings['enabled'] else '❌ Disabled'}"),
+                ("Mute Threshold", f"{settings['mute_threshold']} warnings"),
+                ("Ban Threshold", f"{settings['ban_threshold']} warnings"),
+                ("Mute Duration", f"{settings['mute_duration']} min"),
+                ("Default Offensive Words", f"{'✅ Enabled' if settings['ban_default_offensive'] else '❌ Disabled'}"),
+                ("Log Channel", log_channel.mention if log_channel else "Not set"),
+                ("Total Warnings", f"{warning_count}"),
+                ("Spam Filter", f"{'✅ Enabled' if settings['spam_enabled'] else '❌ Disabled'}\n{spam_limits}"),
+                ("Raid Protection", f"{'✅ Enabled' if settings['raid_enabled'] else '❌ Disabled'}\n{raid_limits}"),
+                ("Block Links", f"{'✅ Whitelist only' if settings['block_links'] else '❌ Disabled'}"),
+                ("Whitelisted Domains", ", ".join(settings["allowed_domains"])[:1024] or "None"),
+                ("Blocked Domains", ", ".join(settings["blocked_domains"])[:1024] or "None"),
+                ("Custom Banned Words", f"```{', '.join(settings['banned_words']) or 'None'}```")
+            ],
+            color=discord.Color.dark_blue()
+        )
+
     async def send_temp_message(self, ctx, embed, delay=10):
         message = await ctx.send(embed=embed)
         await asyncio.sleep(delay)
@@ -368,11 +1244,36 @@ class AutoModeration(commands.Cog):
             return self.bot.get_channel(int(channel_id))
         return None
 
+    def send_log(self, log_channel, embed):
+        """Queue an embed for the guild's log channel; it is sent with the next batch."""
+        self.log_dispatcher.enqueue(log_channel, embed)
+
     def get_current_time(self):
         return datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S")
 
-    def contains_url(self, message):
-        return self.url_pattern.search(message.content) is not None
+    def get_domain_filters(self, guild_id, settings):
+        """Return the guild's (allow, deny) domain tries, building them on first use."""
+        guild_id_str = str(guild_id)
+        if guild_id_str not in self.domain_filters:
+            self.domain_filters[guild_id_str] = (
+                DomainTrie(settings["allowed_domains"]),
+                DomainTrie(settings["blocked_domains"])
+            )
+        return self.domain_filters[guild_id_str]
+
+    def invalidate_domain_filters(self, guild_id):
+        """Drop the cached domain tries so they are rebuilt from the current lists."""
+        self.domain_filters.pop(str(guild_id), None)
+
+    def check_links(self, urls, guild_id, settings):
+        """Return a violation reason for the first disallowed link, or None."""
+        allow, deny = self.get_domain_filters(guild_id, settings)
+        for _, host in urls:
+            if deny.matches(host):
+                return f"Posted link to blocked domain: {host}"
+            if settings["block_links"] and not allow.matches(host):
+                return f"Posted link to non-whitelisted domain: {host}"
+        return None
 
     def get_effective_banned_words(self, settings):
         banned_words = settings["banned_words"].copy()
@@ -380,12 +1281,130 @@ class AutoModeration(commands.Cog):
             banned_words.extend(self.DEFAULT_OFFENSIVE_WORDS)
         return banned_words
 
-    def cog_unload(self):
+    def get_banned_word_pattern(self, guild_id, settings):
+        """Return the guild's compiled banned-word matcher, building it on first use."""
+        guild_id_str = str(guild_id)
+        if guild_id_str not in self.banned_word_patterns:
+            self.banned_word_patterns[guild_id_str] = compile_banned_words(self.get_effective_banned_words(settings))
+        return self.banned_word_patterns[guild_id_str]
+
+    def invalidate_banned_words(self, guild_id):
+        """Drop the cached matcher so it is rebuilt from the current word list."""
+        self.banned_word_patterns.pop(str(guild_id), None)
+
+    async def cog_unload(self):
         self.automod_task.cancel()
+        self.flush_settings.cancel()
+        self.run_scheduled_actions.cancel()
+        self.flush_logs.cancel()
+        self.save_settings()
+        self.warnings.close()
+        self.scheduler.close()
+        await self.log_dispatcher.flush_all()
 
     @tasks.loop(minutes=1)
     async def automod_task(self):
         await self.bot.wait_until_ready()
+        self.spam_tracker.evict_idle()
+        for guild_id, lockdown in self.raid_guard.pop_expired():
+            await self.log_lockdown_ended(guild_id, lockdown)
+
+    async def log_lockdown_ended(self, guild_id, lockdown):
+        """Write the single summary entry for a finished raid lockdown."""
+        log_channel = await self.get_log_channel(guild_id)
+        if not log_channel:
+            return
+        minutes = max(1, round((time.monotonic() - lockdown["started"]) / 60))
+        embed = self.create_embed(
+            "✅ Raid Lockdown Ended",
+            f"Join rate is back to normal after about {minutes} min.",
+            color=discord.Color.green(),
+            fields=[
+                ("Joins During Lockdown", str(lockdown["joins"])),
+                ("Leaves During Lockdown", str(lockdown["left"])),
+                ("New Accounts Kicked", str(lockdown["kicked"])),
+                ("Started", lockdown["started_at"].strftime("%Y-%m-%d %H:%M:%S UTC"))
+            ]
+        )
+        self.send_log(log_channel, embed)
+
+    @tasks.loop(seconds=30)
+    async def flush_settings(self):
+        """Periodically persist guilds whose settings changed."""
+        try:
+            await self.save_settings_async()
+        except sqlite3.Error as e:
+            logger.error(f"Failed to save automod settings: {e}")
+
+    @tasks.loop(seconds=2)
+    async def flush_logs(self):
+        """Send queued log embeds in batches."""
+        await self.log_dispatcher.flush_all()
+
+    @tasks.loop(seconds=5)
+    async def run_scheduled_actions(self):
+        """Fire scheduled unmutes/unbans that are due, including ones missed while offline."""
+        for action in self.scheduler.pop_due():
+            label = f"Scheduled {action['action']} for {action['user_id']} in {action['guild_id']}"
+            try:
+                await self.execute_scheduled_action(action)
+            except (discord.Forbidden, discord.NotFound) as e:
+                # Missing permissions or the target is gone; retrying won't help, so drop it below
+                logger.warning(f"{label} dropped: {e}")
+            except Exception as e:
+                delay = 60 * 2 ** action["attempts"]
+                try:
+                    if await self.scheduler.retry(action, delay):
+                        logger.warning(f"{label} failed, retrying in {delay}s: {e}")
+                    else:
+                        logger.error(f"{label} failed, giving up: {e}")
+                except sqlite3.Error as db_error:
+                    logger.error(f"{label} failed and could not be rescheduled: {e}; {db_error}")
+                continue
+            try:
+                await self.scheduler.complete(action)
+            except sqlite3.Error as e:
+                logger.error(f"Failed to remove completed {label.lower()}: {e}")
+
+    @run_scheduled_actions.before_loop
+    async def before_run_scheduled_actions(self):
+        await self.bot.wait_until_ready()
+
+    async def execute_scheduled_action(self, action):
+        """Carry out a single scheduled action and report it."""
+        guild = self.bot.get_guild(int(action["guild_id"]))
+        if not guild:
+            return
+        user_id = int(action["user_id"])
+        reason = action["reason"] or "Scheduled action"
+        log_channel = await self.get_log_channel(guild.id)
+        if action["action"] == "unmute":
+            member = guild.get_member(user_id)
+            mute_role = discord.utils.get(guild.roles, name=config.TIMEOUT_ROLE_NAME)
+            if not member or not mute_role or mute_role not in member.roles:
+                return
+            await member.remove_roles(mute_role, reason=reason)
+            title, description = "🔊 Mute Expired", f"**User:** {member.mention} (`{member.id}`)"
+        elif action["action"] == "unban":
+            await guild.unban(discord.Object(id=user_id), reason=reason)
+            title, description = "🔓 Scheduled Unban", f"**User:** <@{user_id}> (`{user_id}`)"
+        else:
+            logger.warning(f"Unknown scheduled action: {action['action']}")
+            return
+        if log_channel:
+            log_embed = self.create_embed(
+                title,
+                description,
+                color=discord.Color.green(),
+                fields=[
+                    ("Reason", reason),
+                    ("Timestamp", self.get_current_time())
+                ]
+            )
+            self.send_log(log_channel, log_embed)
+        channel = self.bot.get_channel(int(action["channel_id"])) if action["channel_id"] else None
+        if channel:
+            await channel.send(embed=self.create_embed(title, f"{description}\n{reason}.", color=discord.Color.green()))
 
     @commands.Cog.listener()
     async def on_message(self, message):
@@ -396,6 +1415,7 @@ class AutoModeration(commands.Cog):
         settings = self.get_guild_settings(message.guild.id)
         log_channel = await self.get_log_channel(message.guild.id)
         timestamp = self.get_current_time()
+        urls = extract_urls(message.content)
 
         if log_channel:
             if message.attachments:
@@ -405,146 +1425,156 @@ class AutoModeration(commands.Cog):
                     f"**User:** {message.author.mention}\n**Files:** {', '.join(file_names)}\n**Time:** {timestamp}",
                     color=discord.Color.blue()
                 )
-                await log_channel.send(embed=embed)
+                self.send_log(log_channel, embed)
 
-            if self.contains_url(message):
-                urls = self.url_pattern.findall(message.content)
+            if urls:
                 embed = self.create_embed(
                     "🔗 URL Sent",
-                    f"**User:** {message.author.mention}\n**URLs:** {', '.join(urls)}\n**Time:** {timestamp}",
+                    f"**User:** {message.author.mention}\n**URLs:** {', '.join(url for url, _ in urls)}\n**Time:** {timestamp}",
                     color=discord.Color.blue()
                 )
-                await log_channel.send(embed=embed)
+                self.send_log(log_channel, embed)
 
         if not settings["enabled"]:
             return
 
         content = message.content.lower()
-        banned_words = self.get_effective_banned_words(settings)
-        detected_word = next((word for word in banned_words if word in content), None)
-        if detected_word:
+        pattern = self.get_banned_word_pattern(guild_id_str, settings)
+        match = pattern.search(content) if pattern else None
+        reason = None
+        if match:
+            reason = f"Used banned word: {match.group(0)}"
+        if not reason and urls:
+            reason = self.check_links(urls, message.guild.id, settings)
+        if not reason and settings["spam_enabled"]:
+            reason = self.spam_tracker.check(message, settings)
+        if reason:
+            self.spam_tracker.reset(message.guild.id, message.author.id)
+            await self.handle_violation(message, reason, settings, log_channel)
+
+    async def handle_violation(self, message, reason, settings, log_channel):
+        """Delete the offending message, warn the author and escalate to a mute or ban at the thresholds."""
+        try:
             await message.delete()
-            user_id_str = str(message.author.id)
-            warning = {
-                "reason": f"Used banned word: {detected_word}",
-                "issuer": f"{self.bot.user.name} (AutoMod)",
-                "timestamp": datetime.utcnow().isoformat(),
-                "user_id": user_id_str
-            }
-            settings["warnings"].append(warning)
-            user_warnings = [w for w in settings["warnings"] if w.get("user_id", "unknown") == user_id_str]
-            warning_count = len(user_warnings)
-            self.save_settings()
-
-            warn_embed = self.create_embed(
-                "⚠️ Warning Issued",
-                f"You received a warning in **{message.guild.name}**.",
+        except discord.NotFound:
+            pass
+        guild_id_str = str(message.guild.id)
+        user_id_str = str(message.author.id)
+        warning = {
+            "reason": reason,
+            "issuer": f"{self.bot.user.name} (AutoMod)",
+            "timestamp": datetime.utcnow().isoformat(),
+            "user_id": user_id_str
+        }
+        warning_count = await self.warnings.add_async(guild_id_str, user_id_str, warning["reason"], warning["issuer"], warning["timestamp"])
+
+        warn_embed = self.create_embed(
+            "⚠️ Warning Issued",
+            f"You received a warning in **{message.guild.name}**.",
+            color=discord.Color.orange(),
+            fields=[
+                ("Reason", warning["reason"]),
+                ("Issuer", warning["issuer"]),
+                ("Timestamp", warning["timestamp"]),
+                ("Warning Count", f"{warning_count}/{settings['mute_threshold']} Before Mute | (Ban at {settings['ban_threshold']})")
+            ]
+        )
+        try:
+            await message.author.send(embed=warn_embed)
+        except discord.Forbidden:
+            pass
+
+        if log_channel:
+            log_embed = self.create_embed(
+                "⚠️ Auto-Moderation Warning",
+                f"**User:** {message.author.mention} (`{message.author.id}`)",
                 color=discord.Color.orange(),
                 fields=[
                     ("Reason", warning["reason"]),
                     ("Issuer", warning["issuer"]),
                     ("Timestamp", warning["timestamp"]),
-                    ("Warning Count", f"{warning_count}/{settings['mute_threshold']} Before Mute | (Ban at {settings['ban_threshold']})")
+                    ("Warnings", f"{warning_count}/{settings['mute_threshold']} Before Mute | (Ban at {settings['ban_threshold']})")
                 ]
             )
-            try:
-                await message.author.send(embed=warn_embed)
-            except discord.Forbidden:
-                pass
+            self.send_log(log_channel, log_embed)
 
-            if log_channel:
-                log_embed = self.create_embed(
-                    "⚠️ Auto-Moderation Warning",
-                    f"**User:** {message.author.mention} (`{message.author.id}`)",
-                    color=discord.Color.orange(),
+        if warning_count >= settings["ban_threshold"]:
+            try:
+                await message.author.ban(reason=f"Auto-moderation: Exceeded ban threshold ({warning_count}/{settings['ban_threshold']})")
+                ban_embed = self.create_embed(
+                    "⛔ Banned",
+                    f"You’ve been banned from **{message.guild.name}** for exceeding the warning threshold.",
+                    color=discord.Color.red(),
                     fields=[
-                        ("Reason", warning["reason"]),
-                        ("Issuer", warning["issuer"]),
-                        ("Timestamp", warning["timestamp"]),
-                        ("Warnings", f"{warning_count}/{settings['mute_threshold']} Before Mute | (Ban at {settings['ban_threshold']})")
+                        ("Warnings", f"{warning_count}/{settings['ban_threshold']}"),
+                        ("Last Reason", warning["reason"]),
+                        ("Timestamp", warning["timestamp"])
                     ]
                 )
-                await log_channel.send(embed=log_embed)
+                await message.author.send(embed=ban_embed)
 
-            if warning_count >= settings["ban_threshold"]:
-                try:
-                    await message.author.ban(reason=f"Auto-moderation: Exceeded ban threshold ({warning_count}/{settings['ban_threshold']})")
-                    ban_embed = self.create_embed(
-                        "⛔ Banned",
-                        f"You’ve been banned from **{message.guild.name}** for exceeding the warning threshold.",
+                if log_channel:
+                    log_embed = self.create_embed(
+                        "⛔ Auto-Moderation Ban",
+                        f"**User:** {message.author.mention} (`{message.author.id}`)",
                         color=discord.Color.red(),
                         fields=[
-                            ("Warnings", f"{warning_count}/{settings['ban_threshold']}"),
-                            ("Last Reason", warning["reason"]),
+                            ("Reason", f"Exceeded ban threshold ({warning_count}/{settings['ban_threshold']})"),
+                            ("Last Warning", warning["reason"]),
                             ("Timestamp", warning["timestamp"])
                         ]
                     )
-                    await message.author.send(embed=ban_embed)
-
-                    if log_channel:
-                        log_embed = self.create_embed(
-                            "⛔ Auto-Moderation Ban",
-                            f"**User:** {message.author.mention} (`{message.author.id}`)",
-                            color=discord.Color.red(),
-                            fields=[
-                                ("Reason", f"Exceeded ban threshold ({warning_count}/{settings['ban_threshold']})"),
-                                ("Last Warning", warning["reason"]),
-                                ("Timestamp", warning["timestamp"])
-                            ]
-                        )
-                        await log_channel.send(embed=log_embed)
-                    settings["warnings"] = [w for w in settings["warnings"] if w.get("user_id", "unknown") != user_id_str]
-                    self.save_settings()
-                except discord.Forbidden:
-                    pass
-            elif warning_count >= settings["mute_threshold"]:
-                mute_role = discord.utils.get(message.guild.roles, name=config.TIMEOUT_ROLE_NAME)
-                if not mute_role:
-                    return
-                try:
-                    await message.author.add_roles(mute_role, reason=f"Auto-moderation: Exceeded mute threshold ({warning_count}/{settings['mute_threshold']})")
-                    mute_embed = self.create_embed(
-                        "🤐 Muted",
-                        f"You’ve been muted in **{message.guild.name}** for {settings['mute_duration']} minutes.",
-                        color=discord.Color.red(),
-                        fields=[
-                            ("Reason", warning["reason"]),
-                            ("Issuer", warning["issuer"]),
-                            ("Timestamp", warning["timestamp"]),
-                            ("Warnings", f"{warning_count}/{settings['mute_threshold']} Before Mute | (Ban at {settings['ban_threshold']})")
-                        ]
-                    )
-                    await message.author.send(embed=mute_embed)
-
-                    if log_channel:
-                        log_embed = self.create_embed(
-                            "🤐 Auto-Moderation Mute",
-                            f"**User:** {message.author.mention} (`{message.author.id}`)",
-                            color=discord.Color.red(),
-                            fields=[
-                                ("Duration", f"{settings['mute_duration']} minutes"),
-                                ("Reason", f"Exceeded mute threshold ({warning_count}/{settings['mute_threshold']})"),
-                                ("Last Warning", warning["reason"]),
-                                ("Timestamp", warning["timestamp"])
-                            ]
-                        )
-                        await log_channel.send(embed=log_embed)
-
-                    await asyncio.sleep(settings["mute_duration"] * 60)
-                    await message.author.remove_roles(mute_role)
-                    if log_channel:
-                        log_embed = self.create_embed(
-                            "🔊 Auto-Moderation Unmute",
-                            f"**User:** {message.author.mention} (`{message.author.id}`)",
-                            color=discord.Color.green(),
-                            fields=[
-                                ("Reason", "Mute duration expired"),
-                                ("Timestamp", datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S"))
-                            ]
-                        )
-                        await log_channel.send(embed=log_embed)
-                except discord.Forbidden:
-                    pass
+                    self.send_log(log_channel, log_embed)
+                await self.warnings.clear_async(guild_id_str, user_id_str)
+            except discord.Forbidden:
+                pass
+        elif warning_count >= settings["mute_threshold"]:
+            mute_role = discord.utils.get(message.guild.roles, name=config.TIMEOUT_ROLE_NAME)
+            if not mute_role:
+                return
+            try:
+                await message.author.add_roles(mute_role, reason=f"Auto-moderation: Exceeded mute threshold ({warning_count}/{settings['mute_threshold']})")
+            except discord.Forbidden:
+                return
+            # Schedule the unmute first, so nothing below can leave the member muted for good
+            try:
+                await self.scheduler.schedule(
+                    message.guild.id, message.author.id, "unmute",
+                    time.time() + settings["mute_duration"] * 60,
+                    reason="Mute duration expired"
+                )
+            except sqlite3.Error as e:
+                logger.error(f"Failed to schedule unmute for {message.author.id} in {message.guild.id}: {e}")
+
+            mute_embed = self.create_embed(
+                "🤐 Muted",
+                f"You’ve been muted in **{message.guild.name}** for {settings['mute_duration']} minutes.",
+                color=discord.Color.red(),
+                fields=[
+                    ("Reason", warning["reason"]),
+                    ("Issuer", warning["issuer"]),
+                    ("Timestamp", warning["timestamp"]),
+                    ("Warnings", f"{warning_count}/{settings['mute_threshold']} Before Mute | (Ban at {settings['ban_threshold']})")
+                ]
+            )
+            try:
+                await message.author.send(embed=mute_embed)
+            except discord.Forbidden:
+                pass
+
+            if log_channel:
+                log_embed = self.create_embed(
+                    "🤐 Auto-Moderation Mute",
+                    f"**User:** {message.author.mention} (`{message.author.id}`)",
+                    color=discord.Color.red(),
+                    fields=[
+                        ("Duration", f"{settings['mute_duration']} minutes"),
+                        ("Reason", f"Exceeded mute threshold ({warning_count}/{settings['mute_threshold']})"),
+                        ("Last Warning", warning["reason"]),
+                        ("Timestamp", warning["timestamp"])
+                    ]
+                )
+                self.send_log(log_channel, log_embed)
 
     @commands.Cog.listener()
     async def on_member_update(self, before, after):
@@ -559,14 +1589,14 @@ class AutoModeration(commands.Cog):
                         f"**User:** {after.mention}\n**Time:** {timestamp}",
                         color=discord.Color.red()
                     )
-                    await log_channel.send(embed=embed)
+                    self.send_log(log_channel, embed)
                 elif timeout_role in before.roles and timeout_role not in after.roles:
                     embed = self.create_embed(
                         "🔊 User Unmuted",
                         f"**User:** {after.mention}\n**Time:** {timestamp}",
                         color=discord.Color.green()
                     )
-                    await log_channel.send(embed=embed)
+                    self.send_log(log_channel, embed)
 
             if before.nick != after.nick:
                 embed = self.create_embed(
@@ -574,11 +1604,15 @@ class AutoModeration(commands.Cog):
                     f"**User:** {after.mention}\n**Old Nickname:** {before.nick or 'None'}\n**New Nickname:** {after.nick or 'None'}\n**Time:** {timestamp}",
                     color=discord.Color.blue()
                 )
-                await log_channel.send(embed=embed)
+                self.send_log(log_channel, embed)
 
     @commands.Cog.listener()
     async def on_member_join(self, member):
+        settings = self.get_guild_settings(member.guild.id)
         log_channel = await self.get_log_channel(member.guild.id)
+        if settings["raid_enabled"] and self.raid_guard.record_join(member.guild.id, settings, member_id=member.id):
+            await self.handle_raid_join(member, settings, log_channel)
+            return
         if log_channel:
             timestamp = self.get_current_time()
             embed = self.create_embed(
@@ -586,10 +1620,50 @@ class AutoModeration(commands.Cog):
                 f"**User:** {member.mention}\n**Account Created:** {member.created_at}\n**Time:** {timestamp}",
                 color=discord.Color.green()
             )
-            await log_channel.send(embed=embed)
+            self.send_log(log_channel, embed)
+
+    async def handle_raid_join(self, member, settings, log_channel):
+        """Kick new accounts while the guild is locked down; joins are summarised, not logged individually."""
+        lockdown = self.raid_guard.get_lockdown(member.guild.id)
+        if not lockdown["announced"]:
+            lockdown["announced"] = True
+            if log_channel:
+                embed = self.create_embed(
+                    "🚨 Raid Detected - Lockdown Enabled",
+                    f"{settings['raid_join_limit']} joins within {settings['raid_interval']}s.",
+                    color=discord.Color.dark_red(),
+                    fields=[
+                        ("Action", f"Kicking accounts younger than {settings['raid_min_account_age']} days"
+                                   if settings["raid_min_account_age"] else "Logging only"),
+                        ("Lockdown Duration", f"{settings['raid_lockdown_duration']} min after the last burst")
+                    ]
+                )
+                self.send_log(log_channel, embed)
+            # The burst that triggered the lockdown joined before it started; check it now
+            for member_id in lockdown.pop("burst", []):
+                burst_member = member.guild.get_member(member_id)
+                if burst_member:
+                    await self.kick_new_account(burst_member, settings, lockdown)
+
+        await self.kick_new_account(member, settings, lockdown)
+
+    async def kick_new_account(self, member, settings, lockdown):
+        """Kick ``member`` if their account is younger than the raid minimum age."""
+        min_age = settings["raid_min_account_age"]
+        if min_age and (discord.utils.utcnow() - member.created_at).days < min_age:
+            try:
+                await member.kick(reason=f"Auto-moderation: raid lockdown (account younger than {min_age} days)")
+                lockdown["kicked"] += 1
+            except discord.HTTPException:
+                pass
 
     @commands.Cog.listener()
     async def on_member_remove(self, member):
+        lockdown = self.raid_guard.get_lockdown(member.guild.id)
+        if lockdown is not None:
+            # Lockdown kicks and raid accounts leaving are summarised when the lockdown ends
+            lockdown["left"] += 1
+            return
         log_channel = await self.get_log_channel(member.guild.id)
         if log_channel:
             timestamp = self.get_current_time()
@@ -598,7 +1672,7 @@ class AutoModeration(commands.Cog):
                 f"**User:** {member.mention}\n**Joined At:** {member.joined_at}\n**Time:** {timestamp}",
                 color=discord.Color.red()
             )
-            await log_channel.send(embed=embed)
+            self.send_log(log_channel, embed)
 
     @commands.Cog.listener()
     async def on_member_ban(self, guild, user):
@@ -610,7 +1684,7 @@ class AutoModeration(commands.Cog):
                 f"**User:** {user.mention}\n**User ID:** {user.id}\n**Time:** {timestamp}",
                 color=discord.Color.red()
             )
-            await log_channel.send(embed=embed)
+            self.send_log(log_channel, embed)
 
     @commands.Cog.listener()
     async def on_member_unban(self, guild, user):
@@ -622,7 +1696,7 @@ class AutoModeration(commands.Cog):
                 f"**User:** {user.mention}\n**User ID:** {user.id}\n**Time:** {timestamp}",
                 color=discord.Color.green()
             )
-            await log_channel.send(embed=embed)
+            self.send_log(log_channel, embed)
 
     @commands.Cog.listener()
     async def on_guild_channel_create(self, channel):
@@ -634,7 +1708,7 @@ class AutoModeration(commands.Cog):
                 f"**Channel:** #{channel.name}\n**Type:** {channel.type}\n**Time:** {timestamp}",
                 color=discord.Color.green()
             )
-            await log_channel.send(embed=embed)
+            self.send_log(log_channel, embed)
 
     @commands.Cog.listener()
     async def on_guild_channel_delete(self, channel):
@@ -646,7 +1720,7 @@ class AutoModeration(commands.Cog):
                 f"**Channel:** #{channel.name}\n**Type:** {channel.type}\n**Time:** {timestamp}",
                 color=discord.Color.red()
             )
-            await log_channel.send(embed=embed)
+            self.send_log(log_channel, embed)
 
     @commands.Cog.listener()
     async def on_voice_state_update(self, member, before, after):
@@ -666,7 +1740,7 @@ class AutoModeration(commands.Cog):
                         f"**User:** {member.mention}\n**Channel:** {before.channel.name}\n**Time:** {timestamp}",
                         color=discord.Color.red()
                     )
-                await log_channel.send(embed=embed)
+                self.send_log(log_channel, embed)
 
     @commands.Cog.listener()
     async def on_guild_role_create(self, role):
@@ -678,7 +1752,7 @@ class AutoModeration(commands.Cog):
                 f"**Role:** {role.name}\n**Time:** {timestamp}",
                 color=discord.Color.green()
             )
-            await log_channel.send(embed=embed)
+            self.send_log(log_channel, embed)
 
     @commands.Cog.listener()
     async def on_guild_role_delete(self, role):
@@ -690,7 +1764,7 @@ class AutoModeration(commands.Cog):
                 f"**Role:** {role.name}\n**Time:** {timestamp}",
                 color=discord.Color.red()
             )
-            await log_channel.send(embed=embed)
+            self.send_log(log_channel, embed)
 
     @commands.Cog.listener()
     async def on_guild_role_update(self, before, after):
@@ -708,7 +1782,7 @@ class AutoModeration(commands.Cog):
                     f"**Role:** {after.name}\n**Changes:** {'; '.join(changes)}\n**Time:** {timestamp}",
                     color=discord.Color.blue()
                 )
-                await log_channel.send(embed=embed)
+                self.send_log(log_channel, embed)
 
     @commands.Cog.listener()
     async def on_message_edit(self, before, after):
@@ -723,7 +1797,7 @@ class AutoModeration(commands.Cog):
                     f"**User:** {after.author.mention}\n**Channel:** {after.channel.mention}\n**Old Message:** {before.content[:1000]}\n**New Message:** {after.content[:1000]}\n**Time:** {timestamp}",
                     color=discord.Color.blue()
                 )
-                await log_channel.send(embed=embed)
+                self.send_log(log_channel, embed)
 
     @commands.Cog.listener()
     async def on_message_delete(self, message):
@@ -737,7 +1811,7 @@ class AutoModeration(commands.Cog):
                 f"**User:** {message.author.mention}\n**Channel:** {message.channel.mention}\n**Content:** {message.content[:1000]}\n**Time:** {timestamp}",
                 color=discord.Color.red()
             )
-            await log_channel.send(embed=embed)
+            self.send_log(log_channel, embed)
 
     @commands.command(name="automod")
     async def automod(self, ctx):
@@ -751,23 +1825,7 @@ class AutoModeration(commands.Cog):
             return
 
         view = AutoModUI(self, ctx.guild.id)
-        log_channel = await self.get_log_channel(ctx.guild.id)
-        warning_count = len(self.get_guild_settings(ctx.guild.id)["warnings"])
-        embed = self.create_embed(
-            "⚙️ Auto-Moderation Configuration",
-            "Adjust settings using the controls below:",
-            fields=[
-                ("Status", f"{'✅ Enabled' if self.get_guild_settings(ctx.guild.id)['enabled'] else '❌ Disabled'}"),
-                ("Mute Threshold", f"{self.get_guild_settings(ctx.guild.id)['mute_threshold']} warnings"),
-                ("Ban Threshold", f"{self.get_guild_settings(ctx.guild.id)['ban_threshold']} warnings"),
-                ("Mute Duration", f"{self.get_guild_settings(ctx.guild.id)['mute_duration']} min"),
-                ("Default Offensive Words", f"{'✅ Enabled' if self.get_guild_settings(ctx.guild.id)['ban_default_offensive'] else '❌ Disabled'}"),
-                ("Log Channel", log_channel.mention if log_channel else "Not set"),
-                ("Total Warnings", f"{warning_count}"),
-                ("Custom Banned Words", f"```{', '.join(self.get_guild_settings(ctx.guild.id)['banned_words']) or 'None'}```")
-            ],
-            color=discord.Color.dark_blue()
-        )
+        embed = await self.build_config_embed(ctx.guild.id)
         view.message = await ctx.send(embed=embed, view=view)
 
 async def setup(bot):
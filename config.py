@@ -26,3 +26,8 @@ ROLE_COLORS = {
     BOT_USER_ROLE: discord.Color.blue(),
     MOD_ROLE: discord.Color.green()
 }
+
+# Encoding for generated game images: "png", "png8" (palette PNG), "jpeg" or "webp".
+# Compare sizes with: python -m cmds.games._imaging
+GAME_IMAGE_FORMAT = "jpeg"
+GAME_IMAGE_QUALITY = 85  # jpeg/webp only, 1-100